@@ -0,0 +1,371 @@
+import pickle
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
+import crypto
+from quorumcertificate import QuorumCertificate
+from transactionbatch import TransactionBatch
+from metrics import registry
+
+# Size of a batch's digest (SHA-256)
+DIGEST_SIZE = 32
+
+class AvailabilityLayer:
+    """
+    Data-availability layer: every server disseminates batches of clients'
+    transactions, and the servers that store a batch acknowledge it by
+    signing its digest. Once a batch is acknowledged by `quorum` servers
+    (f+1, so at least one correct server stores it, or 2f+1), its creator
+    broadcasts the batch's certificate (a `QuorumCertificate` of the
+    digest). Leaders propose blocks with the digests of certified batches,
+    so consensus messages do not grow with the load.
+
+    Batches are kept until their block is finalized, or until they are
+    evicted (oldest first) to bound the layer's size. Certified batches that
+    the server does not store (e.g., it did not receive them) are requested
+    from the servers that acknowledged them, and stored once they match
+    their digest; the latest `retained` finalized batches are kept to
+    answer these requests.
+    """
+
+    def __init__(self, server_id: int, private_key: RSAPrivateKey, servers_public_key: dict, quorum: int,
+                 capacity: int = 10000, retained: int = 1000) -> None:
+        """
+        Constructor.
+
+        Args:
+            server_id (int): id of the server/replica
+            private_key (RSAPrivateKey): server's private key (to sign acknowledgements)
+            servers_public_key (dict): public keys of every server
+            quorum (int): number of acknowledgements that certify a batch
+            capacity (int, optional): maximum number of stored batches
+            retained (int, optional): number of finalized batches kept (to be sent to servers that miss them)
+        """
+        self.server_id = server_id
+        self.private_key = private_key
+        self.servers_public_key = servers_public_key
+        self.quorum = quorum
+        self.capacity = capacity
+        self.retained = retained
+        # Creator and batch of each digest
+        self.batches = {}
+        # Digests of certified batches that were requested, as they are not stored
+        self.missing = {}
+        # Acknowledgements of the server's own batches (by digest), until they are certified
+        self.acknowledgements = {}
+        self.certificates = {}
+        # Certified batches that were not proposed yet
+        self.pending = {}
+        # Digests of finalized batches (so late certificates do not make them pending again)
+        self.finalized = {}
+        # Creator and batch of the latest finalized batches
+        self.finalized_batches = {}
+        registry.gauge_function("streamlet_available_batches", "Batches stored by the availability layer.",
+                                lambda: len(self.batches))
+        self.certified_batches = registry.counter("streamlet_certified_batches_total",
+                                                  "Own batches certified by the availability layer.")
+        self.missing_batches = registry.counter("streamlet_missing_batches_total",
+                                                "Certified batches of finalized blocks that were not stored.")
+        registry.gauge_function("streamlet_requested_batches", "Missing batches waiting to be received.",
+                                lambda: len(self.missing))
+
+
+    @staticmethod
+    def get_digest(creator: int, epoch: int, transactions: list) -> str:
+        """
+        Get digest of a batch (its creator and epoch are included, so
+        equal batches of different servers are not confused).
+
+        Args:
+            creator (int): id of the server that created the batch
+            epoch (int): epoch when the batch was created
+            transactions (list): transactions of the batch
+
+        Returns:
+            str: digest
+        """
+        return crypto.calculate_hash(pickle.dumps((creator, epoch, transactions)))
+
+
+    def get_quorum(self) -> int:
+        """
+        Get number of acknowledgements that certify a batch.
+
+        Returns:
+            int: quorum
+        """
+        return self.quorum
+
+
+    def create_batch(self, epoch: int, transactions: list) -> tuple[TransactionBatch, QuorumCertificate | None]:
+        """
+        Create a batch of the server's transactions (acknowledged by the server).
+
+        Args:
+            epoch (int): current epoch
+            transactions (list): clients' transactions
+
+        Returns:
+            tuple[TransactionBatch, QuorumCertificate | None]: batch to disseminate and its
+                certificate (if the server's acknowledgement is enough)
+        """
+        batch = TransactionBatch(epoch, transactions)
+        digest = self.store(self.server_id, batch)
+        self.acknowledgements[digest] = {}
+        certificate = self.process_acknowledgement(self.acknowledge(digest, epoch), self.server_id)
+        return (batch, certificate)
+
+
+    def store(self, creator: int, batch: TransactionBatch) -> str:
+        """
+        Store a batch.
+
+        Args:
+            creator (int): id of the server that created the batch
+            batch (TransactionBatch): batch
+
+        Returns:
+            str: digest of the batch
+        """
+        digest = self.get_digest(creator, batch.get_epoch(), batch.get_transactions())
+        self.batches[digest] = (creator, batch)
+        self.missing.pop(digest, None)
+        while len(self.batches) > self.capacity:
+            evicted_digest = next(iter(self.batches))
+            del self.batches[evicted_digest]
+            self.acknowledgements.pop(evicted_digest, None)
+            self.certificates.pop(evicted_digest, None)
+            self.pending.pop(evicted_digest, None)
+        return digest
+
+
+    def acknowledge(self, digest: str, epoch: int) -> QuorumCertificate:
+        """
+        Sign the digest of a stored batch.
+
+        Args:
+            digest (str): digest of the batch
+            epoch (int): epoch when the batch was created
+
+        Returns:
+            QuorumCertificate: acknowledgement (certificate with the server's signature)
+        """
+        signature = bytes.fromhex(crypto.sign_hash(digest, self.private_key))
+        return QuorumCertificate(epoch, digest, 1 << self.server_id, [signature])
+
+
+    def process_batch(self, batch: TransactionBatch, creator: int) -> QuorumCertificate | None:
+        """
+        Store a batch received from its creator and acknowledge it.
+
+        Args:
+            batch (TransactionBatch): batch
+            creator (int): id of the server that created the batch
+
+        Returns:
+            QuorumCertificate | None: acknowledgement (None, if the batch has no transactions)
+        """
+        if not batch.get_transactions():
+            return None
+        return self.acknowledge(self.store(creator, batch), batch.get_epoch())
+
+
+    def process_acknowledgement(self, acknowledgement: QuorumCertificate, sender: int) -> QuorumCertificate | None:
+        """
+        Add acknowledgement of one of the server's batches.
+
+        Args:
+            acknowledgement (QuorumCertificate): acknowledgement
+            sender (int): id of the server that acknowledged the batch
+
+        Returns:
+            QuorumCertificate | None: certificate of the batch, once it has `quorum` acknowledgements
+        """
+        digest = acknowledgement.get_block_hash()
+        acknowledgements = self.acknowledgements.get(digest)
+        if (acknowledgements is None or sender in acknowledgements or acknowledgement.get_voters() != [sender]
+                or not acknowledgement.verify(self.servers_public_key, 1)):
+            return None
+        acknowledgements[sender] = acknowledgement.get_signatures()[0]
+        if len(acknowledgements) < self.quorum:
+            return None
+        del self.acknowledgements[digest]
+        voters = 0
+        for voter in acknowledgements:
+            voters |= 1 << voter
+        certificate = QuorumCertificate(acknowledgement.get_epoch(), digest, voters,
+                                        [acknowledgements[voter] for voter in sorted(acknowledgements)])
+        self.certified_batches.inc()
+        self.add_certificate(certificate)
+        return certificate
+
+
+    def process_certificate(self, certificate: QuorumCertificate) -> bool:
+        """
+        Add (valid) certificate of a batch.
+
+        Args:
+            certificate (QuorumCertificate): certificate of the batch
+
+        Returns:
+            bool: True, if and only if the certificate is new and valid
+        """
+        if certificate.get_block_hash() in self.certificates or certificate.get_block_hash() in self.finalized:
+            return False
+        if not certificate.verify(self.servers_public_key, self.quorum):
+            return False
+        self.add_certificate(certificate)
+        return True
+
+
+    def add_certificate(self, certificate: QuorumCertificate) -> None:
+        """
+        Add certificate of a batch (as pending, i.e., to be proposed).
+
+        Args:
+            certificate (QuorumCertificate): certificate of the batch
+        """
+        self.certificates[certificate.get_block_hash()] = certificate
+        self.pending[certificate.get_block_hash()] = None
+
+
+    def get_pending(self, limit: int | None = None) -> list[str]:
+        """
+        Get digests of certified batches that were not proposed yet (oldest first).
+
+        Args:
+            limit (int | None, optional): maximum number of digests
+
+        Returns:
+            list[str]: digests
+        """
+        digests = list(self.pending)
+        return digests[:limit] if limit is not None else digests
+
+
+    def is_available(self, digests: list) -> bool:
+        """
+        Check if every batch has a (valid) certificate.
+
+        Args:
+            digests (list): digests of batches
+
+        Returns:
+            bool: True, if and only if every batch is certified
+        """
+        return all(isinstance(digest, str) and digest in self.certificates for digest in digests)
+
+
+    def get_transactions(self, digests: list[str]) -> list | None:
+        """
+        Get transactions of (stored) batches.
+
+        Args:
+            digests (list[str]): digests of batches
+
+        Returns:
+            list | None: transactions (None, if some batch is not stored)
+        """
+        transactions = []
+        for digest in digests:
+            batch = self.batches.get(digest)
+            if batch is None:
+                return None
+            transactions.extend(batch[1].get_transactions())
+        return transactions
+
+
+    def get_missing(self, digests: list[str]) -> list[str]:
+        """
+        Get digests of batches that are not stored, and mark them as missing
+        (to be requested).
+
+        Args:
+            digests (list[str]): digests of batches
+
+        Returns:
+            list[str]: digests of the batches that are not stored
+        """
+        missing = [digest for digest in digests if digest not in self.batches]
+        for digest in missing:
+            if digest not in self.missing:
+                self.missing[digest] = None
+                self.missing_batches.inc()
+        return missing
+
+
+    def get_certifiers(self, digest: str) -> list[int]:
+        """
+        Get ids of the servers that acknowledged a batch (so they store it).
+
+        Args:
+            digest (str): digest of the batch
+
+        Returns:
+            list[int]: ids of the servers (empty, if the batch's certificate is not known)
+        """
+        certificate = self.certificates.get(digest)
+        return certificate.get_voters() if certificate is not None else []
+
+
+    def get_batch(self, digest: str) -> tuple[int, TransactionBatch] | None:
+        """
+        Get a stored batch (e.g., requested by a server that misses it).
+
+        Args:
+            digest (str): digest of the batch
+
+        Returns:
+            tuple[int, TransactionBatch] | None: id of the creator and batch (None, if it is not stored)
+        """
+        return self.batches.get(digest) or self.finalized_batches.get(digest)
+
+
+    def process_missing_batch(self, batch: TransactionBatch, creator: int) -> bool:
+        """
+        Store a requested batch, if its digest is one of the missing batches
+        (so it is not acknowledged again).
+
+        Args:
+            batch (TransactionBatch): batch
+            creator (int): id of the server that created the batch
+
+        Returns:
+            bool: True, if and only if the batch was missing
+        """
+        if not self.missing or batch.get_transactions() is None:
+            return False
+        if self.get_digest(creator, batch.get_epoch(), batch.get_transactions()) not in self.missing:
+            return False
+        self.store(creator, batch)
+        return True
+
+
+    def mark_included(self, digests: list[str]) -> None:
+        """
+        Mark batches as included in a block (they are no longer proposed).
+
+        Args:
+            digests (list[str]): digests of batches
+        """
+        for digest in digests:
+            self.pending.pop(digest, None)
+
+
+    def remove(self, digests: list[str]) -> None:
+        """
+        Remove batches (e.g., of finalized blocks).
+
+        Args:
+            digests (list[str]): digests of batches
+        """
+        for digest in digests:
+            batch = self.batches.pop(digest, None)
+            if batch is not None and self.retained:
+                self.finalized_batches[digest] = batch
+            self.missing.pop(digest, None)
+            self.certificates.pop(digest, None)
+            self.pending.pop(digest, None)
+            self.finalized[digest] = None
+        while len(self.finalized) > self.capacity:
+            del self.finalized[next(iter(self.finalized))]
+        while len(self.finalized_batches) > self.retained:
+            del self.finalized_batches[next(iter(self.finalized_batches))]
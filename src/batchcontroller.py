@@ -0,0 +1,144 @@
+from metrics import registry
+
+# Maximum number of bytes of transactions of a block
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+
+class BatchController:
+    """
+    Controller of the number of transactions of each proposal, driven by the
+    observed epoch timings (AIMD): the byte budget of a block grows while
+    blocks are notarized early enough in their epoch (`target` of the epoch
+    duration), and it is halved when they are notarized late or not
+    notarized in their epoch.
+
+    Until the first late notarization (or timeout), the budget doubles at
+    each early notarization, so it reaches the cluster's capacity quickly;
+    afterwards it grows by `increase` transactions per early notarization.
+    The budget only grows with blocks that used at least half of it (e.g.,
+    compact proposals may be smaller than the budget, if the mempool has
+    fewer pending transactions).
+    """
+
+    def __init__(self, epoch_duration: float, transaction_size: int, transaction_number: int,
+                 target: float = 0.5, maximum_bytes: int = MAX_BATCH_BYTES, increase: int | None = None) -> None:
+        """
+        Constructor.
+
+        Args:
+            epoch_duration (float): duration of each epoch (in seconds)
+            transaction_size (int): transaction's size
+            transaction_number (int): initial number of transactions per block
+            target (float, optional): fraction of the epoch before which blocks should be notarized
+            maximum_bytes (int, optional): maximum number of bytes of transactions of a block
+            increase (int | None, optional): transactions added to the budget per early notarization
+                (defaults to 10% of the initial number of transactions)
+        """
+        if not 0 < target < 1:
+            raise ValueError("Target must be a fraction of the epoch duration")
+        self.deadline = target * epoch_duration
+        self.transaction_size = max(1, transaction_size)
+        self.maximum_bytes = max(self.transaction_size, maximum_bytes)
+        self.byte_budget = min(self.maximum_bytes, max(1, transaction_number) * self.transaction_size)
+        self.increase = (increase if increase is not None else max(1, transaction_number // 10)) * self.transaction_size
+        self.slow_start = True
+        # Changes of the budget: epoch, number of transactions, byte budget and signal
+        self.decisions = []
+        registry.gauge_function("streamlet_batch_transactions", "Number of transactions of the next proposal.",
+                                self.get_transaction_number)
+        self.signals = {
+            signal: registry.counter("streamlet_batch_signals_total",
+                                     "Epoch timings observed by the batch controller.", {"signal": signal})
+            for signal in ("early", "late", "timeout")
+        }
+
+
+    def get_transaction_number(self) -> int:
+        """
+        Get number of transactions of the next proposal.
+
+        Returns:
+            int: number of transactions
+        """
+        return max(1, self.byte_budget // self.transaction_size)
+
+
+    def get_byte_budget(self) -> int:
+        """
+        Get number of bytes of transactions of the next proposal.
+
+        Returns:
+            int: byte budget
+        """
+        return self.byte_budget
+
+
+    def get_decisions(self) -> list[tuple]:
+        """
+        Get changes of the budget.
+
+        Returns:
+            list[tuple]: epoch, number of transactions, byte budget and signal ("early", "late" or "timeout")
+        """
+        return self.decisions
+
+
+    def observe_notarization(self, epoch: int, elapsed_time: float, transaction_number: int) -> None:
+        """
+        Observe notarization of the block of the current epoch.
+
+        Args:
+            epoch (int): epoch of the block
+            elapsed_time (float): time since the start of the epoch until the block was notarized
+            transaction_number (int): number of transactions of the block
+        """
+        if elapsed_time > self.deadline:
+            self.signals["late"].inc()
+            self.decrease(epoch, "late")
+            return
+        self.signals["early"].inc()
+        # Smaller blocks do not show that the budget can grow
+        if transaction_number * 2 < self.get_transaction_number():
+            return
+        if self.slow_start:
+            byte_budget = self.byte_budget * 2
+        else:
+            byte_budget = self.byte_budget + self.increase
+        self.update(epoch, min(self.maximum_bytes, byte_budget), "early")
+
+
+    def observe_timeout(self, epoch: int) -> None:
+        """
+        Observe epoch whose proposal was not notarized before the epoch ended.
+
+        Args:
+            epoch (int): epoch
+        """
+        self.signals["timeout"].inc()
+        self.decrease(epoch, "timeout")
+
+
+    def decrease(self, epoch: int, signal: str) -> None:
+        """
+        Halve the budget (and end the slow start).
+
+        Args:
+            epoch (int): epoch of the observation
+            signal (str): observed signal
+        """
+        self.slow_start = False
+        self.update(epoch, max(self.transaction_size, self.byte_budget // 2), signal)
+
+
+    def update(self, epoch: int, byte_budget: int, signal: str) -> None:
+        """
+        Set the budget, recording the decision if it changed.
+
+        Args:
+            epoch (int): epoch of the observation
+            byte_budget (int): new budget
+            signal (str): observed signal
+        """
+        if byte_budget == self.byte_budget:
+            return
+        self.byte_budget = byte_budget
+        self.decisions.append((epoch, self.get_transaction_number(), byte_budget, signal))
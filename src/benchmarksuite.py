@@ -0,0 +1,745 @@
+import os
+import sys
+import glob
+import json
+import time
+import socket
+import struct
+import timeit
+import shutil
+import platform
+import argparse
+import itertools
+import subprocess
+import tempfile
+import cryptography
+import crypto
+from block import Block
+from blockchain import Blockchain
+from blockstatus import BlockStatus
+from message import Message
+from messagetype import MessageType
+from communicationsystem import CommunicationSystem
+from sharedmemoryring import SharedMemoryRing
+from quorumcertificate import QuorumCertificate
+import compression
+from transactionfilter import TransactionFilter
+from mempool import Mempool
+from checkpoint import CheckpointStore
+from streamlet import Streamlet
+from simulator import (SimulatedKey, SimulatedNetwork, SimulatedCommunication, SimulatedTransactionGenerator,
+                       DELIVER)
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+CHAIN_LENGTHS = (10, 100, 1000)
+COMPRESSION_LEVELS = (1, 6, 9)
+FILTER_CAPACITY = 100000
+REJOIN_INTERVAL = 30000
+
+
+def get_environment() -> dict:
+    """
+    Get metadata of the environment where benchmarks run (results from
+    different environments are not comparable).
+
+    Returns:
+        dict: environment metadata
+    """
+    cpu_model = platform.processor()
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo", "r") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(MAIN), capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cryptography": cryptography.__version__,
+        "cpu_model": cpu_model,
+        "cpu_count": os.cpu_count(),
+        "commit": commit
+    }
+
+
+def measure(function, repeat: int) -> float:
+    """
+    Measure time per call of `function` (best of `repeat` rounds of at least 0.2 s).
+
+    Args:
+        function (Callable): function without arguments
+        repeat (int): number of rounds
+
+    Returns:
+        float: time per call (in seconds)
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def measure_once(setup, function, repeat: int) -> float:
+    """
+    Measure time of a call of `function` on fresh state (best of `repeat` calls).
+
+    Args:
+        setup (Callable): function that creates the state
+        function (Callable): function that takes the state
+        repeat (int): number of calls
+
+    Returns:
+        float: time per call (in seconds)
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup()
+        start_time = time.perf_counter()
+        function(state)
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+
+def create_transactions(transaction_size: int, transaction_number: int) -> list:
+    """
+    Create transactions (as generated by `TransactionGenerator`).
+
+    Args:
+        transaction_size (int): transaction's size
+        transaction_number (int): number of transactions
+
+    Returns:
+        list: transactions
+    """
+    return [(id, 0, "\x00" * transaction_size, 0.0) for id in range(transaction_number)]
+
+
+def create_chain(length: int, consecutive: bool) -> Blockchain:
+    """
+    Create blockchain with `length` notarized blocks. Blocks have gaps
+    between their epochs (so they are not finalized), except the last
+    three blocks if `consecutive` is set.
+
+    Args:
+        length (int): number of notarized blocks (besides the genesis block)
+        consecutive (bool): if set to True, the last three blocks have consecutive epochs
+
+    Returns:
+        Blockchain: blockchain
+    """
+    blockchain = Blockchain(write_blocks=False)
+    blockchain.add_genesis_block()
+    parent = blockchain.get_block(0)
+    epoch = 0
+    for index in range(length):
+        epoch += 1 if consecutive and index >= length - 3 else 2
+        block = Block(epoch, [], parent.get_hash(), parent.get_epoch())
+        block.calculate_hash()
+        block.notarize()
+        blockchain.add_block(block)
+        parent = block
+    return blockchain
+
+
+def run_micro_benchmarks(repeat: int = 5, chain_lengths: tuple = CHAIN_LENGTHS) -> dict:
+    """
+    Run micro-benchmarks of cryptography, serialization, fork choice,
+    finalization, framing and compression.
+
+    Args:
+        repeat (int, optional): number of rounds of each benchmark
+        chain_lengths (tuple, optional): lengths of the chains used by fork choice and finalization
+
+    Returns:
+        dict: time per call (in seconds) of each benchmark (and compression ratios)
+    """
+    public_key, private_key = crypto.generate_keys()
+    proposal = Block(1, create_transactions(256, 100), "00" * 32, 0)
+    proposal.sign(private_key)
+    vote = proposal.create_vote(private_key)
+    for voter in range(3):
+        proposal.add_vote((voter, vote))
+    certificate = QuorumCertificate.create(proposal)
+    block_bytes = proposal.to_bytes(include_signature=True)
+    certificate_bytes = certificate.to_bytes()
+    proposal_bytes = Message(MessageType.PROPOSE, proposal, 0).to_bytes()
+    vote_bytes = Message(MessageType.VOTE, vote, 0).to_bytes()
+    session_key = os.urandom(32)
+    tag = crypto.calculate_tag(session_key, vote_bytes)
+    signature = bytes.fromhex(vote.get_signature())
+    benchmarks = {
+        "crypto.calculate_hash": lambda: crypto.calculate_hash(proposal_bytes),
+        "crypto.sign_hash": lambda: crypto.sign_hash(proposal.get_hash(), private_key),
+        "crypto.verify_signature": lambda: crypto.verify_signature(vote.get_signature(), proposal.get_hash(), public_key),
+        "crypto.verify_signatures(3)": lambda: crypto.verify_signatures([signature] * 3, proposal.get_hash(),
+                                                                       [public_key] * 3),
+        "crypto.calculate_tag": lambda: crypto.calculate_tag(session_key, vote_bytes),
+        "crypto.verify_tag": lambda: crypto.verify_tag(tag, session_key, vote_bytes),
+        "serialization.block_to_bytes(100)": lambda: proposal.to_bytes(include_signature=True),
+        "serialization.block_from_bytes(100)": lambda: Block.from_bytes(block_bytes),
+        "serialization.propose_to_bytes(100)": lambda: Message(MessageType.PROPOSE, proposal, 0).to_bytes(),
+        "serialization.propose_from_bytes(100)": lambda: Message.from_bytes(proposal_bytes),
+        "serialization.vote_to_bytes": lambda: Message(MessageType.VOTE, vote, 0).to_bytes(),
+        "serialization.vote_from_bytes": lambda: Message.from_bytes(vote_bytes),
+        "serialization.certificate_from_bytes": lambda: QuorumCertificate.from_bytes(certificate_bytes),
+    }
+    results = {name: measure(function, repeat) for name, function in benchmarks.items()}
+
+    for length in chain_lengths:
+        blockchain = create_chain(length, consecutive=False)
+        results[f"blockchain.fork_choice({length})"] = measure(blockchain.get_notarized_chains, repeat)
+        # Most calls do not finalize blocks (there are no three consecutive epochs)
+        results[f"blockchain.finalize_check({length})"] = measure(blockchain.finalize, repeat)
+        results[f"blockchain.finalize({length})"] = measure_once(
+            lambda: create_chain(length, consecutive=True), Blockchain.finalize, repeat)
+
+    results.update(run_framing_benchmarks(vote_bytes, repeat))
+    results.update(run_compression_benchmarks(proposal_bytes, repeat))
+    results.update(run_filter_benchmarks(repeat))
+    return results
+
+
+def run_framing_benchmarks(message: bytes, repeat: int) -> dict:
+    """
+    Run micro-benchmarks of framing (writing and reading a frame) over a
+    socket pair and a shared-memory ring.
+
+    Args:
+        message (bytes): message in each frame
+        repeat (int): number of rounds of each benchmark
+
+    Returns:
+        dict: time per frame (in seconds) of each benchmark
+    """
+    directory = tempfile.mkdtemp()
+    sender_socket, receiver_socket = socket.socketpair()
+    communication = CommunicationSystem(0, {0: ["127.0.0.1", 0, sender_socket]})
+    ring = SharedMemoryRing(os.path.join(directory, "ring"), create=True)
+    frame = [struct.pack(">I", len(message)), message]
+
+    def socket_round_trip():
+        communication.write(sender_socket, frame)
+        communication.read_all_from_socket(receiver_socket)
+
+    def ring_round_trip():
+        ring.write(frame)
+        ring.read()
+
+    try:
+        return {
+            "framing.socket": measure(socket_round_trip, repeat),
+            "framing.ring": measure(ring_round_trip, repeat)
+        }
+    finally:
+        sender_socket.close()
+        receiver_socket.close()
+        shutil.rmtree(directory)
+
+
+def run_compression_benchmarks(message: bytes, repeat: int) -> dict:
+    """
+    Run micro-benchmarks of compressing and decompressing a message with
+    each registered codec, at several levels (CPU time against ratio).
+
+    Args:
+        message (bytes): message in serialized form
+        repeat (int): number of rounds of each benchmark
+
+    Returns:
+        dict: time per call (in seconds) and ratio (compressed/uncompressed size) of each codec and level
+    """
+    results = {}
+    for name, codec in compression.CODECS.items():
+        for level in COMPRESSION_LEVELS:
+            compressed = compression.compress_frame(message, codec, level)
+            results[f"compression.{name}_compress({level})"] = measure(
+                lambda: compression.compress_frame(message, codec, level), repeat)
+            results[f"compression.{name}_decompress({level})"] = measure(
+                lambda: compression.decompress_frame(compressed), repeat)
+            results[f"compression.{name}_ratio({level})"] = len(compressed) / len(message)
+    return results
+
+
+def run_filter_benchmarks(repeat: int, capacity: int = FILTER_CAPACITY) -> dict:
+    """
+    Run micro-benchmarks of the filter of finalized transactions (filled
+    up to its capacity), and measure its false positive rate.
+
+    Args:
+        repeat (int): number of rounds of each benchmark
+        capacity (int, optional): number of ids of the filter
+
+    Returns:
+        dict: time per call (in seconds) and false positive ratio
+    """
+    transaction_filter = TransactionFilter(capacity)
+    added_ids = [os.urandom(8) for _ in range(capacity - 1)]
+    transaction_filter.add(added_ids)
+    new_ids = [os.urandom(8) for _ in range(capacity)]
+    added_id, new_id = added_ids[0], new_ids[0]
+    transaction = create_transactions(256, 1)[0]
+    return {
+        "transaction_filter.get_transaction_id": measure(lambda: Mempool.get_transaction_id(transaction), repeat),
+        "transaction_filter.add": measure(lambda: transaction_filter.current.add(new_id), repeat),
+        "transaction_filter.is_duplicate(added)": measure(lambda: transaction_filter.is_duplicate(added_id), repeat),
+        "transaction_filter.is_duplicate(new)": measure(lambda: transaction_filter.is_duplicate(new_ids[1]), repeat),
+        f"transaction_filter.false_positive_ratio({capacity})": (
+            sum(transaction_filter.is_duplicate(transaction_id) for transaction_id in new_ids[1:]) / (capacity - 1))
+    }
+
+
+def create_lagging_cluster(blocks: int, interval: int, transaction_number: int) -> tuple:
+    """
+    Create 4 replicas (f = 1) connected by a network without delays, where
+    replicas 1 to 3 (sharing their blockchain) finalized `blocks` blocks and
+    replica 0 only has the genesis block (e.g., it was disconnected), and
+    send replica 0 the proposal of the next epoch. Signatures are simulated
+    (see `SimulatedKey`), so the history is created quickly.
+
+    Args:
+        blocks (int): number of finalized blocks
+        interval (int): checkpoint interval (0 disables checkpoints, so every block is replayed)
+        transaction_number (int): number of transactions per block
+
+    Returns:
+        tuple: network and replicas
+    """
+    network = SimulatedNetwork(lambda _: 0.0)
+    server_ids = [0, 1, 2, 3]
+    keys = {id: SimulatedKey(id) for id in server_ids}
+    blockchain = Blockchain(write_blocks=False)
+    transaction_filter = TransactionFilter()
+    checkpoint_store = CheckpointStore(interval, asynchronous=False) if interval else None
+    replicas = []
+    for id in server_ids:
+        replica = Streamlet(
+            id, SimulatedCommunication(id, server_ids, network), keys[id], keys, 1.0, 1, sys.maxsize, sys.maxsize,
+            transaction_generator=SimulatedTransactionGenerator(0, 0, network.clock),
+            clock=network.clock,
+            blockchain=blockchain if id else Blockchain(write_blocks=False),
+            transaction_filter=transaction_filter if id else TransactionFilter(),
+            checkpoint_store=(checkpoint_store if id else CheckpointStore(interval, asynchronous=False)) if interval else None
+        )
+        replica.initialize()
+        replica.epoch_start_time = network.clock.time()
+        replicas.append(replica)
+    lagging_replica, replica = replicas[0], replicas[1]
+
+    parent = blockchain.get_block(0)
+    for epoch in range(1, blocks + 2):
+        for other in replicas:
+            other.epoch.value = epoch
+        lagging_replica.get_epoch_leader()
+        replica.get_epoch_leader()
+        block = Block(epoch, [(epoch * transaction_number + i, 0, "", 0.0) for i in range(transaction_number)],
+                      parent.get_hash(), parent.get_epoch())
+        block.calculate_hash()
+        signatures = [bytes.fromhex(crypto.sign_hash(block.get_hash(), keys[voter])) for voter in (1, 2, 3)]
+        blockchain.add_block(block)
+        replica.notarize(block, QuorumCertificate(epoch, block.get_hash(), 0b1110, signatures))
+        parent = block
+
+    # Proposal of the next epoch led by a replica that is up to date
+    epoch = blocks + 2
+    lagging_replica.get_epoch_leader()
+    replica.get_epoch_leader()
+    while lagging_replica.epoch_leaders[-1] == 0:
+        epoch += 1
+        lagging_replica.get_epoch_leader()
+        replica.get_epoch_leader()
+    for other in replicas:
+        other.epoch.value = epoch
+        other.epoch_leaders = list(replica.epoch_leaders)
+    leader = replica.epoch_leaders[epoch]
+    proposal = Block(epoch, [], parent.get_hash(), parent.get_epoch())
+    proposal.set_parent_certificate(parent.get_certificate())
+    proposal.sign(keys[leader])
+    proposal.add_leader_vote(leader)
+    blockchain.add_block(proposal)
+    network.transmit(Message(MessageType.PROPOSE, proposal, leader).to_bytes(), 0)
+    return network, replicas
+
+
+def run_rejoin_benchmark(blocks: int, interval: int = REJOIN_INTERVAL, transaction_number: int = 1) -> dict:
+    """
+    Measure the time that a replica takes to rejoin when it is `blocks`
+    blocks behind: by replaying every block, and by restoring a checkpoint
+    and replaying the blocks after its anchor. Messages are serialized and
+    processed as usual, but signatures are simulated, so the time spent
+    verifying the RSA signatures of the replayed certificates is estimated
+    (from the measured time of verifying a certificate).
+
+    Args:
+        blocks (int): number of blocks the replica is behind
+        interval (int, optional): checkpoint interval
+        transaction_number (int, optional): number of transactions per block
+
+    Returns:
+        dict: rejoin time (in seconds), replayed blocks and transferred bytes of each method
+    """
+    public_key, private_key = crypto.generate_keys()
+    block_hash = crypto.calculate_hash(b"")
+    signature = bytes.fromhex(crypto.sign_hash(block_hash, private_key))
+    verification_time = measure(lambda: crypto.verify_signatures([signature] * 3, block_hash, [public_key] * 3), 5)
+    results = {"rejoin.certificate_verification": verification_time}
+    for method, method_interval in (("replay", 0), ("checkpoint", interval)):
+        network, replicas = create_lagging_cluster(blocks, method_interval, transaction_number)
+        lagging_replica = replicas[0]
+
+        def rejoined() -> bool:
+            # The replica rejoined when the last block of the history is notarized
+            last_block = lagging_replica.blockchain.get_block(blocks + 1)
+            return last_block is not None and last_block.get_status() != BlockStatus.PROPOSED
+
+        sent_bytes = network.sent_bytes
+        start_time = time.perf_counter()
+        while not rejoined() and (event := network.next_event()) is not None:
+            _, kind, server_id, data = event
+            if kind != DELIVER:
+                continue
+            replica = replicas[server_id]
+            message = replica.communication.receive(data)
+            if message is not None:
+                replica.process_message(message)
+            while (message := replica.get_early_message()) is not None:
+                replica.process_message(message)
+        elapsed_time = time.perf_counter() - start_time
+        if not rejoined():
+            print(f"Replica did not rejoin by {method}.", file=sys.stderr)
+            continue
+        # Blocks after the restored anchor (or every block) were replayed
+        anchor = lagging_replica.blockchain.get_block(min(lagging_replica.blockchain.chain))
+        replayed_blocks = blocks + 1 - anchor.get_epoch()
+        results[f"rejoin.{method}({blocks})"] = elapsed_time
+        results[f"rejoin.{method}_estimated_rsa({blocks})"] = elapsed_time + replayed_blocks * verification_time
+        results[f"rejoin.{method}_blocks({blocks})"] = replayed_blocks
+        results[f"rejoin.{method}_bytes({blocks})"] = network.sent_bytes - sent_bytes
+        del network, replicas, lagging_replica
+    return results
+
+
+def get_free_ports(number: int) -> list[int]:
+    """
+    Get ports that are free (when checked).
+
+    Args:
+        number (int): number of ports
+
+    Returns:
+        list[int]: ports
+    """
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_STREAM) for _ in range(number)]
+    for free_socket in sockets:
+        free_socket.bind(("127.0.0.1", 0))
+    ports = [free_socket.getsockname()[1] for free_socket in sockets]
+    for free_socket in sockets:
+        free_socket.close()
+    return ports
+
+
+def summarize(results: dict) -> dict:
+    """
+    Turn results exported by `Streamlet.export_benchmark_results` into
+    throughput and latency numbers.
+
+    Args:
+        results (dict): benchmark results of a server
+
+    Returns:
+        dict: throughput (transactions per second), median latencies (in seconds),
+            bytes sent per finalized transaction and transactions per block (with the batch controller)
+    """
+    elapsed_times = results["BENCHMARK_TIME"][1:]
+    if not elapsed_times:
+        return {}
+    # Older results do not have the number of transactions of each measurement
+    transactions = results.get("FINALIZED_TRANSACTIONS") or [results["BENCHMARK_THRESHOLD"]] * len(elapsed_times)
+    summary = {"throughput": sum(transactions) / elapsed_times[-1]}
+    if results.get("BYTES_PER_TRANSACTION") is not None:
+        summary["bytes_per_transaction"] = results["BYTES_PER_TRANSACTION"]
+    # Number of transactions per block chosen by the batch controller (at the end of the run)
+    if results.get("BATCH_CONTROLLER") is not None:
+        summary["batch_transactions"] = results["BATCH_CONTROLLER"]["TRANSACTION_NUMBER"]
+    for stage, latency in results.get("LATENCY", {}).items():
+        if latency.get("count"):
+            summary[f"{stage.lower()}_p50"] = latency["p50"]
+    return summary
+
+
+def run_local_cluster(parameters: dict, benchmark_total: int, timeout: float, key_directory: str,
+                      directory: str) -> list[dict]:
+    """
+    Run local cluster (3f + 1 replicas, on free ports of 127.0.0.1) in
+    `directory` until every replica finalizes `benchmark_total` transactions.
+
+    Args:
+        parameters (dict): environment variables of the replicas, with FAULT_NUMBER ("off" values are not set)
+        benchmark_total (int): number of finalized transactions to end the run
+        timeout (float): maximum duration of the run (in seconds)
+        key_directory (str): directory where replicas' keys are cached
+        directory (str): working directory of the replicas (where they export their results)
+
+    Returns:
+        list[dict]: benchmark results exported by each replica that finished the run
+    """
+    num_replicas = 3 * int(parameters["FAULT_NUMBER"]) + 1
+    with open(os.path.join(directory, "config.yaml"), "w") as config:
+        for id, port in enumerate(get_free_ports(num_replicas)):
+            config.write(f"{id}:\n  - 127.0.0.1\n  - {port}\n")
+    environment = dict(os.environ, KEY_DIRECTORY=key_directory, BENCHMARK_TOTAL=str(benchmark_total),
+                       BENCHMARK_THRESHOLD=str(max(benchmark_total // 10, 1)),
+                       **{name: str(value) for name, value in parameters.items() if value != "off"})
+    replicas = [subprocess.Popen([sys.executable, MAIN, str(id)], cwd=directory, env=environment,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                for id in range(num_replicas)]
+    deadline = time.time() + timeout
+    try:
+        for replica in replicas:
+            replica.wait(max(deadline - time.time(), 0))
+    except subprocess.TimeoutExpired:
+        pass
+    finally:
+        for replica in replicas:
+            if replica.poll() is None:
+                replica.kill()
+                replica.wait()
+    results = []
+    for filename in sorted(glob.glob(os.path.join(directory, "benchmark_*.json"))):
+        with open(filename, "r") as replica_results:
+            results.append(json.load(replica_results))
+    return results
+
+
+def run_macro_benchmark(parameters: dict, benchmark_total: int, timeout: float, key_directory: str) -> dict:
+    """
+    Run local cluster (3f + 1 replicas) until every replica finalizes
+    `benchmark_total` transactions.
+
+    Args:
+        parameters (dict): TRANSACTION_SIZE, TRANSACTION_NUMBER, EPOCH_DURATION, FAULT_NUMBER,
+            DATA_AVAILABILITY, COMPRESSION, NETWORK_SCENARIO, ADAPTIVE_BATCH and INGRESS_WORKERS
+            ("off" values are not set)
+        benchmark_total (int): number of finalized transactions to end the run
+        timeout (float): maximum duration of the run (in seconds)
+        key_directory (str): directory where replicas' keys are cached
+
+    Returns:
+        dict: mean throughput and latencies of the replicas (empty, if the run failed)
+    """
+    num_replicas = 3 * parameters["FAULT_NUMBER"] + 1
+    directory = tempfile.mkdtemp()
+    summaries = [summarize(results)
+                 for results in run_local_cluster(parameters, benchmark_total, timeout, key_directory, directory)]
+    shutil.rmtree(directory)
+    return average_summaries(summaries, num_replicas)
+
+
+def average_summaries(summaries: list[dict], num_replicas: int) -> dict:
+    """
+    Average the summaries of the replicas of a run.
+
+    Args:
+        summaries (list[dict]): summary of each replica (see `summarize`)
+        num_replicas (int): number of replicas of the run
+
+    Returns:
+        dict: mean of each metric present in every summary (empty, if some replica did not finish)
+    """
+    summaries = [summary for summary in summaries if summary]
+    if len(summaries) != num_replicas:
+        return {}
+    return {metric: sum(summary[metric] for summary in summaries) / len(summaries)
+            for metric in summaries[0] if all(metric in summary for summary in summaries)}
+
+
+def run_macro_benchmarks(grid: dict, benchmark_total: int, timeout: float) -> dict:
+    """
+    Run macro benchmark for every combination of the parameters in `grid`.
+
+    Args:
+        grid (dict): values of each parameter
+        benchmark_total (int): number of finalized transactions of each run
+        timeout (float): maximum duration of each run (in seconds)
+
+    Returns:
+        dict: throughput and latencies of each combination
+    """
+    results = {}
+    key_directory = os.path.join(tempfile.gettempdir(), "streamlet-benchmark-keys")
+    for values in itertools.product(*grid.values()):
+        parameters = dict(zip(grid.keys(), values))
+        name = ",".join(f"{parameter}={value}" for parameter, value in parameters.items())
+        print(f"Running {name}...", file=sys.stderr)
+        summary = run_macro_benchmark(parameters, benchmark_total, timeout, key_directory)
+        if not summary:
+            print(f"Run {name} did not finish.", file=sys.stderr)
+        for metric, value in summary.items():
+            results[f"{name}/{metric}"] = value
+    return results
+
+
+def is_higher_better(name: str) -> bool:
+    """
+    Check if higher values of benchmark `name` are better (throughput) or
+    worse (times and latencies).
+
+    Args:
+        name (str): name of the benchmark
+
+    Returns:
+        bool: True, if higher values are better, else False
+    """
+    return name.endswith("/throughput")
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[tuple]:
+    """
+    Compare results of benchmarks present in both result sets.
+
+    Args:
+        baseline (dict): baseline results
+        candidate (dict): candidate results
+        threshold (float): relative change that is flagged as a regression (e.g., 0.1 for 10%)
+
+    Returns:
+        list[tuple]: name, baseline value, candidate value, relative change
+        and regression flag of each benchmark
+    """
+    comparison = []
+    for name in sorted(set(baseline) & set(candidate)):
+        baseline_value, candidate_value = baseline[name], candidate[name]
+        change = (candidate_value - baseline_value) / baseline_value if baseline_value else 0.0
+        # Positive changes are improvements
+        improvement = change if is_higher_better(name) else -change
+        comparison.append((name, baseline_value, candidate_value, change, improvement < -threshold))
+    return comparison
+
+
+def save(results: dict, filename: str) -> None:
+    """
+    Save results with the environment's metadata.
+
+    Args:
+        results (dict): results of each benchmark
+        filename (str): name of the file
+    """
+    with open(filename, "w") as output:
+        json.dump({"environment": get_environment(), "results": results}, output, indent=2)
+
+
+def load(filename: str) -> dict:
+    """
+    Load result set saved by `save`.
+
+    Args:
+        filename (str): name of the file
+
+    Returns:
+        dict: environment and results
+    """
+    with open(filename, "r") as result_set:
+        return json.load(result_set)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite: micro-benchmarks, throughput runs and comparisons.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    micro_parser = subparsers.add_parser("micro", help="run micro-benchmarks")
+    micro_parser.add_argument("-o", "--output", default="micro.json", help="result set file")
+    micro_parser.add_argument("--repeat", type=int, default=5, help="rounds of each benchmark")
+    macro_parser = subparsers.add_parser("macro", help="run local clusters over a parameter grid")
+    macro_parser.add_argument("-o", "--output", default="macro.json", help="result set file")
+    macro_parser.add_argument("--transaction-size", type=int, nargs="+", default=[256])
+    macro_parser.add_argument("--transaction-number", type=int, nargs="+", default=[100])
+    macro_parser.add_argument("--epoch-duration", type=float, nargs="+", default=[1.0])
+    macro_parser.add_argument("-f", "--faults", type=int, nargs="+", default=[1])
+    macro_parser.add_argument("--data-availability", nargs="+", choices=("off", "f+1", "2f+1"), default=["off"],
+                              help="quorum of the availability layer")
+    macro_parser.add_argument("--compression", nargs="+", default=["off"],
+                              help="codecs of the messages carrying transactions (e.g., zlib)")
+    macro_parser.add_argument("--network-scenario", nargs="+", default=["off"],
+                              help="network emulation scenario files (e.g., with bandwidth caps)")
+    macro_parser.add_argument("--adaptive-batch", nargs="+", choices=("off", "1"), default=["off"],
+                              help="adapt the number of transactions per block to the epoch timings")
+    macro_parser.add_argument("--ingress-workers", type=int, nargs="+", default=[1],
+                              help="receiver processes of each replica")
+    macro_parser.add_argument("--total", type=int, default=2000, help="finalized transactions of each run")
+    macro_parser.add_argument("--timeout", type=float, default=300, help="maximum duration of each run (in seconds)")
+    summarize_parser = subparsers.add_parser("summarize", help="print throughput of benchmark_*.json files")
+    summarize_parser.add_argument("files", nargs="+")
+    rejoin_parser = subparsers.add_parser("rejoin", help="measure the time to rejoin far behind (replay vs checkpoint)")
+    rejoin_parser.add_argument("-o", "--output", default="rejoin.json", help="result set file")
+    rejoin_parser.add_argument("--blocks", type=int, default=1000000, help="number of blocks behind")
+    rejoin_parser.add_argument("--interval", type=int, default=REJOIN_INTERVAL, help="checkpoint interval (in epochs)")
+    rejoin_parser.add_argument("--transaction-number", type=int, default=1, help="transactions per block")
+    compare_parser = subparsers.add_parser("compare", help="flag regressions between two result sets")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative change flagged as regression")
+    arguments = parser.parse_args()
+
+    if arguments.command == "micro":
+        results = run_micro_benchmarks(arguments.repeat)
+        for name, value in results.items():
+            if "_ratio(" in name:
+                print(f"{name:<45} {value:>12.4f}")
+            else:
+                print(f"{name:<45} {value * 1e6:>12.2f} us")
+        save(results, arguments.output)
+    elif arguments.command == "macro":
+        grid = {
+            "TRANSACTION_SIZE": arguments.transaction_size,
+            "TRANSACTION_NUMBER": arguments.transaction_number,
+            "EPOCH_DURATION": arguments.epoch_duration,
+            "FAULT_NUMBER": arguments.faults,
+            "DATA_AVAILABILITY": arguments.data_availability,
+            "COMPRESSION": arguments.compression,
+            "NETWORK_SCENARIO": [os.path.abspath(scenario) if scenario != "off" else scenario
+                                 for scenario in arguments.network_scenario],
+            "ADAPTIVE_BATCH": arguments.adaptive_batch,
+            "INGRESS_WORKERS": arguments.ingress_workers
+        }
+        results = run_macro_benchmarks(grid, arguments.total, arguments.timeout)
+        for name, value in results.items():
+            print(f"{name:<80} {value:>12.3f}")
+        save(results, arguments.output)
+    elif arguments.command == "rejoin":
+        results = run_rejoin_benchmark(arguments.blocks, arguments.interval, arguments.transaction_number)
+        for name, value in results.items():
+            print(f"{name:<45} {value:>12.6g}")
+        save(results, arguments.output)
+    elif arguments.command == "summarize":
+        for filename in arguments.files:
+            try:
+                with open(filename, "r") as results:
+                    summary = summarize(json.load(results))
+            except (OSError, ValueError, KeyError) as error:
+                print(f"{filename}: {error}", file=sys.stderr)
+                continue
+            print(filename, " ".join(f"{metric}={value:.3f}" for metric, value in summary.items()))
+    else:
+        try:
+            baseline, candidate = load(arguments.baseline), load(arguments.candidate)
+        except (OSError, ValueError) as error:
+            print(error, file=sys.stderr)
+            sys.exit(2)
+        for field in ("cpu_model", "cpu_count", "python", "cryptography"):
+            if baseline["environment"].get(field) != candidate["environment"].get(field):
+                print(f"Warning: environments differ in {field} ({baseline['environment'].get(field)} "
+                      f"vs {candidate['environment'].get(field)}).", file=sys.stderr)
+        comparison = compare(baseline["results"], candidate["results"], arguments.threshold)
+        for name, baseline_value, candidate_value, change, regression in comparison:
+            print(f"{name:<80} {baseline_value:>12.6g} {candidate_value:>12.6g} {change * 100:>+8.1f}% "
+                  f"{'REGRESSION' if regression else ''}")
+        # Non-zero exit status, so the comparison can gate changes
+        if any(regression for *_, regression in comparison):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ from typing import Self
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
 import crypto
 from blockstatus import BlockStatus
+from quorumcertificate import QuorumCertificate
+from mempool import TRANSACTION_ID_SIZE, BATCH_DIGEST_SIZE
 
 class Block:
     """
@@ -34,6 +36,14 @@ class Block:
         self.signature = None
         self.votes = []
         self.status = BlockStatus.PROPOSED
+        self.proposal_time = None
+        self.notarization_time = None
+        self.certificate = None
+        self.parent_certificate = None
+        self.transaction_ids = None
+        self.batch_digest = None
+        # Hash of the voted block (votes)
+        self.voted_hash = None
 
 
     def get_epoch(self) -> int:
@@ -116,6 +126,159 @@ class Block:
         return self.signature
 
 
+    def get_proposal_time(self) -> float | None:
+        """
+        Get time when block was proposed (or received, if proposed by other server).
+
+        Returns:
+            float | None: proposal time
+        """
+        return self.proposal_time
+
+
+    def get_notarization_time(self) -> float | None:
+        """
+        Get time when block was notarized.
+
+        Returns:
+            float | None: notarization time
+        """
+        return self.notarization_time
+
+
+    def get_certificate(self) -> QuorumCertificate | None:
+        """
+        Get block's quorum certificate (available once the block is notarized).
+
+        Returns:
+            QuorumCertificate | None: certificate
+        """
+        return self.certificate
+
+
+    def get_parent_certificate(self) -> QuorumCertificate | None:
+        """
+        Get parent block's quorum certificate (carried by proposals).
+
+        Returns:
+            QuorumCertificate | None: certificate of the parent block
+        """
+        return self.parent_certificate
+
+
+    def get_transaction_ids(self) -> list[bytes] | None:
+        """
+        Get ids of block's transactions (compact blocks).
+
+        Returns:
+            list[bytes] | None: ids of transactions (None, if the block is not compact)
+        """
+        return self.transaction_ids
+
+
+    def get_batch_digest(self) -> bytes | None:
+        """
+        Get digest of block's transactions (compact blocks).
+
+        Returns:
+            bytes | None: batch digest (None, if the block is not compact)
+        """
+        return self.batch_digest
+
+
+    def get_voted_hash(self) -> str | None:
+        """
+        Get hash of the block that the vote refers to (votes).
+
+        Returns:
+            str | None: hash of the voted block (None, if the block is not a vote)
+        """
+        return self.voted_hash
+
+
+    def is_complete(self) -> bool:
+        """
+        Check if block has its transactions (compact blocks are received without them).
+
+        Returns:
+            bool: True, if and only if the block has its transactions
+        """
+        return self.transactions is not None
+
+
+    def set_transactions(self, transactions: list) -> None:
+        """
+        Set block's transactions (rebuilt from the ids of a compact block).
+
+        Args:
+            transactions (list): clients' transactions
+        """
+        self.transactions = transactions
+
+
+    def set_transaction_ids(self, transaction_ids: list[bytes], batch_digest: bytes) -> None:
+        """
+        Set ids and digest of block's transactions, so the block is sent
+        in compact form (without its transactions).
+
+        Args:
+            transaction_ids (list[bytes]): ids of transactions
+            batch_digest (bytes): digest of the transactions
+        """
+        self.transaction_ids = transaction_ids
+        self.batch_digest = batch_digest
+
+
+    def set_certificate(self, certificate: QuorumCertificate) -> None:
+        """
+        Set block's quorum certificate.
+
+        Args:
+            certificate (QuorumCertificate): certificate
+        """
+        self.certificate = certificate
+
+
+    def set_parent_certificate(self, parent_certificate: QuorumCertificate | None) -> None:
+        """
+        Set parent block's quorum certificate.
+
+        Args:
+            parent_certificate (QuorumCertificate | None): certificate of the parent block
+        """
+        self.parent_certificate = parent_certificate
+
+
+    def set_proposal_time(self, proposal_time: float) -> None:
+        """
+        Set time when block was proposed (or received, if proposed by other server).
+
+        Args:
+            proposal_time (float): proposal time
+        """
+        self.proposal_time = proposal_time
+
+
+    def set_notarization_time(self, notarization_time: float) -> None:
+        """
+        Set time when block was notarized.
+
+        Args:
+            notarization_time (float): notarization time
+        """
+        self.notarization_time = notarization_time
+
+
+    def set_votes(self, votes: list) -> None:
+        """
+        Set block's votes.
+
+        Args:
+            votes (list): list containing votes
+        """
+        self.votes = votes
+
+
     def set_signature(self, signature: str) -> None:
         """
         Set block's signature.
@@ -213,6 +376,9 @@ class Block:
             self.parent_hash,
         )
         block.signature = signature
+        if self.hash is None:
+            self.calculate_hash()
+        block.voted_hash = self.hash
         return block
 
 
@@ -270,6 +436,7 @@ class Block:
             self.parent_hash
         )
         vote.signature = self.signature
+        vote.voted_hash = self.hash
         self.add_vote((server_id, vote))
 
 
@@ -297,7 +464,8 @@ class Block:
         data = {
             "epoch": self.epoch,
             "parent_hash": self.parent_hash,
-            "transactions": self.transactions
+            "transactions": self.transactions,
+            "certificate": self.certificate.to_bytes().hex() if self.certificate else None
         }
         with open(filename, "a") as blockchain:
             blockchain.write(json.dumps(data) + ",")
@@ -309,45 +477,67 @@ class Block:
 
         Args:
             include_signature (bool): if set to True, block's signature
-            is included
+            (and parent's certificate) is included, and compact blocks
+            carry the ids of their transactions instead of the transactions,
+            and votes carry the hash of the voted block
 
         Returns:
             bytes: bytes from Block object
         """
         if include_signature:
-            data = (self.parent_hash, self.epoch, self.transactions, self.signature)
+            parent_certificate = self.parent_certificate.to_bytes() if self.parent_certificate else None
+            if self.transaction_ids is not None:
+                data = (self.parent_hash, self.epoch, None, self.signature, parent_certificate,
+                        b"".join(self.transaction_ids), self.batch_digest, None)
+            else:
+                data = (self.parent_hash, self.epoch, self.transactions, self.signature, parent_certificate, None, None,
+                        self.voted_hash)
         else:
             data = (self.parent_hash, self.epoch, self.transactions)
         return pickle.dumps(data)
 
 
     @staticmethod
-    def from_bytes(bytes: bytes) -> Self | None:
+    def from_bytes(data_bytes: bytes) -> Self | None:
         """
         Convert bytes to Block. Additionally, check if instance attributes
         have the correct type.
 
         Args:
-            bytes (bytes): Block in serialized form
+            data_bytes (bytes): Block in serialized form
 
         Returns:
             Block: Block object from bytes
         """
         try:
-            data = pickle.loads(bytes)
+            data = pickle.loads(data_bytes)
         except pickle.PickleError:
             logging.error("Block cannot be unpickled.\n")
             return None
         try:
-            parent_hash, epoch, transactions, signature = data
+            (parent_hash, epoch, transactions, signature, parent_certificate, transaction_ids, batch_digest,
+             voted_hash) = data
         except ValueError:
             logging.error("Attributes cannot be unpacked from tuple.\n")
             return None
         if (isinstance(parent_hash, str) and isinstance(epoch, int)
                 and isinstance(transactions, (list, NoneType))
-                and isinstance(signature, str)):
+                and isinstance(signature, str)
+                and isinstance(parent_certificate, (bytes, NoneType))
+                and isinstance(transaction_ids, (bytes, NoneType)) and isinstance(batch_digest, (bytes, NoneType))
+                and (voted_hash is None or (isinstance(voted_hash, str) and transactions is None))
+                and (transaction_ids is None or (len(transaction_ids) % TRANSACTION_ID_SIZE == 0
+                                                 and batch_digest is not None and len(batch_digest) == BATCH_DIGEST_SIZE))):
             block = Block(epoch, transactions, parent_hash)
             block.signature = signature
+            block.voted_hash = voted_hash
+            if transaction_ids is not None:
+                block.set_transaction_ids([transaction_ids[i:i+TRANSACTION_ID_SIZE]
+                                           for i in range(0, len(transaction_ids), TRANSACTION_ID_SIZE)], batch_digest)
+            if parent_certificate is not None:
+                block.parent_certificate = QuorumCertificate.from_bytes(parent_certificate)
+                if block.parent_certificate is None:
+                    return None
             return block
         logging.error("Block attributes do not contain the correct type(s).\n")
         return None
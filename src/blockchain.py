@@ -1,18 +1,30 @@
 import random
+from typing import Callable
 from blockstatus import BlockStatus
 from block import Block
+from blockstore import BlockStore
 
 class Blockchain:
     """
     Class that contains the blockchain structure and its operations.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, write_blocks: bool = True, block_store: BlockStore | None = None) -> None:
         """
         Constructor.
+
+        Args:
+            write_blocks (bool, optional): if set to True, finalized blocks
+            are written to a file
+            block_store (BlockStore | None, optional): store where finalized
+            blocks are indexed (to be queried)
         """
         self.chain = {}
+        self.unfinalized_epochs = set()
+        self.write_blocks = write_blocks
+        self.block_store = block_store
         self.longest_notarized_chains = []
+        self.finalized_epoch = 0
         random.seed(0)
 
 
@@ -24,6 +36,7 @@ class Blockchain:
             block (Block): block to be added to the blockchain
         """
         self.chain[block.get_epoch()] = block
+        self.unfinalized_epochs.add(block.get_epoch())
 
 
     def add_genesis_block(self) -> None:
@@ -50,6 +63,38 @@ class Blockchain:
             return self.chain[epoch]
 
 
+    def get_finalized_epoch(self) -> int:
+        """
+        Get epoch of the last finalized block.
+
+        Returns:
+            int: epoch (0, if only the genesis block is finalized)
+        """
+        return self.finalized_epoch
+
+
+    def set_anchor(self, anchor: Block) -> None:
+        """
+        Replace the blockchain up to the epoch of `anchor` (a finalized block,
+        e.g., of a checkpoint) by `anchor`. Blocks of later epochs are kept,
+        except those that do not descend from blocks after the anchor.
+
+        Args:
+            anchor (Block): finalized block
+        """
+        anchor_epoch = anchor.get_epoch()
+        chain = {anchor_epoch: anchor}
+        for epoch in sorted(self.chain):
+            if epoch > anchor_epoch and self.chain[epoch].get_parent_epoch() in chain:
+                chain[epoch] = self.chain[epoch]
+        self.chain = chain
+        self.unfinalized_epochs = {epoch for epoch in self.unfinalized_epochs if epoch in self.chain and epoch != anchor_epoch}
+        self.longest_notarized_chains = []
+        self.finalized_epoch = anchor_epoch
+        if self.block_store:
+            self.block_store.add_blocks([anchor])
+
+
     def update_longest_notarized_chains(self) -> None:
         """
         Update `self.longest_notarized_chains` to contain a list of the 
@@ -75,34 +120,28 @@ class Blockchain:
         Returns:
             list: list of notarized chains
         """
-        latest_epoch = max(self.chain)
         notarized_chains = []
         iterated_epochs = []
 
-        # First iteration: start chain (from the end) with notarized block
-        # with highest epoch number
+        # Start chain (from the end) with notarized block with highest epoch
+        # number that was not present in other notarized chains (fork chain)
         # -------------------------------------------------------------------
-        # Further iterations: start chain (from the end) with notarized block
-        # that was not present in other notarized chains (fork chain)
-        while True:
-            while latest_epoch >= 0:
-                block = self.get_block(latest_epoch)
-                if (block and block.get_status() == BlockStatus.NOTARIZED
-                        and latest_epoch not in iterated_epochs):
-                    break
-                latest_epoch -= 1
-            
-            # Exit loop after iterating through every epoch number
-            if latest_epoch < 0:
-                break
-            
+        # Finalized blocks are never the start of a notarized chain, so only
+        # blocks that were not finalized yet are iterated
+        for latest_epoch in sorted(self.unfinalized_epochs, reverse=True):
+            block = self.get_block(latest_epoch)
+            if block.get_status() != BlockStatus.NOTARIZED or latest_epoch in iterated_epochs:
+                continue
+
             chain = []
             end_chain = False
             while not end_chain:
                 parent_epoch = block.get_parent_epoch()
                 if parent_epoch != None:
                     parent_block = self.get_block(parent_epoch)
-                    if block.is_child(parent_block) and block.get_status() == BlockStatus.NOTARIZED:
+                    # Blocks before an anchor (see `set_anchor`) are not kept
+                    if (parent_block is not None and block.is_child(parent_block)
+                            and block.get_status() == BlockStatus.NOTARIZED):
                         chain.append(block)
                         iterated_epochs.append(block.get_epoch())
                         block = parent_block
@@ -131,10 +170,14 @@ class Blockchain:
         return longest_notarized_blocks
 
 
-    def finalize(self) -> list:
+    def finalize(self, get_transactions: Callable[[Block], list] | None = None) -> list:
         """
         Finalize the notarized chain up to the second of the three blocks,
         after observing three adjacent blocks with consecutive epochs.
+
+        Args:
+            get_transactions (Callable[[Block], list] | None, optional): gets the
+            transactions of a block, to index them in the block store
         """
         self.update_longest_notarized_chains()
         finalized_blocks = []
@@ -158,12 +201,17 @@ class Blockchain:
         if consecutive_epochs == 3:
             for block in longest_notarized_chain[1:]:
                 block.finalize()
+                self.unfinalized_epochs.discard(block.get_epoch())
                 finalized_blocks.append(block)
             finalized_blocks.reverse()
+            self.finalized_epoch = finalized_blocks[-1].get_epoch()
 
             # Write finalized blocks to file
-            for block in finalized_blocks:
-                block.write()
+            if self.write_blocks:
+                for block in finalized_blocks:
+                    block.write()
+            if self.block_store:
+                self.block_store.add_blocks(finalized_blocks, get_transactions)
 
         return finalized_blocks
 
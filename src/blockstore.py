@@ -0,0 +1,308 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from block import Block
+from mempool import Mempool, TRANSACTION_ID_SIZE
+from metrics import registry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (epoch INTEGER PRIMARY KEY, hash BLOB NOT NULL, data TEXT NOT NULL);
+CREATE UNIQUE INDEX IF NOT EXISTS blocks_hash ON blocks (hash);
+CREATE TABLE IF NOT EXISTS transactions (id BLOB PRIMARY KEY, epoch INTEGER NOT NULL, position INTEGER NOT NULL) WITHOUT ROWID;
+"""
+# Maximum number of blocks returned by a range scan
+MAX_RANGE = 1000
+
+class BlockStore:
+    """
+    Persistent store of finalized blocks (SQLite), indexed by epoch, by
+    hash and by the ids of their transactions (see `Mempool.get_transaction_id`).
+    Blocks are added incrementally, when they are finalized, and recently
+    read blocks are kept in an LRU cache.
+
+    Blocks are written by the protocol, and read by the threads of the
+    query server (each thread has its own connection, so reads do not wait
+    for writes).
+    """
+
+    def __init__(self, filename: str, cache_size: int = 1024) -> None:
+        """
+        Constructor.
+
+        Args:
+            filename (str): name of the database file
+            cache_size (int, optional): maximum number of cached blocks
+        """
+        self.filename = filename
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.readers = threading.local()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        # Readers see the last committed blocks while new blocks are written
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.cache_hits = registry.counter("streamlet_block_store_cache_total", "Reads of finalized blocks.",
+                                           {"result": "hit"})
+        self.cache_misses = registry.counter("streamlet_block_store_cache_total", "Reads of finalized blocks.",
+                                             {"result": "miss"})
+        self.write_time = registry.summary("streamlet_block_store_write_seconds",
+                                           "Time spent indexing finalized blocks.")
+
+
+    def get_connection(self) -> sqlite3.Connection:
+        """
+        Get connection of the calling thread (used to read blocks).
+
+        Returns:
+            sqlite3.Connection: connection
+        """
+        connection = getattr(self.readers, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.filename}?mode=ro", uri=True, check_same_thread=False)
+            self.readers.connection = connection
+        return connection
+
+
+    def add_blocks(self, blocks: list[Block], get_transactions: Callable[[Block], list] | None = None) -> None:
+        """
+        Add finalized blocks (and index their transactions), in a single
+        transaction. Blocks of an epoch that is already stored are replaced
+        (e.g., by a new run), while transactions keep their first block.
+
+        Args:
+            blocks (list[Block]): finalized blocks
+            get_transactions (Callable[[Block], list] | None, optional): gets the transactions
+                of a block (e.g., from the availability layer) - defaults to the block's transactions
+        """
+        start_time = time.perf_counter()
+        block_rows = []
+        transaction_rows = []
+        for block in blocks:
+            transactions = (get_transactions(block) if get_transactions else block.get_transactions()) or []
+            data = {
+                "epoch": block.get_epoch(),
+                "hash": block.get_hash(),
+                "parent_hash": block.get_parent_hash(),
+                "transactions": transactions,
+                "certificate": block.get_certificate().to_bytes().hex() if block.get_certificate() else None
+            }
+            block_rows.append((block.get_epoch(), bytes.fromhex(block.get_hash()), json.dumps(data)))
+            transaction_rows.extend((Mempool.get_transaction_id(transaction), block.get_epoch(), position)
+                                    for position, transaction in enumerate(transactions))
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)", block_rows)
+            self.connection.executemany("INSERT OR IGNORE INTO transactions VALUES (?, ?, ?)", transaction_rows)
+        with self.cache_lock:
+            for epoch, _, _ in block_rows:
+                self.cache.pop(epoch, None)
+        self.write_time.observe(time.perf_counter() - start_time)
+
+
+    def get_block(self, epoch: int) -> dict | None:
+        """
+        Get finalized block of `epoch`.
+
+        Args:
+            epoch (int): epoch of the block
+
+        Returns:
+            dict | None: block (None, if no block of `epoch` was finalized)
+        """
+        with self.cache_lock:
+            block = self.cache.get(epoch)
+            if block is not None:
+                self.cache.move_to_end(epoch)
+        if block is not None:
+            self.cache_hits.inc()
+            return block
+        self.cache_misses.inc()
+        row = self.get_connection().execute("SELECT data FROM blocks WHERE epoch = ?", (epoch,)).fetchone()
+        if row is None:
+            return None
+        block = json.loads(row[0])
+        with self.cache_lock:
+            self.cache[epoch] = block
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return block
+
+
+    def get_block_by_hash(self, block_hash: str) -> dict | None:
+        """
+        Get finalized block with `block_hash`.
+
+        Args:
+            block_hash (str): hash of the block (hexadecimal)
+
+        Returns:
+            dict | None: block (None, if no block with `block_hash` was finalized)
+        """
+        try:
+            block_hash = bytes.fromhex(block_hash)
+        except ValueError:
+            return None
+        row = self.get_connection().execute("SELECT epoch FROM blocks WHERE hash = ?", (block_hash,)).fetchone()
+        return self.get_block(row[0]) if row else None
+
+
+    def get_transaction(self, transaction_id: bytes) -> dict | None:
+        """
+        Get finalized transaction with `transaction_id`, and its block.
+
+        Args:
+            transaction_id (bytes): id of the transaction
+
+        Returns:
+            dict | None: transaction, and epoch and hash of its block (None, if it was not finalized)
+        """
+        row = self.get_connection().execute("SELECT epoch, position FROM transactions WHERE id = ?",
+                                            (transaction_id,)).fetchone()
+        if row is None:
+            return None
+        epoch, position = row
+        block = self.get_block(epoch)
+        if block is None or position >= len(block["transactions"]):
+            return None
+        return {
+            "transaction_id": transaction_id.hex(),
+            "epoch": epoch,
+            "block_hash": block["hash"],
+            "position": position,
+            "transaction": block["transactions"][position]
+        }
+
+
+    def contains_transaction(self, transaction_id: bytes) -> bool:
+        """
+        Check if transaction with `transaction_id` was finalized (without reading its block).
+
+        Args:
+            transaction_id (bytes): id of the transaction
+
+        Returns:
+            bool: True, if and only if the transaction was finalized
+        """
+        return self.get_connection().execute("SELECT 1 FROM transactions WHERE id = ?",
+                                             (transaction_id,)).fetchone() is not None
+
+
+    def get_blocks(self, first_epoch: int, last_epoch: int, limit: int = MAX_RANGE) -> list[dict]:
+        """
+        Get finalized blocks from `first_epoch` to `last_epoch` (inclusive), in order.
+
+        Args:
+            first_epoch (int): first epoch
+            last_epoch (int): last epoch
+            limit (int, optional): maximum number of blocks
+
+        Returns:
+            list[dict]: blocks
+        """
+        rows = self.get_connection().execute(
+            "SELECT data FROM blocks WHERE epoch BETWEEN ? AND ? ORDER BY epoch LIMIT ?",
+            (first_epoch, last_epoch, min(limit, MAX_RANGE))).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+    def get_height(self) -> int | None:
+        """
+        Get epoch of the last finalized block.
+
+        Returns:
+            int | None: epoch (None, if no block was finalized)
+        """
+        return self.get_connection().execute("SELECT MAX(epoch) FROM blocks").fetchone()[0]
+
+
+    def close(self) -> None:
+        """
+        Close the connection used to write blocks.
+        """
+        self.connection.close()
+
+
+class BlockQueryServer:
+    """
+    HTTP server that answers queries of finalized blocks (in JSON):
+    - `/blocks/<epoch>`: block of an epoch
+    - `/blocks/hash/<hash>`: block with a hash
+    - `/blocks?from=<epoch>&to=<epoch>&limit=<number>`: blocks of a range of epochs
+    - `/transactions/<id>`: transaction with a (hexadecimal) id and its block
+    - `/height`: epoch of the last finalized block
+    """
+
+    def __init__(self, block_store: BlockStore, port: int, host: str = "127.0.0.1") -> None:
+        """
+        Constructor.
+
+        Args:
+            block_store (BlockStore): store of finalized blocks
+            port (int): port of the HTTP server
+            host (str, optional): host of the HTTP server
+        """
+        query_time = {index: registry.summary("streamlet_block_query_seconds", "Time spent answering queries.",
+                                              {"index": index})
+                      for index in ("epoch", "hash", "range", "transaction", "height")}
+
+        class QueryHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                start_time = time.perf_counter()
+                url = urlsplit(self.path)
+                parts = url.path.strip("/").split("/")
+                try:
+                    if parts[0] == "blocks" and len(parts) == 2:
+                        index, result = "epoch", block_store.get_block(int(parts[1]))
+                    elif parts[0] == "blocks" and len(parts) == 3 and parts[1] == "hash":
+                        index, result = "hash", block_store.get_block_by_hash(parts[2])
+                    elif parts == ["blocks"]:
+                        query = parse_qs(url.query)
+                        first_epoch = int(query.get("from", ["0"])[0])
+                        last_epoch = int(query.get("to", [str(first_epoch + MAX_RANGE - 1)])[0])
+                        limit = int(query.get("limit", [str(MAX_RANGE)])[0])
+                        index, result = "range", block_store.get_blocks(first_epoch, last_epoch, limit)
+                    elif parts[0] == "transactions" and len(parts) == 2:
+                        transaction_id = bytes.fromhex(parts[1])
+                        if len(transaction_id) != TRANSACTION_ID_SIZE:
+                            raise ValueError("Transaction id is not valid.")
+                        index, result = "transaction", block_store.get_transaction(transaction_id)
+                    elif parts == ["height"]:
+                        index, result = "height", {"epoch": block_store.get_height()}
+                    else:
+                        self.send_error(404)
+                        return
+                except ValueError:
+                    self.send_error(400)
+                    return
+                if result is None:
+                    self.send_error(404)
+                    return
+                body = json.dumps(result).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                query_time[index].observe(time.perf_counter() - start_time)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), QueryHandler)
+        self.thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+
+
+    def start(self) -> None:
+        """
+        Start answering queries (in a background thread).
+        """
+        self.thread.start()
+        logging.info(f"Finalized blocks are served at http://{self.http_server.server_address[0]}:{self.http_server.server_address[1]}/blocks\n")
@@ -0,0 +1,738 @@
+import os
+import queue
+import pickle
+import struct
+import hashlib
+import logging
+import threading
+import time
+from types import NoneType
+from typing import Self
+from block import Block
+from quorumcertificate import QuorumCertificate
+from metrics import registry
+
+# Epoch (uint32), size of the checkpoint (uint64), size of the chunks (uint32)
+# and number of chunks (uint32), followed by the anchor's hash and the chunks' hashes
+MANIFEST_HEADER = struct.Struct(">IQII")
+HASH_SIZE = 32
+CHUNK_SIZE = 256 * 1024
+
+def serialize_block(block: Block, certificate: QuorumCertificate | None = None) -> bytes:
+    """
+    Convert a block (and its certificate) to bytes, to be transferred. The
+    block carries its transactions (compact blocks too) and its parent's epoch.
+
+    Args:
+        block (Block): block
+        certificate (QuorumCertificate | None, optional): certificate of the block
+
+    Returns:
+        bytes: block in serialized form
+    """
+    return pickle.dumps((block.get_parent_hash(), block.get_parent_epoch(), block.get_epoch(), block.get_transactions(),
+                         certificate.to_bytes() if certificate is not None else None))
+
+
+def deserialize_block(data_bytes: bytes) -> tuple[Block, QuorumCertificate | None] | None:
+    """
+    Convert bytes to a block (with its hash) and its certificate.
+    Additionally, check if attributes have the correct type.
+
+    Args:
+        data_bytes (bytes): block in serialized form
+
+    Returns:
+        tuple[Block, QuorumCertificate | None] | None: block and its certificate
+    """
+    try:
+        parent_hash, parent_epoch, epoch, transactions, certificate = pickle.loads(data_bytes)
+    except (pickle.PickleError, ValueError, TypeError, EOFError):
+        logging.error("Transferred block cannot be unpickled.\n")
+        return None
+    if not (isinstance(parent_hash, str) and isinstance(parent_epoch, int) and isinstance(epoch, int)
+            and isinstance(transactions, (list, NoneType)) and isinstance(certificate, (bytes, NoneType))):
+        logging.error("Transferred block attributes do not contain the correct type(s).\n")
+        return None
+    if certificate is not None:
+        certificate = QuorumCertificate.from_bytes(certificate)
+        if certificate is None:
+            return None
+    block = Block(epoch, transactions, parent_hash, parent_epoch)
+    block.calculate_hash()
+    return (block, certificate)
+
+
+def serialize_blocks(blocks: list[bytes]) -> bytes:
+    """
+    Join serialized blocks (see `serialize_block`).
+
+    Args:
+        blocks (list[bytes]): blocks in serialized form
+
+    Returns:
+        bytes: blocks in serialized form
+    """
+    return pickle.dumps(blocks)
+
+
+def deserialize_blocks(data_bytes: bytes) -> list[tuple[Block, QuorumCertificate | None]] | None:
+    """
+    Convert bytes to blocks and their certificates (see `deserialize_block`).
+
+    Args:
+        data_bytes (bytes): blocks in serialized form
+
+    Returns:
+        list[tuple[Block, QuorumCertificate | None]] | None: blocks and their certificates
+    """
+    try:
+        records = pickle.loads(data_bytes)
+    except (pickle.PickleError, ValueError, TypeError, EOFError):
+        logging.error("Transferred blocks cannot be unpickled.\n")
+        return None
+    if not isinstance(records, list) or not all(isinstance(record, bytes) for record in records):
+        logging.error("Transferred blocks do not contain the correct type(s).\n")
+        return None
+    blocks = [deserialize_block(record) for record in records]
+    return None if None in blocks else blocks
+
+
+class Checkpoint:
+    """
+    Class that represents the state of the protocol at a finalized block
+    (the anchor), containing:
+    - Anchor (finalized block, with its transactions)
+    - Position of the leader schedule (state of the leaders' random
+        generator at the start of an epoch, up to the anchor's epoch)
+    - Executed state: filter of finalized transactions (if any)
+
+    Checkpoints of the same anchor are equal in every correct server (so
+    their digests can be compared), and they are not signed: they are
+    trusted once enough servers send the same manifest.
+    """
+
+    def __init__(self, anchor: Block, leader_epoch: int, leader_state: tuple, filter_state: tuple | None = None) -> None:
+        """
+        Constructor.
+
+        Args:
+            anchor (Block): finalized block
+            leader_epoch (int): epoch of the leader schedule's state (at most the anchor's epoch)
+            leader_state (tuple): state of the leaders' random generator, before the leader of `leader_epoch` is chosen
+            filter_state (tuple | None, optional): state of the filter of finalized transactions
+        """
+        self.anchor = anchor
+        self.leader_epoch = leader_epoch
+        self.leader_state = leader_state
+        self.filter_state = filter_state
+
+
+    def get_epoch(self) -> int:
+        """
+        Get epoch of the anchor.
+
+        Returns:
+            int: epoch
+        """
+        return self.anchor.get_epoch()
+
+
+    def get_anchor(self) -> Block:
+        """
+        Get anchor (finalized block).
+
+        Returns:
+            Block: anchor
+        """
+        return self.anchor
+
+
+    def get_leader_epoch(self) -> int:
+        """
+        Get epoch of the leader schedule's state.
+
+        Returns:
+            int: epoch
+        """
+        return self.leader_epoch
+
+
+    def get_leader_state(self) -> tuple:
+        """
+        Get state of the leaders' random generator.
+
+        Returns:
+            tuple: state (see `random.Random.getstate`)
+        """
+        return self.leader_state
+
+
+    def get_filter_state(self) -> tuple | None:
+        """
+        Get state of the filter of finalized transactions.
+
+        Returns:
+            tuple | None: state (see `TransactionFilter.get_state`)
+        """
+        return self.filter_state
+
+
+    def to_bytes(self) -> bytes:
+        """
+        Convert Checkpoint to bytes.
+
+        Returns:
+            bytes: bytes from Checkpoint object
+        """
+        return pickle.dumps((serialize_block(self.anchor), self.leader_epoch, self.leader_state, self.filter_state))
+
+
+    @staticmethod
+    def from_bytes(data_bytes: bytes) -> Self | None:
+        """
+        Convert bytes to Checkpoint (the anchor is finalized). Additionally,
+        check if instance attributes have the correct type.
+
+        Args:
+            data_bytes (bytes): Checkpoint in serialized form
+
+        Returns:
+            Checkpoint: Checkpoint object from bytes
+        """
+        try:
+            anchor, leader_epoch, leader_state, filter_state = pickle.loads(data_bytes)
+        except (pickle.PickleError, ValueError, TypeError, EOFError):
+            logging.error("Checkpoint cannot be unpickled.\n")
+            return None
+        if not (isinstance(anchor, bytes) and isinstance(leader_epoch, int) and isinstance(leader_state, tuple)
+                and isinstance(filter_state, (tuple, NoneType))):
+            logging.error("Checkpoint attributes do not contain the correct type(s).\n")
+            return None
+        anchor = deserialize_block(anchor)
+        if anchor is None or leader_epoch > anchor[0].get_epoch():
+            logging.error("Checkpoint's anchor is not valid.\n")
+            return None
+        anchor = anchor[0]
+        anchor.finalize()
+        return Checkpoint(anchor, leader_epoch, leader_state, filter_state)
+
+
+class Manifest:
+    """
+    Class that describes a checkpoint in serialized form, divided in chunks:
+    epoch and hash of the anchor, size of the checkpoint and of its chunks,
+    and the hash of each chunk (so chunks are checked as they are received).
+    """
+
+    def __init__(self, epoch: int, anchor_hash: str, size: int, chunk_size: int, chunk_hashes: list[bytes]) -> None:
+        """
+        Constructor.
+
+        Args:
+            epoch (int): epoch of the anchor
+            anchor_hash (str): hash of the anchor
+            size (int): size of the checkpoint (in bytes)
+            chunk_size (int): size of the chunks (except the last one)
+            chunk_hashes (list[bytes]): hash of each chunk
+        """
+        self.epoch = epoch
+        self.anchor_hash = anchor_hash
+        self.size = size
+        self.chunk_size = chunk_size
+        self.chunk_hashes = chunk_hashes
+
+
+    @staticmethod
+    def create(checkpoint: Checkpoint, chunk_size: int) -> tuple[Self, list[bytes]]:
+        """
+        Serialize a checkpoint and divide it in chunks.
+
+        Args:
+            checkpoint (Checkpoint): checkpoint
+            chunk_size (int): size of the chunks
+
+        Returns:
+            tuple[Manifest, list[bytes]]: manifest and chunks of the checkpoint
+        """
+        data = checkpoint.to_bytes()
+        chunks = [data[offset:offset+chunk_size] for offset in range(0, len(data), chunk_size)]
+        manifest = Manifest(checkpoint.get_epoch(), checkpoint.get_anchor().get_hash(), len(data), chunk_size,
+                            [hashlib.sha256(chunk).digest() for chunk in chunks])
+        return (manifest, chunks)
+
+
+    def get_epoch(self) -> int:
+        """
+        Get epoch of the anchor.
+
+        Returns:
+            int: epoch
+        """
+        return self.epoch
+
+
+    def get_anchor_hash(self) -> str:
+        """
+        Get hash of the anchor.
+
+        Returns:
+            str: hash
+        """
+        return self.anchor_hash
+
+
+    def get_chunk_number(self) -> int:
+        """
+        Get number of chunks.
+
+        Returns:
+            int: number of chunks
+        """
+        return len(self.chunk_hashes)
+
+
+    def get_digest(self) -> bytes:
+        """
+        Get digest of the manifest (equal manifests describe the same checkpoint).
+
+        Returns:
+            bytes: digest
+        """
+        return hashlib.sha256(self.to_bytes()).digest()
+
+
+    def check_chunk(self, index: int, chunk: bytes) -> bool:
+        """
+        Check if a chunk belongs to the checkpoint.
+
+        Args:
+            index (int): index of the chunk
+            chunk (bytes): chunk
+
+        Returns:
+            bool: True, if and only if the chunk's size and hash match the manifest
+        """
+        if not 0 <= index < len(self.chunk_hashes):
+            return False
+        expected_size = min(self.chunk_size, self.size - index * self.chunk_size)
+        return len(chunk) == expected_size and hashlib.sha256(chunk).digest() == self.chunk_hashes[index]
+
+
+    def to_bytes(self) -> bytes:
+        """
+        Convert Manifest to bytes.
+
+        Returns:
+            bytes: bytes from Manifest object
+        """
+        return (MANIFEST_HEADER.pack(self.epoch, self.size, self.chunk_size, len(self.chunk_hashes))
+                + bytes.fromhex(self.anchor_hash) + b"".join(self.chunk_hashes))
+
+
+    @staticmethod
+    def from_bytes(data_bytes: bytes) -> Self | None:
+        """
+        Convert bytes to Manifest. Additionally, check if the number of
+        chunks matches the sizes.
+
+        Args:
+            data_bytes (bytes): Manifest in serialized form
+
+        Returns:
+            Manifest: Manifest object from bytes
+        """
+        try:
+            epoch, size, chunk_size, chunk_number = MANIFEST_HEADER.unpack_from(data_bytes)
+        except struct.error:
+            logging.error("Manifest header cannot be unpacked.\n")
+            return None
+        offset = MANIFEST_HEADER.size + HASH_SIZE
+        if (chunk_size == 0 or chunk_number != (size + chunk_size - 1) // chunk_size
+                or len(data_bytes) != offset + chunk_number * HASH_SIZE):
+            logging.error("Manifest is malformed.\n")
+            return None
+        anchor_hash = data_bytes[MANIFEST_HEADER.size:offset].hex()
+        chunk_hashes = [data_bytes[index:index+HASH_SIZE] for index in range(offset, len(data_bytes), HASH_SIZE)]
+        return Manifest(epoch, anchor_hash, size, chunk_size, chunk_hashes)
+
+
+class CheckpointStore:
+    """
+    Store of the server's latest checkpoints, created every `interval`
+    epochs of finalized blocks. Checkpoints are serialized, divided in
+    chunks and written (to `directory`, if set) by a background thread, so
+    the protocol only copies its state. The chunks of the kept checkpoints
+    are also held in memory, to be sent to other servers.
+    """
+
+    def __init__(self, interval: int, directory: str | None = None, chunk_size: int = CHUNK_SIZE, keep: int = 2,
+                 asynchronous: bool = True) -> None:
+        """
+        Constructor.
+
+        Args:
+            interval (int): number of epochs between checkpoints
+            directory (str | None, optional): directory of the checkpoint files (if None, checkpoints
+                are only kept in memory)
+            chunk_size (int, optional): size of the chunks (in bytes)
+            keep (int, optional): number of kept checkpoints
+            asynchronous (bool, optional): if set to False, checkpoints are written when they are saved
+                (e.g., by the simulator, to be deterministic)
+        """
+        self.interval = interval
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.keep = keep
+        # Manifest and chunks of each kept checkpoint (by epoch)
+        self.checkpoints = {}
+        self.lock = threading.Lock()
+        self.queue = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        if asynchronous:
+            self.queue = queue.Queue()
+            threading.Thread(target=self.run_writer, daemon=True).start()
+        self.write_time = registry.summary("streamlet_checkpoint_write_seconds",
+                                           "Time spent serializing, hashing and writing checkpoints.")
+        registry.gauge_function("streamlet_checkpoint_epoch", "Epoch of the latest checkpoint.",
+                                lambda: max(self.checkpoints, default=0))
+
+
+    def get_interval(self) -> int:
+        """
+        Get number of epochs between checkpoints.
+
+        Returns:
+            int: interval
+        """
+        return self.interval
+
+
+    def save(self, checkpoint: Checkpoint) -> None:
+        """
+        Save a checkpoint (in the background, if asynchronous).
+
+        Args:
+            checkpoint (Checkpoint): checkpoint
+        """
+        if self.queue is not None:
+            self.queue.put(checkpoint)
+        else:
+            self.write(checkpoint)
+
+
+    def flush(self) -> None:
+        """
+        Wait until every saved checkpoint is written.
+        """
+        if self.queue is not None:
+            self.queue.join()
+
+
+    def run_writer(self) -> None:
+        """
+        Write saved checkpoints (background thread).
+        """
+        while True:
+            checkpoint = self.queue.get()
+            try:
+                self.write(checkpoint)
+            except OSError as error:
+                logging.error("Checkpoint of epoch %d cannot be written: %s\n", checkpoint.get_epoch(), error)
+            finally:
+                self.queue.task_done()
+
+
+    def write(self, checkpoint: Checkpoint) -> None:
+        """
+        Serialize a checkpoint, divide it in chunks and write it. The
+        manifest is written last (a checkpoint without manifest is ignored).
+
+        Args:
+            checkpoint (Checkpoint): checkpoint
+        """
+        start_time = time.perf_counter()
+        manifest, chunks = Manifest.create(checkpoint, self.chunk_size)
+        epoch = manifest.get_epoch()
+        if self.directory is not None:
+            path = os.path.join(self.directory, f"checkpoint_{epoch}")
+            for extension, content in ((".chunks", chunks), (".manifest", [manifest.to_bytes()])):
+                with open(f"{path}{extension}.tmp", "wb") as file:
+                    file.writelines(content)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(f"{path}{extension}.tmp", f"{path}{extension}")
+        with self.lock:
+            self.checkpoints[epoch] = (manifest, chunks)
+            removed_epochs = sorted(self.checkpoints)[:-self.keep]
+            for removed_epoch in removed_epochs:
+                del self.checkpoints[removed_epoch]
+        if self.directory is not None:
+            for removed_epoch in removed_epochs:
+                for extension in (".manifest", ".chunks"):
+                    try:
+                        os.remove(os.path.join(self.directory, f"checkpoint_{removed_epoch}{extension}"))
+                    except FileNotFoundError:
+                        pass
+        self.write_time.observe(time.perf_counter() - start_time)
+        logging.info("Checkpoint of epoch %d was written (%d bytes).\n", epoch, manifest.size)
+
+
+    def get_manifests(self) -> list[Manifest]:
+        """
+        Get manifests of the kept checkpoints (latest first).
+
+        Returns:
+            list[Manifest]: manifests
+        """
+        with self.lock:
+            return [self.checkpoints[epoch][0] for epoch in sorted(self.checkpoints, reverse=True)]
+
+
+    def get_chunk(self, epoch: int, index: int) -> bytes | None:
+        """
+        Get chunk of a kept checkpoint.
+
+        Args:
+            epoch (int): epoch of the checkpoint
+            index (int): index of the chunk
+
+        Returns:
+            bytes | None: chunk (None, if the checkpoint is not kept)
+        """
+        with self.lock:
+            checkpoint = self.checkpoints.get(epoch)
+        if checkpoint is None or not 0 <= index < len(checkpoint[1]):
+            return None
+        return checkpoint[1][index]
+
+
+    def load_latest(self) -> Checkpoint | None:
+        """
+        Load the latest valid checkpoint from `directory` (e.g., when the
+        server restarts), and keep it to be sent to other servers.
+
+        Returns:
+            Checkpoint | None: checkpoint (None, if there is no valid checkpoint)
+        """
+        if self.directory is None:
+            return None
+        epochs = sorted((int(filename[len("checkpoint_"):-len(".manifest")]) for filename in os.listdir(self.directory)
+                         if filename.startswith("checkpoint_") and filename.endswith(".manifest")), reverse=True)
+        for epoch in epochs:
+            path = os.path.join(self.directory, f"checkpoint_{epoch}")
+            try:
+                with open(f"{path}.manifest", "rb") as file:
+                    manifest = Manifest.from_bytes(file.read())
+                with open(f"{path}.chunks", "rb") as file:
+                    data = file.read()
+            except OSError:
+                continue
+            if manifest is None:
+                continue
+            chunks = [data[offset:offset+manifest.chunk_size] for offset in range(0, len(data), manifest.chunk_size)]
+            if len(chunks) != manifest.get_chunk_number() or not all(manifest.check_chunk(index, chunk)
+                                                                     for index, chunk in enumerate(chunks)):
+                logging.error("Checkpoint of epoch %d is corrupted.\n", epoch)
+                continue
+            checkpoint = Checkpoint.from_bytes(data)
+            if checkpoint is None or checkpoint.get_anchor().get_hash() != manifest.get_anchor_hash():
+                continue
+            with self.lock:
+                self.checkpoints[epoch] = (manifest, chunks)
+            return checkpoint
+        return None
+
+
+class CheckpointTransfer:
+    """
+    Download of a checkpoint from the other servers. A manifest is trusted
+    once `quorum` servers (f+1, so at least one of them is correct) send
+    the same manifest. Its chunks are then requested in parallel from
+    those servers (round-robin, with a window of chunks in flight per
+    server), and each chunk is checked against its hash when it arrives.
+    """
+
+    def __init__(self, quorum: int, start_epoch: int, window: int = 4) -> None:
+        """
+        Constructor.
+
+        Args:
+            quorum (int): number of servers that must send the same manifest
+            start_epoch (int): epoch when the transfer started
+            window (int, optional): number of chunks requested at once from each server
+        """
+        self.quorum = quorum
+        self.start_epoch = start_epoch
+        self.window = window
+        # Received manifests and their senders (by digest)
+        self.manifests = {}
+        self.manifest = None
+        self.servers = []
+        self.chunks = {}
+        # Server of each requested chunk (by index)
+        self.requested = {}
+        self.attempts = 0
+        # Epoch when the transfer last made progress (a trusted manifest or a valid chunk)
+        self.progress_epoch = start_epoch
+
+
+    def get_start_epoch(self) -> int:
+        """
+        Get epoch when the transfer started.
+
+        Returns:
+            int: epoch
+        """
+        return self.start_epoch
+
+
+    def get_progress_epoch(self) -> int:
+        """
+        Get epoch when the transfer last made progress.
+
+        Returns:
+            int: epoch
+        """
+        return self.progress_epoch
+
+
+    def set_progress_epoch(self, epoch: int) -> None:
+        """
+        Set epoch when the transfer last made progress.
+
+        Args:
+            epoch (int): epoch
+        """
+        self.progress_epoch = epoch
+
+
+    def get_servers(self) -> list[int]:
+        """
+        Get ids of the servers that sent the trusted manifest.
+
+        Returns:
+            list[int]: ids of the servers
+        """
+        return self.servers
+
+
+    def get_manifest(self) -> Manifest | None:
+        """
+        Get trusted manifest.
+
+        Returns:
+            Manifest | None: manifest (None, if no manifest was sent by `quorum` servers yet)
+        """
+        return self.manifest
+
+
+    def add_manifest(self, manifest: Manifest, sender: int) -> bool:
+        """
+        Add manifest sent by a server.
+
+        Args:
+            manifest (Manifest): manifest
+            sender (int): id of the server
+
+        Returns:
+            bool: True, if and only if the manifest became trusted
+        """
+        if self.manifest is not None:
+            return False
+        _, senders = self.manifests.setdefault(manifest.get_digest(), (manifest, []))
+        if sender not in senders:
+            senders.append(sender)
+        if len(senders) < self.quorum:
+            return False
+        self.manifest = manifest
+        self.servers = sorted(senders)
+        return True
+
+
+    def get_requests(self) -> list[tuple[int, int]]:
+        """
+        Get chunks to request (missing chunks that are not in flight).
+
+        Returns:
+            list[tuple[int, int]]: index of each chunk and id of the server to request it from
+        """
+        if self.manifest is None:
+            return []
+        requests = []
+        in_flight = len(self.requested)
+        for index in range(self.manifest.get_chunk_number()):
+            if in_flight >= self.window * len(self.servers):
+                break
+            if index in self.chunks or index in self.requested:
+                continue
+            server_id = self.servers[(index + self.attempts) % len(self.servers)]
+            self.requested[index] = server_id
+            requests.append((index, server_id))
+            in_flight += 1
+        return requests
+
+
+    def retry(self) -> None:
+        """
+        Request chunks in flight again, from the next server (e.g., after a timeout).
+        """
+        self.attempts += 1
+        self.requested.clear()
+
+
+    def remove_server(self, server_id: int) -> None:
+        """
+        Stop requesting chunks from a server (e.g., it no longer keeps the
+        checkpoint). Its chunks in flight are requested from other servers.
+
+        Args:
+            server_id (int): id of the server
+        """
+        if server_id in self.servers:
+            self.servers.remove(server_id)
+            for index in [index for index, requested_server in self.requested.items() if requested_server == server_id]:
+                del self.requested[index]
+
+
+    def add_chunk(self, index: int, chunk: bytes, sender: int) -> bool:
+        """
+        Add chunk sent by a server.
+
+        Args:
+            index (int): index of the chunk
+            chunk (bytes): chunk
+            sender (int): id of the server
+
+        Returns:
+            bool: True, if and only if the chunk is valid (and it was missing)
+        """
+        if self.manifest is None or index in self.chunks or not self.manifest.check_chunk(index, chunk):
+            return False
+        self.chunks[index] = chunk
+        self.requested.pop(index, None)
+        return True
+
+
+    def is_complete(self) -> bool:
+        """
+        Check if every chunk was received.
+
+        Returns:
+            bool: True, if and only if the checkpoint was received
+        """
+        return self.manifest is not None and len(self.chunks) == self.manifest.get_chunk_number()
+
+
+    def get_checkpoint(self) -> Checkpoint | None:
+        """
+        Get received checkpoint.
+
+        Returns:
+            Checkpoint | None: checkpoint (None, if it is not valid)
+        """
+        checkpoint = Checkpoint.from_bytes(b"".join(self.chunks[index] for index in range(len(self.chunks))))
+        if checkpoint is None or checkpoint.get_anchor().get_hash() != self.manifest.get_anchor_hash():
+            return None
+        return checkpoint
@@ -0,0 +1,72 @@
+import time
+
+class Clock:
+    """
+    Class that provides the current time to the protocol (wall clock).
+    """
+
+    def time(self) -> float:
+        """
+        Get current time.
+
+        Returns:
+            float: seconds since the epoch
+        """
+        return time.time()
+
+
+    def perf_counter(self) -> float:
+        """
+        Get value of a monotonic clock with the highest available resolution.
+
+        Returns:
+            float: seconds of the performance counter
+        """
+        return time.perf_counter()
+
+
+class VirtualClock(Clock):
+    """
+    Class that provides a virtual time, which only advances when requested
+    (used in simulations).
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        """
+        Constructor.
+
+        Args:
+            start (float, optional): initial virtual time
+        """
+        self.now = start
+
+
+    def time(self) -> float:
+        """
+        Get current virtual time.
+
+        Returns:
+            float: virtual time
+        """
+        return self.now
+
+
+    def perf_counter(self) -> float:
+        """
+        Get current virtual time.
+
+        Returns:
+            float: virtual time
+        """
+        return self.now
+
+
+    def advance(self, now: float) -> None:
+        """
+        Advance virtual time to `now`.
+
+        Args:
+            now (float): new virtual time (it never goes backwards)
+        """
+        if now > self.now:
+            self.now = now
@@ -1,16 +1,45 @@
+import os
+import sys
+import signal
+import heapq
+import itertools
 import selectors
 import logging
 import socket
 import struct
 import time
-from multiprocessing import Process, Queue
+import tempfile
+import threading
+from multiprocessing import Process, Queue, Value
 from queue import Empty
-from message import Message
+import crypto
+from message import Message, COMPRESSED, HEADER
+from duplicatefilter import DuplicateFilter
+from inboundqueue import InboundQueue, HIGH, LOW
 from messagetype import MessageType
+from metrics import registry
+from sharedmemoryring import SharedMemoryRing
+from networkemulator import NetworkEmulator
+from messagerecorder import MessageRecorder, FRAME, PROPOSAL
+import compression
+
+# Maximum number of buffers written by a single `sendmsg`
+IOV_MAX = os.sysconf("SC_IOV_MAX") if "SC_IOV_MAX" in os.sysconf_names else 1024
+TRANSPORTS = ("tcp", "unix", "shm")
+# Messages carrying transactions (compressed, when a codec was negotiated)
+COMPRESSIBLE_TYPES = (MessageType.PROPOSE, MessageType.ECHO, MessageType.TRANSACTIONS,
+                      MessageType.TRANSACTION_RESPONSE, MessageType.BATCH, MessageType.BLOCK_RESPONSE,
+                      MessageType.BATCH_RESPONSE)
 
 class CommunicationSystem:
     """
     Manages communication between replicas.
+
+    Frames (length, message and optional tag) are carried by one of the transports:
+    - tcp: TCP connections (default)
+    - unix: Unix domain stream sockets, for replicas on the same host
+    - shm: shared-memory rings (one per sender) and a datagram socket to
+      wake up the receiver, for replicas on the same host
     """
 
     def __init__(self, server_id: int, configuration: dict) -> None:
@@ -27,47 +56,602 @@ class CommunicationSystem:
         self.ip = configuration[server_id][0]
         self.port = configuration[server_id][1]
         self.socket = configuration[server_id][2]
-        self.received_queue = Queue()
+        # Current epoch of the protocol (shared with the receiver process, to prioritize messages)
+        self.epoch = Value("i", 0)
+        self.received_queue = Queue(maxsize=64)
+        self.inbound_queue = InboundQueue()
+        self.peer_sockets = {}
+        self.paused_peers = set()
+        self.duplicate_filter = DuplicateFilter()
+        self.inbound_queue.set_duplicate_filter(self.duplicate_filter)
+        # Receiver processes (each reads and decodes the frames of a group of peers), owner of each peer,
+        # sockets used to hand connections to their owners, and metrics of each receiver process
+        self.ingress_workers = 1
+        self.ingress_owners = {}
+        self.ingress_channels = {}
+        self.worker_metrics = []
+        # Frames waiting to be written to each server (flushed together)
+        self.coalescing = True
+        self.flush_threshold = 65536
+        self.flush_interval = 0.002
+        self.outbound = {id: [] for id in configuration}
+        self.outbound_size = {id: 0 for id in configuration}
+        # Time when the oldest frame queued for each server was queued
+        self.outbound_time = {}
+        self.transport = "tcp"
+        self.transport_directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        self.ring_size = 8 * 1024 * 1024
+        # Rings read by this server (per sender) and rings written by this server (per receiver)
+        self.rings = {}
+        self.outbound_rings = {}
+        # Received frames held by the network emulator (delivery time, sequence, frame and source)
+        self.network_emulator = None
+        self.in_flight = []
+        self.in_flight_sequence = itertools.count()
+        self.recorder = None
+        # Keys are generated before the receiver process is started, so both processes derive the same session keys
+        self.link_authentication = False
+        self.exchange_public_key, self.exchange_private_key = crypto.generate_exchange_keys()
+        self.session_keys = {}
+        # Serialized public keys (RSA) pinned for some servers (the others are trusted on first use)
+        self.pinned_public_keys = {}
+        # Codecs advertised in the key exchange (by preference) and codec used with each server
+        self.codecs = []
+        self.compression_threshold = 1024
+        self.compression_level = 6
+        self.peer_codecs = {}
+        # Last compressed message (broadcasts are compressed once per codec)
+        self.compressed_message = (None, None, None)
+        self.sent_metrics = {}
+        self.received_metrics = {}
+        for id in configuration:
+            for message_type in MessageType:
+                labels = {"type": message_type.name, "peer": id}
+                # Count of messages and sum of their bytes (including framing)
+                self.sent_metrics[(message_type, id)] = registry.summary(
+                    "streamlet_sent_message_bytes", "Size of sent messages.", labels)
+                self.received_metrics[(message_type, id)] = registry.summary(
+                    "streamlet_received_message_bytes", "Size of received messages.", labels)
+        # Repeated proposals/votes are dropped before being deserialized
+        self.duplicate_metrics = registry.summary("streamlet_duplicate_message_bytes",
+                                                  "Size of dropped duplicate messages.")
+        self.authentication_failures = registry.counter("streamlet_link_authentication_failures_total",
+                                                        "Received messages dropped due to an invalid (or missing) tag.")
+        self.compression_seconds = {operation: registry.summary("streamlet_compression_seconds",
+                                                                "Time spent compressing/decompressing messages.",
+                                                                {"operation": operation})
+                                    for operation in ("compress", "decompress")}
+        self.compression_bytes = {stage: registry.counter("streamlet_compression_bytes_total",
+                                                          "Size of compressed messages, before and after compression.",
+                                                          {"stage": stage})
+                                  for stage in ("uncompressed", "compressed")}
+        self.decompression_failures = registry.counter("streamlet_decompression_failures_total",
+                                                       "Received messages dropped due to invalid compressed content.")
+        self.send_syscalls = registry.counter("streamlet_send_syscalls_total", "System calls used to send frames.")
+        self.paused_peers_total = registry.counter("streamlet_inbound_paused_total",
+                                                   "Times that reading from a peer was paused (block policy).")
+        self.staged_messages = registry.gauge("streamlet_inbound_staged_messages",
+                                              "Received messages waiting to be added to the received queue.")
+        registry.gauge_function("streamlet_received_queue_depth", "Messages waiting in the received queue.",
+                                lambda: self.received_queue.qsize())
     
 
-    def send(self, message: bytes, server_id: int) -> None:
+    def get_epoch(self) -> Value:
+        """
+        Get current epoch of the protocol (updated by the protocol).
+
+        Returns:
+            Value: current epoch
+        """
+        return self.epoch
+
+
+    def set_flow_control(self, queue_capacity: int, peer_capacity: int, drop_policy: str) -> None:
+        """
+        Set limits of the inbound path. Must be set before starting the communication system.
+
+        Args:
+            queue_capacity (int): maximum number of messages in the received queue
+            peer_capacity (int): maximum number of staged messages per peer
+            drop_policy (str): policy applied when a peer exceeds its capacity (drop_oldest, drop_newest or block)
+        """
+        self.received_queue = Queue(maxsize=queue_capacity)
+        self.inbound_queue = InboundQueue(peer_capacity, drop_policy)
+        self.inbound_queue.set_duplicate_filter(self.duplicate_filter)
+
+
+    def set_ingress_workers(self, workers: int) -> None:
+        """
+        Set number of receiver processes. Each process owns the connections of
+        a group of peers: it reads, authenticates and decodes their frames
+        (with its own selector) and adds their messages to the received queue,
+        so messages of each peer keep their order. Must be called after
+        `set_transport` and before `start`.
+
+        Args:
+            workers (int): number of receiver processes
+
+        Raises:
+            ValueError: number of processes is not positive, or the shm transport is used with several processes
+        """
+        if workers < 1:
+            raise ValueError("Number of ingress workers must be positive")
+        if workers > 1 and self.transport == "shm":
+            raise ValueError("The shm transport supports a single ingress worker")
+        peers = sorted(id for id in self.configuration if id != self.server_id)
+        self.ingress_workers = max(1, min(workers, len(peers)))
+        self.ingress_owners = {peer: index % self.ingress_workers for index, peer in enumerate(peers)}
+        if self.ingress_workers > 1:
+            # Copies of a message (e.g., echoes) read by different workers are dropped too
+            self.duplicate_filter = DuplicateFilter(shared=True)
+            self.inbound_queue.set_duplicate_filter(self.duplicate_filter)
+            # Each metric is updated by a single process
+            self.worker_metrics = [self.register_worker_metrics(worker) for worker in range(self.ingress_workers)]
+
+
+    def register_worker_metrics(self, worker: int) -> dict:
+        """
+        Register metrics updated by a receiver process (labeled with the process).
+
+        Args:
+            worker (int): index of the receiver process
+
+        Returns:
+            dict: metric of each attribute
+        """
+        labels = {"worker": worker}
+        return {
+            "duplicate_metrics": registry.summary("streamlet_duplicate_message_bytes",
+                                                  "Size of dropped duplicate messages.", labels),
+            "authentication_failures": registry.counter("streamlet_link_authentication_failures_total",
+                                                        "Received messages dropped due to an invalid (or missing) tag.",
+                                                        labels),
+            "compression_seconds": {**self.compression_seconds,
+                                    "decompress": registry.summary("streamlet_compression_seconds",
+                                                                   "Time spent compressing/decompressing messages.",
+                                                                   {"operation": "decompress", **labels})},
+            "decompression_failures": registry.counter("streamlet_decompression_failures_total",
+                                                       "Received messages dropped due to invalid compressed content.",
+                                                       labels),
+            "paused_peers_total": registry.counter("streamlet_inbound_paused_total",
+                                                   "Times that reading from a peer was paused (block policy).", labels),
+            "staged_messages": registry.gauge("streamlet_inbound_staged_messages",
+                                              "Received messages waiting to be added to the received queue.", labels)
+        }
+
+
+    def set_transport(self, transport: str, directory: str | None = None, ring_size: int | None = None) -> None:
+        """
+        Set transport used to carry frames. Must be set before starting the communication system.
+
+        Args:
+            transport (str): transport (tcp, unix or shm)
+            directory (str | None, optional): directory of Unix sockets and shared-memory rings
+            ring_size (int | None, optional): size of each shared-memory ring (in bytes)
+
+        Raises:
+            ValueError: transport is unknown
+        """
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport: {transport}")
+        self.transport = transport
+        if directory:
+            self.transport_directory = directory
+        if ring_size:
+            self.ring_size = ring_size
+
+
+    def check_frame_size(self, frame_size: int) -> None:
+        """
+        Check that frames of `frame_size` bytes can be carried by the
+        transport (shared-memory rings only hold complete frames).
+
+        Args:
+            frame_size (int): size of the largest frame (in bytes)
+
+        Raises:
+            ValueError: frames do not fit in the shared-memory rings
+        """
+        if self.transport == "shm" and frame_size > self.ring_size:
+            raise ValueError(f"Shared-memory rings of {self.ring_size} bytes cannot hold frames of up to "
+                             f"{frame_size} bytes (increase SHM_RING_SIZE)")
+
+
+    def set_network_emulator(self, network_emulator: NetworkEmulator | None) -> None:
+        """
+        Set network emulator, which drops sent frames and delays received
+        frames. Must be set before starting the communication system.
+
+        Args:
+            network_emulator (NetworkEmulator | None): network emulator (None, to disable emulation)
+        """
+        self.network_emulator = network_emulator
+
+
+    def set_recorder(self, recorder: MessageRecorder | None) -> None:
+        """
+        Set recorder of inbound frames (and of the server's proposals).
+        Must be set before starting the communication system.
+
+        Args:
+            recorder (MessageRecorder | None): recorder (None, to disable recording)
+        """
+        self.recorder = recorder
+
+
+    def get_path(self, server_id: int, name: str) -> str:
+        """
+        Get path of a Unix socket or shared-memory ring of server with
+        `server_id` (named after its port, so clusters do not collide).
+
+        Args:
+            server_id (int): id of the server
+            name (str): name of the file (e.g., sock, doorbell or the sender's ring)
+
+        Returns:
+            str: path
+        """
+        return os.path.join(self.transport_directory, f"streamlet-{self.configuration[server_id][1]}-{name}")
+
+
+    def create_socket(self) -> socket.socket:
+        """
+        Create stream socket of the transport.
+
+        Returns:
+            socket.socket: new socket
+        """
+        return socket.socket(socket.AF_UNIX if self.transport == "unix" else socket.AF_INET, socket.SOCK_STREAM)
+
+
+    def get_address(self, server_id: int) -> tuple | str:
+        """
+        Get address of server with `server_id`.
+
+        Args:
+            server_id (int): id of the server
+
+        Returns:
+            tuple | str: IP and port (tcp) or path of the socket (unix)
+        """
+        if self.transport == "unix":
+            return self.get_path(server_id, "sock")
+        return (self.configuration[server_id][0], self.configuration[server_id][1])
+
+
+    def get_exchange_public_key(self) -> bytes:
+        """
+        Get public key used to derive session keys.
+
+        Returns:
+            bytes: key exchange's public key
+        """
+        return self.exchange_public_key
+
+
+    def set_public_keys(self, public_keys: dict) -> None:
+        """
+        Pin public keys (RSA) of servers. Key exchanges of those servers must
+        carry the pinned key, and their key exchange's public key must be
+        signed with it. Must be set before starting the communication system.
+
+        Args:
+            public_keys (dict): public key of each pinned server
+        """
+        self.pinned_public_keys = {server_id: crypto.serialize_public_key(public_key)
+                                   for server_id, public_key in public_keys.items()}
+
+
+    def set_link_authentication(self, link_authentication: bool) -> None:
+        """
+        Enable/disable authentication of messages with session keys (HMAC).
+        Must be set before starting the communication system.
+
+        Args:
+            link_authentication (bool): if set to True, messages carry an authentication tag
+        """
+        self.link_authentication = link_authentication
+
+
+    def establish_session(self, server_id: int, exchange_public_key: bytes) -> None:
+        """
+        Derive session key shared with server with `server_id` (only the first key exchange is accepted).
+
+        Args:
+            server_id (int): id of the other server
+            exchange_public_key (bytes): other server's key exchange public key
+        """
+        if server_id not in self.session_keys and server_id != self.server_id:
+            self.session_keys[server_id] = crypto.derive_session_key(
+                self.exchange_private_key, exchange_public_key, (self.server_id, server_id))
+
+
+    def set_compression(self, codecs: list[str], threshold: int, level: int) -> None:
+        """
+        Set codecs advertised to other servers (by preference). Messages
+        carrying transactions are compressed with the first codec that is
+        also advertised by the receiving server. Must be set before
+        exchanging public keys.
+
+        Args:
+            codecs (list[str]): names of the codecs (an empty list disables compression)
+            threshold (int): minimum size of compressed messages (in bytes)
+            level (int): compression level
+
+        Raises:
+            ValueError: a codec is not registered
+        """
+        self.codecs = [compression.get_codec(name) for name in codecs]
+        self.compression_threshold = threshold
+        self.compression_level = level
+
+
+    def get_codecs(self) -> list[str]:
+        """
+        Get names of the codecs advertised to other servers.
+
+        Returns:
+            list[str]: names of the codecs
+        """
+        return [codec.get_name() for codec in self.codecs]
+
+
+    def negotiate_codec(self, server_id: int, codecs: list[str]) -> None:
+        """
+        Select codec used with server with `server_id` (only the first key exchange is accepted).
+
+        Args:
+            server_id (int): id of the other server
+            codecs (list[str]): names of the codecs advertised by the other server
+        """
+        if server_id in self.peer_codecs or server_id == self.server_id:
+            return
+        for codec in self.codecs:
+            if codec.get_name() in codecs:
+                self.peer_codecs[server_id] = codec
+                return
+
+
+    def compress(self, message: bytes, codec: compression.Codec) -> bytes:
+        """
+        Compress message with `codec` (the message is kept, if it does not become smaller).
+
+        Args:
+            message (bytes): message in serialized form
+            codec (compression.Codec): codec
+
+        Returns:
+            bytes: compressed message
+        """
+        if self.compressed_message[0] is not message or self.compressed_message[1] is not codec:
+            start_time = time.perf_counter()
+            compressed_message = compression.compress_frame(message, codec, self.compression_level)
+            self.compression_seconds["compress"].observe(time.perf_counter() - start_time)
+            if len(compressed_message) >= len(message):
+                compressed_message = message
+            self.compression_bytes["uncompressed"].inc(len(message))
+            self.compression_bytes["compressed"].inc(len(compressed_message))
+            self.compressed_message = (message, codec, compressed_message)
+        return self.compressed_message[2]
+
+
+    def set_coalescing(self, coalescing: bool, flush_threshold: int, flush_interval: float = 0.002) -> None:
         """
-        Send `message` to server with `server_id`.
+        Enable/disable coalescing of frames sent to the same server.
+
+        Args:
+            coalescing (bool): if set to True, frames are written when messages are
+                requested (`get_message`), when `flush_threshold` bytes are pending or
+                when the oldest pending frame was queued `flush_interval` seconds ago
+            flush_threshold (int): number of pending bytes that triggers a write
+            flush_interval (float, optional): maximum time that a frame waits to be written (in seconds)
+        """
+        self.coalescing = coalescing
+        self.flush_threshold = flush_threshold
+        self.flush_interval = flush_interval
+
+
+    def send(self, message: bytes, server_id: int, message_type: MessageType | None = None) -> int:
+        """
+        Send `message` to server with `server_id`. The frame is queued and
+        written together with other frames queued for the same server.
 
         Args:
             message (Message): message to send
             server_id (int): id of receiving server
+            message_type (MessageType | None, optional): type of the message (for metrics)
+
+        Returns:
+            int: size of the sent message (after compression)
+
+        Raises:
+            ValueError: frame does not fit in the shared-memory ring of the receiving server
+        """
+        # Bootstrap messages are never dropped (or delayed by coalescing), as replicas would not start together
+        bootstrap = Message.parse_header(message)[0] in (MessageType.PK_EXCHANGE, MessageType.READY)
+        if self.network_emulator and not bootstrap and self.network_emulator.drops(server_id, self.epoch.value):
+            return 0
+        # Only messages carrying transactions are compressed (votes and certificates are small or incompressible)
+        codec = self.peer_codecs.get(server_id)
+        if (codec and len(message) >= self.compression_threshold
+                and Message.parse_header(message)[0] in COMPRESSIBLE_TYPES):
+            message = self.compress(message, codec)
+        # Header, message and tag are written with scatter/gather I/O (instead of being concatenated)
+        frame = [message]
+        # Public keys are exchanged before session keys exist
+        if self.link_authentication and server_id in self.session_keys:
+            frame.append(crypto.calculate_tag(self.session_keys[server_id], message))
+        size = sum(len(buffer) for buffer in frame)
+        # A frame larger than the receiver's ring would never be read (see `check_frame_size`)
+        if self.transport == "shm" and server_id in self.outbound_rings:
+            capacity = self.outbound_rings[server_id].get_capacity()
+            if size + 4 > capacity:
+                raise ValueError(f"Frame of {size + 4} bytes does not fit in the shared-memory ring of server "
+                                 f"{server_id} ({capacity} bytes)")
+        if not self.outbound[server_id]:
+            self.outbound_time[server_id] = time.monotonic()
+        self.outbound[server_id].append(struct.pack(">I", size))
+        self.outbound[server_id].extend(frame)
+        self.outbound_size[server_id] += size + 4
+        metrics = self.sent_metrics.get((message_type, server_id))
+        if metrics:
+            metrics.observe(size + 4)
+        if bootstrap or not self.coalescing or self.outbound_size[server_id] >= self.flush_threshold:
+            self.flush_outbound(server_id)
+        else:
+            self.flush_due()
+        return len(message)
+
+
+    def flush_outbound(self, server_id: int) -> None:
+        """
+        Write frames queued for server with `server_id`.
+
+        Args:
+            server_id (int): id of receiving server
         """
-        receiver_info = self.configuration[server_id]
-        receiver_address = (receiver_info[0], receiver_info[1])
-        sender_socket = receiver_info[2]
-        message = struct.pack(">I", len(message)) + message
+        buffers = self.outbound[server_id]
+        if not buffers:
+            return
+        self.outbound[server_id] = []
+        self.outbound_size[server_id] = 0
+        self.outbound_time.pop(server_id, None)
+        sender_socket = self.configuration[server_id][2]
         try:
-            sender_socket.sendall(message)
+            if self.transport == "shm":
+                self.write_to_ring(server_id, buffers)
+            else:
+                self.write(sender_socket, buffers)
         # Handle server disconnection
         except BrokenPipeError:
             logging.error(f"Server {server_id} disconnected.\n")
             self.configuration.pop(server_id)
+            self.outbound.pop(server_id)
+            self.outbound_size.pop(server_id)
+            return
         # Reconnect before sending data to server
         except ConnectionError:
-            while sender_socket.connect_ex(receiver_address) != 0:
-                sender_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                logging.debug(f"Retrying to establish connection with server {id}...")
+            while sender_socket.connect_ex(self.get_address(server_id)) != 0:
+                sender_socket = self.create_socket()
+                logging.debug("Retrying to establish connection with server %s...", server_id)
                 time.sleep(0.1)
+            if self.transport == "tcp":
+                sender_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.configuration[server_id][2] = sender_socket
-            sender_socket.sendall(message)
+            self.write(sender_socket, buffers)
+
+
+    def flush_all_outbound(self) -> None:
+        """
+        Write frames queued for every server.
+        """
+        for server_id in list(self.outbound.keys()):
+            self.flush_outbound(server_id)
+
+
+    def flush_due(self) -> None:
+        """
+        Write frames queued for servers whose oldest frame waited at least
+        `flush_interval` (e.g., while the protocol processes stored messages
+        without requesting new ones).
+        """
+        now = time.monotonic()
+        for server_id, queued_time in list(self.outbound_time.items()):
+            if now - queued_time >= self.flush_interval:
+                self.flush_outbound(server_id)
+
+
+    def write(self, sender_socket: socket.socket, buffers: list) -> None:
+        """
+        Write `buffers` to `sender_socket` with as few system calls as possible.
+
+        Args:
+            sender_socket (socket.socket): socket connected to the receiving server
+            buffers (list): buffers to write (in order)
+        """
+        # Hold partial segments until every buffer is written, when more than one call is needed
+        # (Unix domain sockets have no segments, nor TCP options)
+        cork = self.transport == "tcp" and len(buffers) > IOV_MAX and hasattr(socket, "TCP_CORK")
+        if cork:
+            sender_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+        while buffers:
+            sent = sender_socket.sendmsg(buffers[:IOV_MAX])
+            self.send_syscalls.inc()
+            buffers = self.skip_written(buffers, sent)
+        if cork:
+            sender_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+
+
+    def write_to_ring(self, server_id: int, buffers: list) -> None:
+        """
+        Write `buffers` to the shared-memory ring of server with `server_id`
+        and wake it up (waiting for space while the ring is full).
+
+        Args:
+            server_id (int): id of receiving server
+            buffers (list): buffers to write (in order)
+
+        Raises:
+            BrokenPipeError: receiving server is not running
+        """
+        ring = self.outbound_rings[server_id]
+        doorbell = self.get_path(server_id, "doorbell")
+        while buffers:
+            written = ring.write(buffers)
+            buffers = self.skip_written(buffers, written)
+            try:
+                self.configuration[server_id][2].sendto(b"\0", doorbell)
+                self.send_syscalls.inc()
+            # Receiver has pending wake-ups
+            except BlockingIOError:
+                pass
+            except (ConnectionRefusedError, FileNotFoundError):
+                raise BrokenPipeError
+            if buffers and not written:
+                time.sleep(0.0005)
+
+
+    @staticmethod
+    def skip_written(buffers: list, written: int) -> list:
+        """
+        Remove written bytes from `buffers` (writes may end in the middle of a buffer).
+
+        Args:
+            buffers (list): buffers to write (in order)
+            written (int): number of written bytes
+
+        Returns:
+            list: buffers still to write
+        """
+        index = 0
+        while index < len(buffers) and written >= len(buffers[index]):
+            written -= len(buffers[index])
+            index += 1
+        buffers = buffers[index:]
+        if written:
+            buffers[0] = memoryview(buffers[0])[written:]
+        return buffers
 
 
-    def broadcast(self, message: Message) -> None:
+    def broadcast(self, message: Message, message_type: MessageType | None = None) -> int:
         """
         Broadcast `message` to every server.
 
         Args:
             message (Message): message to broadcast
+            message_type (MessageType | None, optional): type of the message (for metrics)
+
+        Returns:
+            int: size of the sent messages (after compression)
         """
+        # Own proposals (and disseminated transactions) are recorded, as their transactions are not in inbound frames
+        if self.recorder and message_type in (MessageType.PROPOSE, MessageType.TRANSACTIONS, MessageType.BATCH):
+            self.recorder.record(PROPOSAL, time.time(), message)
+        sent_bytes = 0
         for id in list(self.configuration.keys()):
             if id != self.server_id:
-                self.send(message, id)
+                sent_bytes += self.send(message, id, message_type)
+        return sent_bytes
 
 
     def receive(self, socket: socket.socket) -> None:
@@ -79,15 +663,166 @@ class CommunicationSystem:
         """
         data = self.read_all_from_socket(socket)
         if data:
-            message = Message.from_bytes(data)
-            if message:
-                if message.get_type() == MessageType.ECHO:
-                    nested_message = message.get_content()
-                    self.received_queue.put(nested_message)
-                else:
-                    self.received_queue.put(message)
-                # Print received data
-                logging.debug(f"Received message - {message}")
+            self.arrive(data, socket)
+
+
+    def arrive(self, data: bytes, source: socket.socket | SharedMemoryRing) -> None:
+        """
+        Deliver received frame now or, with network emulation, when the emulated link delivers it.
+
+        Args:
+            data (bytes): received frame (without its length)
+            source (socket.socket | SharedMemoryRing): socket or ring where the frame was read
+        """
+        header = Message.parse_header(data) if self.network_emulator else None
+        if header is None:
+            self.deliver(data, source)
+            return
+        delivery_time = self.network_emulator.get_delivery_time(header[1], len(data) + 4, time.time(), self.epoch.value)
+        heapq.heappush(self.in_flight, (delivery_time, next(self.in_flight_sequence), data, source))
+
+
+    def deliver_due(self) -> None:
+        """
+        Deliver frames held by the network emulator whose delivery time has passed.
+        """
+        now = time.time()
+        while self.in_flight and self.in_flight[0][0] <= now:
+            _, _, data, source = heapq.heappop(self.in_flight)
+            self.deliver(data, source)
+
+
+    def deliver(self, data: bytes, source: socket.socket | SharedMemoryRing) -> None:
+        """
+        Authenticate, deduplicate and decode received frame, and stage its message.
+
+        Args:
+            data (bytes): received frame (without its length)
+            source (socket.socket | SharedMemoryRing): socket or ring where the frame was read
+        """
+        if self.link_authentication:
+            data = self.authenticate(data)
+            if data is None:
+                self.authentication_failures.inc()
+                return
+        # Metrics count the size on the wire
+        size = len(data) + 4
+        if data and data[0] & COMPRESSED:
+            start_time = time.perf_counter()
+            data = compression.decompress_frame(data)
+            self.compression_seconds["decompress"].observe(time.perf_counter() - start_time)
+            if data is None:
+                self.decompression_failures.inc()
+                return
+        # Duplicates are recorded too, as they are part of the traffic pattern
+        if self.recorder:
+            self.recorder.record(FRAME, time.time(), data)
+        # Messages dropped by the inbound queue are forgotten by the filter (see `InboundQueue`)
+        fingerprint = self.duplicate_filter.get_fingerprint(data)
+        if fingerprint is not None and self.duplicate_filter.check(fingerprint):
+            self.duplicate_metrics.observe(size)
+            return
+        message = Message.from_bytes(data)
+        if message:
+            metrics = self.received_metrics.get((message.get_type(), message.get_sender()))
+            if metrics:
+                metrics.observe(size)
+            peer = message.get_sender()
+            self.peer_sockets[peer] = source
+            # Echoes, batches (of the availability layer) and messages from old epochs have low priority
+            if message.get_type() == MessageType.ECHO:
+                message = message.get_content()
+                message.set_fingerprint(fingerprint)
+                priority = LOW
+            elif message.get_type() == MessageType.BATCH:
+                message.set_authenticated(self.link_authentication)
+                priority = LOW
+            elif message.get_type() == MessageType.PK_EXCHANGE or message.get_type() == MessageType.READY:
+                if message.get_type() == MessageType.PK_EXCHANGE:
+                    public_key, exchange_public_key, exchange_signature, codecs = message.get_content()
+                    pinned_public_key = self.pinned_public_keys.get(peer)
+                    if pinned_public_key is not None and public_key != pinned_public_key:
+                        logging.error("Public key of server %d does not match its pinned key.\n", peer)
+                        self.authentication_failures.inc()
+                        return
+                    if exchange_public_key is not None:
+                        # Session keys are only derived from keys signed by the sender (see `crypto.verify_exchange_key`)
+                        if not crypto.verify_exchange_key(exchange_signature, exchange_public_key, peer,
+                                                          crypto.load_public_key(public_key)):
+                            logging.error("Key exchange's public key of server %d has an invalid signature.\n", peer)
+                            self.authentication_failures.inc()
+                            return
+                        self.establish_session(peer, exchange_public_key)
+                    self.negotiate_codec(peer, codecs)
+                priority = HIGH
+            else:
+                # Messages that were not relayed are authenticated by the link
+                message.set_authenticated(self.link_authentication)
+                message.set_fingerprint(fingerprint)
+                priority = HIGH if message.get_content().get_epoch() >= self.epoch.value else LOW
+            if not self.inbound_queue.put(message, peer, priority):
+                self.pause(peer)
+            # Print received data
+            logging.debug("Received message - %s", message)
+
+
+    def flush(self) -> None:
+        """
+        Move staged messages to the received queue, until it is full, and
+        resume reading from paused peers with space for new messages.
+        """
+        # Other receiver processes may fill the queue after the check (then, this one waits for the protocol)
+        while self.inbound_queue.get_size() and not self.received_queue.full():
+            self.received_queue.put(self.inbound_queue.pop())
+        self.staged_messages.set(self.inbound_queue.get_size())
+        for peer in list(self.paused_peers):
+            if self.inbound_queue.get_size(peer) < self.inbound_queue.peer_capacity // 2:
+                self.paused_peers.discard(peer)
+                # Rings are not polled by the selector (their frames are read when the receiver is woken up)
+                if self.transport == "shm":
+                    self.read_ring(peer)
+                elif self.peer_sockets[peer].fileno() != -1:
+                    self.selector.register(self.peer_sockets[peer], selectors.EVENT_READ, self.receive)
+
+
+    def pause(self, peer: int) -> None:
+        """
+        Stop reading from `peer`'s socket or ring (backpressure), until its staged messages are taken.
+
+        Args:
+            peer (int): id of the server
+        """
+        if peer not in self.paused_peers:
+            self.paused_peers.add(peer)
+            self.paused_peers_total.inc()
+            if self.transport != "shm":
+                self.selector.unregister(self.peer_sockets[peer])
+
+
+    def authenticate(self, data: bytes) -> bytes | None:
+        """
+        Verify the tag at the end of `data`, using the session key shared
+        with the sender. Public keys are exchanged without tags.
+
+        Args:
+            data (bytes): received data
+
+        Returns:
+            bytes | None: data without the tag (None, if the tag is invalid)
+        """
+        header = Message.parse_header(data)
+        if header is None:
+            return None
+        message_type, sender, _ = header
+        if message_type == MessageType.PK_EXCHANGE:
+            return data if sender not in self.session_keys else None
+        session_key = self.session_keys.get(sender)
+        if session_key is None or len(data) < crypto.TAG_SIZE:
+            return None
+        content = data[:-crypto.TAG_SIZE]
+        if not crypto.verify_tag(data[-crypto.TAG_SIZE:], session_key, content):
+            return None
+        return content
 
 
     def read_from_socket(self, socket: socket.socket, num_bytes: int) -> bytes:
@@ -141,51 +876,235 @@ class CommunicationSystem:
             socket (Socket): current server socket
         """
         connection_socket, connection_address = socket.accept()
-        self.selector.register(connection_socket, selectors.EVENT_READ, self.receive)
+        # With several receiver processes, the peer is identified before its connection is read
+        self.selector.register(connection_socket, selectors.EVENT_READ,
+                               self.dispatch if self.ingress_workers > 1 else self.receive)
+
+
+    def dispatch(self, connection: socket.socket) -> None:
+        """
+        Hand new connection to the receiver process owning its peer. The peer
+        is identified by the header of the first frame, which is peeked (so
+        the frame is read by the owner).
+
+        Args:
+            connection (socket.socket): accepted connection
+        """
+        data = connection.recv(4 + HEADER.size, socket.MSG_PEEK)
+        if data and len(data) < 4 + HEADER.size:
+            # Wait for the rest of the header
+            return
+        self.selector.unregister(connection)
+        header = Message.parse_header(data, 4) if data else None
+        worker = self.ingress_owners.get(header[1]) if header else None
+        if worker is None:
+            connection.close()
+        elif worker == 0:
+            self.selector.register(connection, selectors.EVENT_READ, self.receive)
+        else:
+            socket.send_fds(self.ingress_channels[worker][0], [b"\0"], [connection.fileno()])
+            connection.close()
+
+
+    def adopt(self, channel: socket.socket) -> None:
+        """
+        Receive connection handed by the first receiver process, and read it.
+
+        Args:
+            channel (socket.socket): socket where connections are handed to this process
+        """
+        _, fds, _, _ = socket.recv_fds(channel, 1, 1)
+        for fd in fds:
+            self.selector.register(socket.socket(fileno=fd), selectors.EVENT_READ, self.receive)
 
 
-    def listen(self) -> None:
+    def wake(self, doorbell: socket.socket) -> None:
+        """
+        Read frames from the shared-memory rings, after being woken up by a sender.
+
+        Args:
+            doorbell (socket.socket): datagram socket used to wake up the receiver
+        """
+        # Wake-ups are discarded before reading, so frames written after this point wake up the receiver again
+        try:
+            while True:
+                doorbell.recv(64)
+        except BlockingIOError:
+            pass
+        for peer in self.rings:
+            self.read_ring(peer)
+
+
+    def read_ring(self, peer: int) -> None:
+        """
+        Read frames from `peer`'s shared-memory ring (while reading from `peer` is not paused).
+
+        Args:
+            peer (int): id of the server
+        """
+        ring = self.rings[peer]
+        while peer not in self.paused_peers:
+            frames = ring.read()
+            if not frames:
+                return
+            # Frames taken from the ring are staged, even if reading from `peer` is paused meanwhile
+            for data in frames:
+                self.arrive(data, ring)
+
+
+    def listen(self, worker: int = 0) -> None:
         """
         Listen for new or existing connections.
+
+        Args:
+            worker (int, optional): index of the receiver process (the first one accepts connections)
         """
+        if self.worker_metrics:
+            for name, metric in self.worker_metrics[worker].items():
+                setattr(self, name, metric)
         self.selector = selectors.DefaultSelector()
-        self.selector.register(self.socket, selectors.EVENT_READ, self.accept)
+        if worker == 0:
+            self.selector.register(self.socket, selectors.EVENT_READ,
+                                   self.wake if self.transport == "shm" else self.accept)
+        else:
+            self.selector.register(self.ingress_channels[worker][1], selectors.EVENT_READ, self.adopt)
+        # Buffered records are written when the receiver is terminated
+        if self.recorder:
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
         try:
             while True:
-                events = self.selector.select()
+                # Poll while there are staged messages, as the received queue may be full
+                timeout = 0.001 if self.inbound_queue.get_size() else None
+                # Wake up when the next frame held by the network emulator is due
+                if self.in_flight:
+                    due_time = max(0.0, self.in_flight[0][0] - time.time())
+                    timeout = due_time if timeout is None else min(timeout, due_time)
+                # Buffered records are written even if no more frames arrive
+                if self.recorder and self.recorder.has_pending():
+                    flush_interval = self.recorder.get_flush_interval()
+                    timeout = flush_interval if timeout is None else min(timeout, flush_interval)
+                events = self.selector.select(timeout)
                 for key, mask in events:
                     callback = key.data
                     callback(key.fileobj)
+                self.deliver_due()
+                if self.recorder:
+                    self.recorder.flush_if_due()
+                self.flush()
         except KeyboardInterrupt:
             self.selector.close()
+        finally:
+            if self.recorder:
+                self.recorder.flush()
 
 
-    def establish_connections(self):
+    def establish_connections(self) -> None:
         """
-        Establish connection with servers.
+        Establish connection with servers (concurrently).
         """
-        for id in list(self.configuration.keys()):
-            if self.server_id != id:
-                while self.configuration[id][2].connect_ex((self.configuration[id][0], self.configuration[id][1])) != 0:
-                    self.configuration[id][2] = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    logging.debug(f"Retrying to establish connection with server {id}...")
-                    time.sleep(0.1)
+        threads = [threading.Thread(target=self.connect, args=(id,))
+                   for id in list(self.configuration.keys()) if id != self.server_id]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+    def connect(self, server_id: int) -> None:
+        """
+        Connect to server with `server_id`, retrying with exponential backoff.
+
+        Args:
+            server_id (int): id of the server
+        """
+        if self.transport == "shm":
+            self.attach(server_id)
+            return
+        # Sockets of the configuration are TCP sockets
+        if self.transport != "tcp":
+            self.configuration[server_id][2].close()
+            self.configuration[server_id][2] = self.create_socket()
+        address = self.get_address(server_id)
+        delay = 0.005
+        while self.configuration[server_id][2].connect_ex(address) != 0:
+            self.configuration[server_id][2].close()
+            self.configuration[server_id][2] = self.create_socket()
+            logging.debug("Retrying to establish connection with server %s...", server_id)
+            time.sleep(delay)
+            delay = min(2 * delay, 0.1)
+        # Frames are coalesced by the sender, so Nagle's algorithm would only delay them
+        if self.transport == "tcp":
+            self.configuration[server_id][2].setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+    def attach(self, server_id: int) -> None:
+        """
+        Attach to the shared-memory ring of server with `server_id`, retrying
+        with exponential backoff until the server is woken up successfully.
+
+        Args:
+            server_id (int): id of the server
+        """
+        self.configuration[server_id][2].close()
+        doorbell = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        doorbell.setblocking(False)
+        self.configuration[server_id][2] = doorbell
+        # The receiver binds its doorbell after creating the rings (stale doorbells refuse datagrams)
+        delay = 0.005
+        while True:
+            try:
+                doorbell.sendto(b"\0", self.get_path(server_id, "doorbell"))
+                break
+            except BlockingIOError:
+                break
+            except (ConnectionRefusedError, FileNotFoundError):
+                logging.debug("Retrying to attach to server %s...", server_id)
+                time.sleep(delay)
+                delay = min(2 * delay, 0.1)
+        path = self.get_path(server_id, f"{self.server_id}.ring")
+        self.outbound_rings[server_id] = SharedMemoryRing(path)
+        # Ring is removed when both servers unmap it
+        os.unlink(path)
 
 
     def start(self) -> None:
         """
-        Prepare socket for listening to connections and launch process to handle all received data.
+        Prepare socket for listening to connections (or rings and doorbell, for
+        the shm transport) and launch processes to handle all received data.
         """
-        self.socket.bind((self.ip, self.port))
-        self.socket.listen(100)
-        receiver_process = Process(target=self.listen)
-        receiver_process.start()
+        if self.transport == "tcp":
+            self.socket.bind((self.ip, self.port))
+            self.socket.listen(100)
+        else:
+            self.socket.close()
+            if self.transport == "unix":
+                self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                path = self.get_path(self.server_id, "sock")
+            else:
+                for id in self.configuration:
+                    if id != self.server_id:
+                        self.rings[id] = SharedMemoryRing(self.get_path(self.server_id, f"{id}.ring"),
+                                                          self.ring_size, create=True)
+                self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self.socket.setblocking(False)
+                path = self.get_path(self.server_id, "doorbell")
+            # Remove socket left by a previous run
+            if os.path.exists(path):
+                os.unlink(path)
+            self.socket.bind(path)
+            if self.transport == "unix":
+                self.socket.listen(100)
+        self.ingress_channels = {worker: socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+                                 for worker in range(1, self.ingress_workers)}
+        for worker in range(self.ingress_workers):
+            receiver_process = Process(target=self.listen, args=(worker,))
+            receiver_process.start()
         self.establish_connections()
 
 
     def get_message(self, timeout: float | None) -> Message:
         """
-        Get message.
+        Get message (after writing queued frames).
 
         Args:
             timeout (float | None): time to wait before raising `TimeoutError`
@@ -196,6 +1115,8 @@ class CommunicationSystem:
         Returns:
             Message: message
         """
+        # Frames are written before waiting for messages
+        self.flush_all_outbound()
         try:
             message = self.received_queue.get(timeout=timeout)
             return message
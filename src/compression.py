@@ -0,0 +1,152 @@
+import zlib
+import struct
+from typing import Callable
+from message import HEADER as MESSAGE_HEADER, COMPRESSED
+
+# Header of compressed content: codec's id (uint8) and size of the uncompressed content (uint32)
+HEADER = struct.Struct(">BI")
+
+class Codec:
+    """
+    Compression codec of the wire format, identified by its name (when
+    negotiated with other servers) and by its id (in compressed frames).
+    """
+
+    def __init__(self, name: str, codec_id: int, compress: Callable[[bytes, int], bytes],
+                 decompress: Callable[[bytes, int], bytes]) -> None:
+        """
+        Constructor.
+
+        Args:
+            name (str): name of the codec
+            codec_id (int): id of the codec (1-255)
+            compress (Callable[[bytes, int], bytes]): compresses data (given the compression level)
+            decompress (Callable[[bytes, int], bytes]): decompresses data (given the size of the
+                uncompressed data, which must not be exceeded), raising ValueError if data is not valid
+        """
+        self.name = name
+        self.codec_id = codec_id
+        self.compress = compress
+        self.decompress = decompress
+
+
+    def get_name(self) -> str:
+        """
+        Get name of the codec.
+
+        Returns:
+            str: name
+        """
+        return self.name
+
+
+    def get_id(self) -> int:
+        """
+        Get id of the codec.
+
+        Returns:
+            int: id
+        """
+        return self.codec_id
+
+
+def zlib_decompress(data: bytes, size: int) -> bytes:
+    """
+    Decompress zlib data, without exceeding `size` bytes.
+
+    Args:
+        data (bytes): compressed data
+        size (int): size of the uncompressed data
+
+    Raises:
+        zlib.error: data is not valid (or it exceeds `size` bytes)
+
+    Returns:
+        bytes: uncompressed data
+    """
+    decompressor = zlib.decompressobj()
+    # A maximum length of 0 means no limit (content of 1 byte is enough to detect the mismatch)
+    content = decompressor.decompress(data, max(size, 1))
+    if decompressor.unconsumed_tail or not decompressor.eof:
+        raise zlib.error("Compressed data exceeds its declared size.")
+    return content
+
+
+CODECS = {}
+
+def register_codec(codec: Codec) -> None:
+    """
+    Register codec, so it can be negotiated (e.g., codecs of optional packages).
+
+    Args:
+        codec (Codec): codec
+    """
+    CODECS[codec.get_name()] = codec
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Get registered codec.
+
+    Args:
+        name (str): name of the codec
+
+    Raises:
+        ValueError: codec is not registered
+
+    Returns:
+        Codec: codec
+    """
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec: {name}")
+    return CODECS[name]
+
+
+def compress_frame(data: bytes, codec: Codec, level: int) -> bytes:
+    """
+    Compress the content of a serialized message. The header is kept (with
+    the compressed flag set in the message's type), followed by the codec's
+    id, the size of the uncompressed content and the compressed content.
+
+    Args:
+        data (bytes): Message in serialized form
+        codec (Codec): codec
+        level (int): compression level
+
+    Returns:
+        bytes: compressed message
+    """
+    message_type, sender_id, epoch = MESSAGE_HEADER.unpack_from(data)
+    content = memoryview(data)[MESSAGE_HEADER.size:]
+    return (MESSAGE_HEADER.pack(message_type | COMPRESSED, sender_id, epoch) + HEADER.pack(codec.get_id(), len(content))
+            + codec.compress(content, level))
+
+
+def decompress_frame(data: bytes) -> bytes | None:
+    """
+    Decompress a compressed message.
+
+    Args:
+        data (bytes): compressed message
+
+    Returns:
+        bytes | None: Message in serialized form (None, if the codec is unknown or data is not valid)
+    """
+    try:
+        message_type, sender_id, epoch = MESSAGE_HEADER.unpack_from(data)
+        codec_id, size = HEADER.unpack_from(data, MESSAGE_HEADER.size)
+    except struct.error:
+        return None
+    for codec in CODECS.values():
+        if codec.get_id() == codec_id:
+            try:
+                content = codec.decompress(memoryview(data)[MESSAGE_HEADER.size+HEADER.size:], size)
+            except (zlib.error, ValueError):
+                return None
+            if len(content) != size:
+                return None
+            return MESSAGE_HEADER.pack(message_type & ~COMPRESSED, sender_id, epoch) + content
+    return None
+
+
+register_codec(Codec("zlib", 1, lambda data, level: zlib.compress(data, level), zlib_decompress))
@@ -1,6 +1,17 @@
 # Cryptographic functions based on the package's documentation (version 42.0.8) (https://cryptography.io/en/42.0.8/)
-from cryptography.hazmat.primitives.asymmetric import rsa, padding, utils
+import os
+import hmac
+from cryptography.hazmat.primitives.asymmetric import rsa, padding, utils, x25519
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes, serialization
+from time import perf_counter
+from metrics import registry
+
+SIGN_TIME = registry.summary("streamlet_signature_sign_seconds", "Time spent signing content.")
+VERIFY_TIME = registry.summary("streamlet_signature_verify_seconds", "Time spent verifying signatures.")
+TAG_SIZE = 16
+BATCH_VERIFY_TIME = registry.summary("streamlet_signature_batch_verify_seconds",
+                                     "Time spent verifying batches of signatures (e.g., quorum certificates).")
 
 def generate_keys(key_size: int = 2048) -> tuple[rsa.RSAPublicKey, rsa.RSAPrivateKey]:
     """
@@ -20,6 +31,40 @@ def generate_keys(key_size: int = 2048) -> tuple[rsa.RSAPublicKey, rsa.RSAPrivat
     return (public_key, private_key)
 
 
+def load_or_generate_keys(filename: str, key_size: int = 2048) -> tuple[rsa.RSAPublicKey, rsa.RSAPrivateKey]:
+    """
+    Load pair of asymmetric keys from `filename`. If the file does not
+    exist, keys are generated and the private key is stored in it.
+
+    Args:
+        filename (str): name of the file with the private key (PEM)
+        key_size (int, optional): size of the key (if generated)
+
+    Returns:
+        tuple[rsa.RSAPublicKey, rsa.RSAPrivateKey]: public and private keys
+    """
+    try:
+        # The key was validated when generated, and validating it again is expensive (RSA)
+        with open(filename, "rb") as key_file:
+            private_key = serialization.load_pem_private_key(key_file.read(), password=None,
+                                                             unsafe_skip_rsa_key_validation=True)
+        return (private_key.public_key(), private_key)
+    except FileNotFoundError:
+        pass
+    public_key, private_key = generate_keys(key_size)
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    # Write to a temporary file first, so a partially written key is never loaded
+    temporary_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(os.open(temporary_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as key_file:
+        key_file.write(pem)
+    os.replace(temporary_filename, filename)
+    return (public_key, private_key)
+
+
 def calculate_hash(content: bytes) -> str:
     """
     Calculate hash of `content`.
@@ -47,6 +92,7 @@ def sign(content: bytes, private_key: rsa.RSAPrivateKey) -> str:
     Returns:
         str: signature
     """
+    start_time = perf_counter()
     signature = private_key.sign(
         content,
         padding.PSS(
@@ -55,6 +101,7 @@ def sign(content: bytes, private_key: rsa.RSAPrivateKey) -> str:
         ),
         hashes.SHA256()
     )
+    SIGN_TIME.observe(perf_counter() - start_time)
     return signature.hex()
 
 
@@ -69,6 +116,7 @@ def sign_hash(digest: str, private_key: rsa.RSAPrivateKey) -> str:
     Returns:
         str: signature
     """
+    start_time = perf_counter()
     signature = private_key.sign(
         bytes.fromhex(digest),
         padding.PSS(
@@ -77,6 +125,7 @@ def sign_hash(digest: str, private_key: rsa.RSAPrivateKey) -> str:
         ),
         utils.Prehashed(hashes.SHA256())
     )
+    SIGN_TIME.observe(perf_counter() - start_time)
     return signature.hex()
 
 
@@ -92,6 +141,7 @@ def verify_signature(signature: str, digest: str, public_key: rsa.RSAPublicKey)
     Returns:
         bool: True, if the signature is valid, else return False 
     """
+    start_time = perf_counter()
     try:
         public_key.verify(
             bytes.fromhex(signature),
@@ -105,6 +155,38 @@ def verify_signature(signature: str, digest: str, public_key: rsa.RSAPublicKey)
         return True
     except:
         return False
+    finally:
+        VERIFY_TIME.observe(perf_counter() - start_time)
+
+
+def verify_signatures(signatures: list[bytes], digest: str, public_keys: list[rsa.RSAPublicKey]) -> bool:
+    """
+    Verify if every signature of `signatures` is valid, using `digest` and
+    the public key in the same position of `public_keys`.
+
+    Args:
+        signatures (list[bytes]): signatures of the content
+        digest (str): digest of the content
+        public_keys (list[rsa.RSAPublicKey]): public keys
+
+    Returns:
+        bool: True, if all signatures are valid, else return False
+    """
+    start_time = perf_counter()
+    digest = bytes.fromhex(digest)
+    signature_padding = padding.PSS(
+        mgf=padding.MGF1(hashes.SHA256()),
+        salt_length=padding.PSS.MAX_LENGTH
+    )
+    algorithm = utils.Prehashed(hashes.SHA256())
+    try:
+        for signature, public_key in zip(signatures, public_keys, strict=True):
+            public_key.verify(signature, digest, signature_padding, algorithm)
+        return True
+    except:
+        return False
+    finally:
+        BATCH_VERIFY_TIME.observe(perf_counter() - start_time)
 
 
 def serialize_public_key(public_key: rsa.RSAPublicKey) -> bytes:
@@ -134,4 +216,145 @@ def load_public_key(serialized_key: bytes) -> rsa.RSAPublicKey:
     Returns:
         rsa.RSAPublicKey: public key
     """
-    return serialization.load_pem_public_key(serialized_key)
\ No newline at end of file
+    return serialization.load_pem_public_key(serialized_key)
+
+
+def load_public_keys(directory: str, server_ids) -> dict:
+    """
+    Load public keys pinned in `directory` (`server_<id>.pub`, in PEM).
+    Servers without a file are not pinned.
+
+    Args:
+        directory (str): directory with the public keys
+        server_ids: IDs of the servers
+
+    Returns:
+        dict: public key of each pinned server
+    """
+    public_keys = {}
+    for server_id in server_ids:
+        try:
+            with open(os.path.join(directory, f"server_{server_id}.pub"), "rb") as key_file:
+                public_keys[server_id] = load_public_key(key_file.read())
+        except FileNotFoundError:
+            pass
+    return public_keys
+
+
+def generate_exchange_keys() -> tuple[bytes, x25519.X25519PrivateKey]:
+    """
+    Generate pair of keys for key exchange (X25519).
+
+    Returns:
+        tuple[bytes, x25519.X25519PrivateKey]: public key (raw bytes) and private key
+    """
+    private_key = x25519.X25519PrivateKey.generate()
+    public_key = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    return (public_key, private_key)
+
+
+def get_exchange_key_digest(exchange_public_key: bytes, server_id: int) -> str:
+    """
+    Get digest of a server's key exchange public key (bound to the server's
+    id), which is signed by the server.
+
+    Args:
+        exchange_public_key (bytes): key exchange's public key (raw bytes)
+        server_id (int): id of the server
+
+    Returns:
+        str: digest
+    """
+    return calculate_hash(f"streamlet-exchange-{server_id}-".encode() + exchange_public_key)
+
+
+def sign_exchange_key(exchange_public_key: bytes, server_id: int, private_key: rsa.RSAPrivateKey) -> bytes:
+    """
+    Sign key exchange's public key, so other servers derive session keys
+    only with keys of the server that owns `private_key`.
+
+    Args:
+        exchange_public_key (bytes): key exchange's public key (raw bytes)
+        server_id (int): id of the server
+        private_key (rsa.RSAPrivateKey): server's private key
+
+    Returns:
+        bytes: signature
+    """
+    return bytes.fromhex(sign_hash(get_exchange_key_digest(exchange_public_key, server_id), private_key))
+
+
+def verify_exchange_key(signature: bytes, exchange_public_key: bytes, server_id: int,
+                        public_key: rsa.RSAPublicKey) -> bool:
+    """
+    Verify signature of a server's key exchange public key. It only proves
+    who sent the key if `public_key` is the server's pinned key (see
+    `load_public_keys`). Otherwise, it is the RSA public key received in
+    the same message, which is trusted on first use (as are the keys used
+    to check proposals and votes), so the signature only binds both keys.
+
+    Args:
+        signature (bytes): signature of the key exchange's public key
+        exchange_public_key (bytes): key exchange's public key (raw bytes)
+        server_id (int): id of the server
+        public_key (rsa.RSAPublicKey): server's public key
+
+    Returns:
+        bool: True, if the signature is valid, else return False
+    """
+    return verify_signature(signature.hex(), get_exchange_key_digest(exchange_public_key, server_id), public_key)
+
+
+def derive_session_key(private_key: x25519.X25519PrivateKey, peer_public_key: bytes, server_ids: tuple[int, int]) -> bytes:
+    """
+    Derive symmetric key shared by two servers, from the Diffie-Hellman
+    secret of their exchange keys.
+
+    Args:
+        private_key (x25519.X25519PrivateKey): server's exchange private key
+        peer_public_key (bytes): other server's exchange public key (raw bytes)
+        server_ids (tuple[int, int]): IDs of both servers
+
+    Returns:
+        bytes: session key
+    """
+    shared_secret = private_key.exchange(x25519.X25519PublicKey.from_public_bytes(peer_public_key))
+    low_id, high_id = sorted(server_ids)
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=f"streamlet-link-{low_id}-{high_id}".encode()
+    ).derive(shared_secret)
+
+
+def calculate_tag(session_key: bytes, content: bytes) -> bytes:
+    """
+    Calculate authentication tag (truncated HMAC-SHA256) of `content`.
+
+    Args:
+        session_key (bytes): session key
+        content (bytes): content to be authenticated
+
+    Returns:
+        bytes: tag
+    """
+    return hmac.digest(session_key, content, "sha256")[:TAG_SIZE]
+
+
+def verify_tag(tag: bytes, session_key: bytes, content: bytes) -> bool:
+    """
+    Verify if `tag` is valid for `content`.
+
+    Args:
+        tag (bytes): tag of the content
+        session_key (bytes): session key
+        content (bytes): authenticated content
+
+    Returns:
+        bool: True, if the tag is valid, else return False
+    """
+    return hmac.compare_digest(tag, calculate_tag(session_key, content))
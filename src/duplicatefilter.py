@@ -0,0 +1,105 @@
+import hashlib
+from array import array
+from multiprocessing.sharedctypes import RawArray
+from message import Message, HEADER
+from messagetype import MessageType
+
+class DuplicateFilter:
+    """
+    Bounded set of seen proposals and votes, used to drop repeated copies
+    (e.g., echoes) before their content is deserialized.
+
+    Each message is identified by a fingerprint of its (innermost) header
+    and content, i.e., of its type, epoch, original sender and content.
+    Fingerprints are stored in a direct-mapped table: a new fingerprint
+    replaces the one in its slot, so memory is bounded and an evicted
+    message is, at worst, delivered again.
+
+    A shared table (in shared memory) is used by several receiver processes,
+    so copies of a message read by different processes are dropped too. Slots
+    are updated without locks: concurrent copies may both be delivered.
+    """
+
+    def __init__(self, size: int = 65536, shared: bool = False) -> None:
+        """
+        Constructor.
+
+        Args:
+            size (int, optional): number of slots of the table
+            shared (bool, optional): keep the table in shared memory (visible to child processes)
+        """
+        self.size = size
+        if shared:
+            # Memory view is faster to index than the ctypes array
+            self.table = memoryview(RawArray("Q", size)).cast("B").cast("Q")
+        else:
+            self.table = array("Q", bytes(8 * size))
+
+
+    def get_fingerprint(self, data: bytes) -> int | None:
+        """
+        Get fingerprint of the proposal or vote in `data`.
+
+        Args:
+            data (bytes): Message in serialized form
+
+        Returns:
+            int | None: fingerprint (None, if the message is not a proposal or vote)
+        """
+        header = Message.parse_header(data)
+        if header is None:
+            return None
+        offset = 0
+        if header[0] == MessageType.ECHO:
+            offset = HEADER.size
+            header = Message.parse_header(data, offset)
+            if header is None:
+                return None
+        if header[0] != MessageType.PROPOSE and header[0] != MessageType.VOTE:
+            return None
+        digest = hashlib.blake2b(memoryview(data)[offset:], digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+
+    def check(self, fingerprint: int) -> bool:
+        """
+        Check if the message with `fingerprint` was already seen (and mark it as seen).
+
+        Args:
+            fingerprint (int): fingerprint of the message
+
+        Returns:
+            bool: True, if and only if the message was already seen
+        """
+        slot = fingerprint % self.size
+        if self.table[slot] == fingerprint:
+            return True
+        self.table[slot] = fingerprint
+        return False
+
+
+    def forget(self, fingerprint: int) -> None:
+        """
+        Mark the message with `fingerprint` as not seen (e.g., it was dropped
+        before being processed), so its next copy is delivered.
+
+        Args:
+            fingerprint (int): fingerprint of the message
+        """
+        slot = fingerprint % self.size
+        if self.table[slot] == fingerprint:
+            self.table[slot] = 0
+
+
+    def is_duplicate(self, data: bytes) -> bool:
+        """
+        Check if the message in `data` was already seen (and mark it as seen).
+
+        Args:
+            data (bytes): Message in serialized form
+
+        Returns:
+            bool: True, if and only if the message is a repeated proposal or vote
+        """
+        fingerprint = self.get_fingerprint(data)
+        return fingerprint is not None and self.check(fingerprint)
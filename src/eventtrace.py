@@ -0,0 +1,106 @@
+import struct
+from eventtype import EventType
+
+# Little-endian: timestamp (double), event type (uint8), epoch (uint32),
+# peer (int16) and size (uint32)
+RECORD = struct.Struct("<dBIhI")
+HEADER = struct.Struct("<4sHHQQ")
+MAGIC = b"STRC"
+VERSION = 1
+
+class EventTrace:
+    """
+    Fixed-size ring buffer of binary event records, i.e., tuples of
+    (timestamp, event type, epoch, peer, size). When the buffer is full,
+    the oldest records are overwritten.
+    """
+
+    def __init__(self, capacity: int = 65536) -> None:
+        """
+        Constructor.
+
+        Args:
+            capacity (int, optional): maximum number of records kept in the buffer
+        """
+        self.capacity = capacity
+        self.buffer = bytearray(RECORD.size * capacity)
+        self.count = 0
+
+
+    def record(self, timestamp: float, event_type: EventType, epoch: int, peer: int = -1, size: int = 0) -> None:
+        """
+        Record event.
+
+        Args:
+            timestamp (float): time of the event
+            event_type (EventType): type of the event
+            epoch (int): epoch related to the event
+            peer (int, optional): server related to the event (-1 if none)
+            size (int, optional): size of the message related to the event
+        """
+        if self.capacity:
+            RECORD.pack_into(self.buffer, (self.count % self.capacity) * RECORD.size,
+                             timestamp, event_type.value, epoch, peer, size)
+            self.count += 1
+
+
+    def get_records(self) -> list:
+        """
+        Get recorded events (from the oldest to the newest).
+
+        Returns:
+            list: list of tuples (timestamp, event type, epoch, peer, size)
+        """
+        return list(RECORD.iter_unpack(self.get_bytes()))
+
+
+    def get_bytes(self) -> bytes:
+        """
+        Get records in chronological order.
+
+        Returns:
+            bytes: records
+        """
+        if self.count <= self.capacity:
+            return bytes(self.buffer[:self.count * RECORD.size])
+        start = (self.count % self.capacity) * RECORD.size
+        return bytes(self.buffer[start:] + self.buffer[:start])
+
+
+    def dump(self, filename: str) -> None:
+        """
+        Dump trace to a file (header followed by the records).
+
+        Args:
+            filename (str): name of the file
+        """
+        records = self.get_bytes()
+        with open(filename, "wb") as output:
+            output.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.count, len(records) // RECORD.size))
+            output.write(records)
+
+
+    @staticmethod
+    def load(filename: str) -> list:
+        """
+        Load records from a trace file.
+
+        Args:
+            filename (str): name of the file
+
+        Raises:
+            ValueError: file is not a valid trace
+
+        Returns:
+            list: list of tuples (timestamp, event type, epoch, peer, size)
+        """
+        with open(filename, "rb") as trace_file:
+            data = trace_file.read()
+        if len(data) < HEADER.size:
+            raise ValueError("Trace file is too short.")
+        magic, version, record_size, _, stored = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError("Trace file has an unknown format.")
+        records = data[HEADER.size:HEADER.size + stored * RECORD.size]
+        return [(timestamp, EventType(event_type), epoch, peer, size)
+                for timestamp, event_type, epoch, peer, size in RECORD.iter_unpack(records)]
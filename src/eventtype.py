@@ -0,0 +1,35 @@
+from enum import Enum
+
+class EventType(Enum):
+    """
+    Class than contains the different types of events recorded in the event trace.
+    """
+    EPOCH_START = 0
+    TIMEOUT = 1
+    PROPOSE_SENT = 2
+    VOTE_SENT = 3
+    ECHO_SENT = 4
+    PROPOSE_RECEIVED = 5
+    VOTE_RECEIVED = 6
+    EARLY_MESSAGE = 7
+    PROPOSAL_ACCEPTED = 8
+    VOTE_ACCEPTED = 9
+    NOTARIZED = 10
+    FINALIZED = 11
+    CERTIFICATE_SENT = 12
+    CERTIFICATE_RECEIVED = 13
+    TRANSACTIONS_SENT = 14
+    TRANSACTION_REQUEST_SENT = 15
+    TRANSACTION_RESPONSE_SENT = 16
+    TRANSACTIONS_MISSING = 17
+    BATCH_SENT = 18
+    BATCH_ACK_SENT = 19
+    BATCH_CERTIFICATE_SENT = 20
+    CHECKPOINT_REQUEST_SENT = 21
+    CHECKPOINT_MANIFEST_SENT = 22
+    CHECKPOINT_CHUNK_SENT = 23
+    BLOCK_REQUEST_SENT = 24
+    BLOCK_RESPONSE_SENT = 25
+    STATE_RESTORED = 26
+    BATCH_REQUEST_SENT = 27
+    BATCH_RESPONSE_SENT = 28
@@ -0,0 +1,124 @@
+class Histogram:
+    """
+    Histogram with logarithmic buckets that are linearly subdivided (as in
+    HdrHistogram), which keeps a bounded relative error for every value.
+    Values are recorded in microseconds into a preallocated list of counts.
+    """
+
+    def __init__(self, precision_bits: int = 7, highest_value: float = 3600.0) -> None:
+        """
+        Constructor.
+
+        Args:
+            precision_bits (int, optional): number of bits of each bucket's sub-buckets \
+                (relative error of 2^-(precision_bits-1))
+            highest_value (float, optional): highest trackable value (in seconds)
+        """
+        self.precision_bits = precision_bits
+        self.sub_bucket_count = 1 << precision_bits
+        self.highest_value = int(highest_value * 1e6)
+        self.counts = [0] * (self.get_index(self.highest_value) + 1)
+        self.total_count = 0
+        self.total_sum = 0.0
+
+
+    def get_index(self, value: int) -> int:
+        """
+        Get index of the bucket for `value`.
+
+        Args:
+            value (int): value in microseconds
+
+        Returns:
+            int: index of the bucket
+        """
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return (shift << (self.precision_bits - 1)) + (value >> shift)
+
+
+    def get_value(self, index: int) -> int:
+        """
+        Get lowest value (in microseconds) of the bucket with `index`.
+
+        Args:
+            index (int): index of the bucket
+
+        Returns:
+            int: lowest value of the bucket
+        """
+        if index < self.sub_bucket_count:
+            return index
+        shift = (index >> (self.precision_bits - 1)) - 1
+        return (index - (shift << (self.precision_bits - 1))) << shift
+
+
+    def record(self, value: float, count: int = 1) -> None:
+        """
+        Record `value` `count` times.
+
+        Args:
+            value (float): value in seconds
+            count (int, optional): number of occurrences of `value`
+        """
+        microseconds = int(value * 1e6)
+        if microseconds < 0:
+            microseconds = 0
+        elif microseconds > self.highest_value:
+            microseconds = self.highest_value
+        self.counts[self.get_index(microseconds)] += count
+        self.total_count += count
+        self.total_sum += value * count
+
+
+    def get_percentile(self, percentile: float) -> float:
+        """
+        Get value at `percentile`.
+
+        Args:
+            percentile (float): percentile (between 0 and 100)
+
+        Returns:
+            float: value in seconds (middle of the bucket)
+        """
+        if self.total_count == 0:
+            return 0.0
+        target = max(1, round(self.total_count * percentile / 100))
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                lowest = self.get_value(index)
+                highest = self.get_value(index + 1)
+                return (lowest + highest) / 2e6
+        return self.highest_value / 1e6
+
+
+    def get_count(self) -> int:
+        """
+        Get number of recorded values.
+
+        Returns:
+            int: number of recorded values
+        """
+        return self.total_count
+
+
+    def get_summary(self, percentiles: tuple = (50, 90, 99, 99.9)) -> dict:
+        """
+        Get summary of the histogram.
+
+        Args:
+            percentiles (tuple, optional): percentiles to include
+
+        Returns:
+            dict: count, mean and percentiles (in seconds)
+        """
+        summary = {
+            "count": self.total_count,
+            "mean": self.total_sum / self.total_count if self.total_count else 0.0
+        }
+        for percentile in percentiles:
+            summary[f"p{percentile}"] = self.get_percentile(percentile)
+        return summary
@@ -0,0 +1,163 @@
+from collections import deque
+from message import Message
+from duplicatefilter import DuplicateFilter
+from metrics import registry
+
+HIGH = 0
+LOW = 1
+DROP_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+class InboundQueue:
+    """
+    Bounded staging area for received messages, with a queue per priority
+    and per peer. Messages are taken by priority (current-epoch messages
+    before echoes and messages from old epochs) and, within a priority,
+    in round-robin across peers, so one peer cannot starve the others.
+
+    When a peer has `peer_capacity` staged messages, the drop policy
+    decides what happens to the next message from that peer:
+    - drop_oldest: drop the peer's oldest message, preferring low priority ones
+    - drop_newest: drop the new message
+    - block: keep the message and signal that the peer must be paused
+
+    Fingerprints of dropped proposals and votes are removed from the
+    duplicate filter (if set), so their next copies (e.g., echoes) are
+    delivered instead of being dropped as repeated.
+    """
+
+    def __init__(self, peer_capacity: int = 256, drop_policy: str = "drop_oldest") -> None:
+        """
+        Constructor.
+
+        Args:
+            peer_capacity (int, optional): maximum number of staged messages per peer
+            drop_policy (str, optional): drop policy (drop_oldest, drop_newest or block)
+
+        Raises:
+            ValueError: drop policy is unknown
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.peer_capacity = peer_capacity
+        self.drop_policy = drop_policy
+        # Queue of each peer, and peers with staged messages (in round-robin order), per priority
+        self.queues = ({}, {})
+        self.active_peers = (deque(), deque())
+        self.sizes = {}
+        self.size = 0
+        self.duplicate_filter = None
+        self.dropped = (
+            registry.counter("streamlet_inbound_dropped_total", "Received messages dropped by the drop policy.",
+                             {"priority": "high"}),
+            registry.counter("streamlet_inbound_dropped_total", "Received messages dropped by the drop policy.",
+                             {"priority": "low"})
+        )
+
+
+    def set_duplicate_filter(self, duplicate_filter: DuplicateFilter | None) -> None:
+        """
+        Set duplicate filter where received messages were marked as seen.
+
+        Args:
+            duplicate_filter (DuplicateFilter | None): duplicate filter
+        """
+        self.duplicate_filter = duplicate_filter
+
+
+    def put(self, message: Message, peer: int, priority: int) -> bool:
+        """
+        Stage message received from `peer`.
+
+        Args:
+            message (Message): received message
+            peer (int): id of the server that sent the message
+            priority (int): priority of the message (HIGH or LOW)
+
+        Returns:
+            bool: False, if the peer must be paused (block policy), else True
+        """
+        if self.sizes.get(peer, 0) >= self.peer_capacity:
+            if self.drop_policy == "drop_newest":
+                self.drop(message, priority)
+                return True
+            if self.drop_policy == "drop_oldest":
+                if self.queues[LOW].get(peer):
+                    self.drop_oldest(peer, LOW)
+                elif priority == LOW:
+                    self.drop(message, LOW)
+                    return True
+                else:
+                    self.drop_oldest(peer, HIGH)
+        queue = self.queues[priority].setdefault(peer, deque())
+        if not queue:
+            self.active_peers[priority].append(peer)
+        queue.append(message)
+        self.sizes[peer] = self.sizes.get(peer, 0) + 1
+        self.size += 1
+        return self.sizes[peer] < self.peer_capacity or self.drop_policy != "block"
+
+
+    def drop_oldest(self, peer: int, priority: int) -> None:
+        """
+        Drop the oldest staged message from `peer` with `priority`.
+
+        Args:
+            peer (int): id of the server
+            priority (int): priority of the message (HIGH or LOW)
+        """
+        queue = self.queues[priority][peer]
+        message = queue.popleft()
+        if not queue:
+            self.active_peers[priority].remove(peer)
+        self.sizes[peer] -= 1
+        self.size -= 1
+        self.drop(message, priority)
+
+
+    def drop(self, message: Message, priority: int) -> None:
+        """
+        Count a dropped message, and mark it as not seen by the duplicate filter.
+
+        Args:
+            message (Message): dropped message
+            priority (int): priority of the message (HIGH or LOW)
+        """
+        self.dropped[priority].inc()
+        if self.duplicate_filter is not None and message.get_fingerprint() is not None:
+            self.duplicate_filter.forget(message.get_fingerprint())
+
+
+    def pop(self) -> Message | None:
+        """
+        Take the next message (highest priority first, round-robin across peers).
+
+        Returns:
+            Message | None: message (None, if there are no staged messages)
+        """
+        for priority in (HIGH, LOW):
+            active_peers = self.active_peers[priority]
+            if active_peers:
+                peer = active_peers.popleft()
+                queue = self.queues[priority][peer]
+                message = queue.popleft()
+                if queue:
+                    active_peers.append(peer)
+                self.sizes[peer] -= 1
+                self.size -= 1
+                return message
+        return None
+
+
+    def get_size(self, peer: int | None = None) -> int:
+        """
+        Get number of staged messages (from `peer`, or from every peer).
+
+        Args:
+            peer (int | None, optional): id of the server
+
+        Returns:
+            int: number of staged messages
+        """
+        if peer is None:
+            return self.size
+        return self.sizes.get(peer, 0)
@@ -16,6 +16,19 @@ SERVERS_CONFIGURATION = {
     3: [HOST, PORT+3, socket.socket(socket.AF_INET, socket.SOCK_STREAM)]
 }
 
+def get_local_configuration(server_number: int) -> dict:
+    """
+    Get configuration of `server_number` servers running on this host
+    (on consecutive ports, starting at PORT).
+
+    Args:
+        server_number (int): number of servers
+
+    Returns:
+        dict: host, port and socket of each server
+    """
+    return {id: [HOST, PORT+id, socket.socket(socket.AF_INET, socket.SOCK_STREAM)] for id in range(server_number)}
+
 def main():
     global SERVERS_CONFIGURATION
     server_id = os.environ.get("SERVER_ID")
@@ -34,9 +47,11 @@ def main():
     if not os.path.exists(blockchain_directory):
         os.mkdir(blockchain_directory)
     
-    config_file = os.path.join(os.getcwd(), 'config.yaml')
-    if os.path.exists(config_file):
-        with open("config.yaml", "r") as config:
+    config_file = os.environ.get("CONFIG_FILE") or os.path.join(os.getcwd(), 'config.yaml')
+    if os.environ.get("SERVER_NUMBER"):
+        SERVERS_CONFIGURATION = get_local_configuration(int(os.environ.get("SERVER_NUMBER")))
+    elif os.path.exists(config_file):
+        with open(config_file, "r") as config:
             SERVERS_CONFIGURATION = yaml.safe_load(config)
         for id in SERVERS_CONFIGURATION:
             SERVERS_CONFIGURATION[id].append(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
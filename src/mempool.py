@@ -0,0 +1,153 @@
+import pickle
+import hashlib
+from metrics import registry
+
+# Size of the short ids of transactions (carried by compact proposals)
+TRANSACTION_ID_SIZE = 8
+BATCH_DIGEST_SIZE = 32
+
+class Mempool:
+    """
+    Transactions known by the server (disseminated by every server before
+    being proposed), indexed by their short ids. Compact proposals carry
+    only the ids of their transactions, and blocks are rebuilt from the
+    mempool.
+
+    Pending transactions (i.e., not included in a block yet) are proposed
+    in the order they were added. Transactions are kept until their block
+    is finalized, or until they are evicted (oldest first) to bound the
+    mempool's size.
+    """
+
+    def __init__(self, capacity: int = 100000) -> None:
+        """
+        Constructor.
+
+        Args:
+            capacity (int, optional): maximum number of stored transactions
+        """
+        self.capacity = capacity
+        self.transactions = {}
+        self.pending = {}
+        registry.gauge_function("streamlet_mempool_transactions", "Transactions stored in the mempool.",
+                                lambda: len(self.transactions))
+        self.evicted = registry.counter("streamlet_mempool_evicted_total",
+                                        "Transactions evicted from the mempool before being finalized.")
+
+
+    @staticmethod
+    def get_transaction_id(transaction: tuple) -> bytes:
+        """
+        Get short id of a transaction (a truncated digest of its content).
+
+        Args:
+            transaction (tuple): transaction
+
+        Returns:
+            bytes: transaction's id
+        """
+        return hashlib.blake2b(pickle.dumps(transaction), digest_size=TRANSACTION_ID_SIZE).digest()
+
+
+    @staticmethod
+    def get_batch_digest(transactions: list) -> bytes:
+        """
+        Get digest of a batch of transactions, used to detect blocks that
+        were rebuilt with the wrong transactions (e.g., colliding short ids).
+
+        Args:
+            transactions (list): list of transactions
+
+        Returns:
+            bytes: batch digest
+        """
+        return hashlib.sha256(pickle.dumps(transactions)).digest()
+
+
+    def get_size(self) -> int:
+        """
+        Get number of stored transactions.
+
+        Returns:
+            int: number of transactions
+        """
+        return len(self.transactions)
+
+
+    def add(self, transactions: list) -> list[bytes]:
+        """
+        Add transactions (as pending, if they are new).
+
+        Args:
+            transactions (list): list of transactions
+
+        Returns:
+            list[bytes]: ids of the transactions
+        """
+        transaction_ids = []
+        for transaction in transactions:
+            transaction_id = self.get_transaction_id(transaction)
+            if transaction_id not in self.transactions:
+                self.transactions[transaction_id] = transaction
+                self.pending[transaction_id] = None
+            transaction_ids.append(transaction_id)
+        while len(self.transactions) > self.capacity:
+            transaction_id = next(iter(self.transactions))
+            del self.transactions[transaction_id]
+            self.pending.pop(transaction_id, None)
+            self.evicted.inc()
+        return transaction_ids
+
+
+    def get_pending(self, limit: int) -> tuple[list[bytes], list]:
+        """
+        Get (up to `limit`) pending transactions, oldest first.
+
+        Args:
+            limit (int): maximum number of transactions
+
+        Returns:
+            tuple[list[bytes], list]: ids of the transactions and transactions
+        """
+        transaction_ids = []
+        for transaction_id in self.pending:
+            if len(transaction_ids) == limit:
+                break
+            transaction_ids.append(transaction_id)
+        return (transaction_ids, [self.transactions[transaction_id] for transaction_id in transaction_ids])
+
+
+    def get(self, transaction_id: bytes) -> tuple | None:
+        """
+        Get transaction with `transaction_id`.
+
+        Args:
+            transaction_id (bytes): id of the transaction
+
+        Returns:
+            tuple | None: transaction (None, if it is not stored)
+        """
+        return self.transactions.get(transaction_id)
+
+
+    def mark_included(self, transaction_ids: list[bytes]) -> None:
+        """
+        Mark transactions as included in a block (they are no longer proposed).
+
+        Args:
+            transaction_ids (list[bytes]): ids of transactions
+        """
+        for transaction_id in transaction_ids:
+            self.pending.pop(transaction_id, None)
+
+
+    def remove(self, transaction_ids: list[bytes]) -> None:
+        """
+        Remove transactions (e.g., of finalized blocks).
+
+        Args:
+            transaction_ids (list[bytes]): ids of transactions
+        """
+        for transaction_id in transaction_ids:
+            self.transactions.pop(transaction_id, None)
+            self.pending.pop(transaction_id, None)
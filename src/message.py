@@ -1,19 +1,37 @@
-import pickle
+import struct
 import logging
 from typing import Self
 import crypto
 from block import Block
 from messagetype import MessageType
+from quorumcertificate import QuorumCertificate
+from transactionbatch import TransactionBatch
+from statetransfer import StateTransfer
+
+# Header: type (uint8), sender's ID (uint16) and epoch (uint32)
+HEADER = struct.Struct(">BHI")
+# Flag of the type, set when the content is compressed (see `compression`)
+COMPRESSED = 0x80
+# Sizes of the serialized public key, of the key exchange's public key and of
+# its signature, followed by the keys, the signature and the names of the
+# supported codecs
+KEY_HEADER = struct.Struct(">HBH")
+# Proposed start time of the protocol
+READY_CONTENT = struct.Struct(">d")
 
 class Message:
     """
     Class that sets the structure of a message.
     """
 
-    def __init__(self, type: MessageType, content: Block | Self, sender_id: int) -> None:
+    def __init__(self, type: MessageType, content: Block | QuorumCertificate | TransactionBatch | StateTransfer | Self | tuple | float, sender_id: int, size: int = 0) -> None:
         self.type = type
         self.content = content
         self.sender_id = sender_id
+        self.size = size
+        self.authenticated = False
+        # Fingerprint of received proposals and votes (see `DuplicateFilter`)
+        self.fingerprint = None
 
 
     def get_type(self) -> MessageType:
@@ -26,10 +44,51 @@ class Message:
         return self.type
 
 
-    def get_content(self) -> Block | Self:
+    def get_content(self) -> Block | QuorumCertificate | TransactionBatch | StateTransfer | Self | tuple | float:
         return self.content
 
 
+    def is_authenticated(self) -> bool:
+        """
+        Check if message was received directly from its sender, over an
+        authenticated link (i.e., it was not relayed by other server).
+
+        Returns:
+            bool: True, if and only if the sender was authenticated by the link
+        """
+        return self.authenticated
+
+
+    def set_authenticated(self, authenticated: bool) -> None:
+        """
+        Set if message was received directly from its sender, over an authenticated link.
+
+        Args:
+            authenticated (bool): True, if the sender was authenticated by the link
+        """
+        self.authenticated = authenticated
+
+
+    def get_fingerprint(self) -> int | None:
+        """
+        Get fingerprint of a received proposal or vote.
+
+        Returns:
+            int | None: fingerprint (None, for other messages)
+        """
+        return self.fingerprint
+
+
+    def set_fingerprint(self, fingerprint: int | None) -> None:
+        """
+        Set fingerprint of a received proposal or vote.
+
+        Args:
+            fingerprint (int | None): fingerprint
+        """
+        self.fingerprint = fingerprint
+
+
     def get_sender(self) -> int:
         """
         Get sender's ID of message.
@@ -40,20 +99,69 @@ class Message:
         return self.sender_id
 
 
+    def get_size(self) -> int:
+        """
+        Get size of the message, when it was received.
+
+        Returns:
+            int: size in bytes (0 if the message was not received)
+        """
+        return self.size
+
+
     def to_bytes(self) -> bytes:
         """
-        Convert Message to bytes.
+        Convert Message to bytes: a fixed-size header (type, sender and
+        epoch) followed by the serialized content.
 
         Returns:
             bytes: bytes of Message object
         """
         if self.type == MessageType.PK_EXCHANGE:
-            data = (self.type, crypto.serialize_public_key(self.content), self.sender_id)
+            epoch = 0
+            public_key, exchange_public_key, exchange_signature, codecs = self.content
+            public_key = crypto.serialize_public_key(public_key)
+            exchange_public_key = exchange_public_key or b""
+            exchange_signature = exchange_signature or b""
+            content = (KEY_HEADER.pack(len(public_key), len(exchange_public_key), len(exchange_signature))
+                       + public_key + exchange_public_key + exchange_signature + ",".join(codecs).encode())
         elif self.type == MessageType.PROPOSE or self.type == MessageType.VOTE:
-            data = (self.type, self.content.to_bytes(include_signature=True), self.sender_id)
+            epoch = self.content.get_epoch()
+            content = self.content.to_bytes(include_signature=True)
         elif self.type == MessageType.ECHO:
-            data = (self.type, self.content.to_bytes(), self.sender_id)
-        return pickle.dumps(data)
+            epoch = self.content.get_content().get_epoch()
+            content = self.content.to_bytes()
+        elif self.type in (MessageType.CERTIFICATE, MessageType.TRANSACTIONS, MessageType.TRANSACTION_REQUEST,
+                           MessageType.TRANSACTION_RESPONSE, MessageType.BATCH, MessageType.BATCH_ACK,
+                           MessageType.BATCH_CERTIFICATE, MessageType.CHECKPOINT_REQUEST, MessageType.CHECKPOINT_MANIFEST,
+                           MessageType.CHECKPOINT_CHUNK, MessageType.BLOCK_REQUEST, MessageType.BLOCK_RESPONSE,
+                           MessageType.BATCH_REQUEST, MessageType.BATCH_RESPONSE):
+            epoch = self.content.get_epoch()
+            content = self.content.to_bytes()
+        elif self.type == MessageType.READY:
+            epoch = 0
+            content = READY_CONTENT.pack(self.content)
+        return HEADER.pack(self.type.value, self.sender_id, epoch) + content
+
+
+    @staticmethod
+    def parse_header(data_bytes: bytes, offset: int = 0) -> tuple[MessageType, int, int] | None:
+        """
+        Parse the header of a serialized message, without deserializing its
+        content (the compressed flag is ignored).
+
+        Args:
+            data_bytes (bytes): Message in serialized form
+            offset (int, optional): position of the header in `data_bytes`
+
+        Returns:
+            tuple[MessageType, int, int] | None: type, sender's ID and epoch of the message
+        """
+        try:
+            message_type, sender_id, epoch = HEADER.unpack_from(data_bytes, offset)
+            return (MessageType(message_type & ~COMPRESSED), sender_id, epoch)
+        except (struct.error, ValueError):
+            return None
 
 
     @staticmethod
@@ -68,37 +176,77 @@ class Message:
         Returns:
             Message: Message object from bytes
         """
-        try:
-            data = pickle.loads(data_bytes)
-        except pickle.PickleError:
-            logging.error("Message cannot be unpickled.\n")
+        header = Message.parse_header(data_bytes)
+        if header is None:
+            logging.error("Message header cannot be parsed.\n")
             return None
-        try:
-            message_type, content, sender_id = data
-        except ValueError:
-            logging.error("Attributes cannot be unpacked from tuple.\n")
-            return None
-        if (isinstance(message_type, MessageType) and isinstance(content, bytes)
-                and isinstance(sender_id, int)):
-            if message_type == MessageType.PK_EXCHANGE:
-                try:
-                    crypto.load_public_key(content)
-                except ValueError:
-                    logging.error("Public key cannot be deserialized.\n")
-                    return None
-            elif message_type == MessageType.PROPOSE or message_type == MessageType.VOTE:
-                content = Block.from_bytes(content)
-            elif message_type == MessageType.ECHO:
-                content = Message.from_bytes(content)
-            else:
+        message_type, sender_id, epoch = header
+        content = data_bytes[HEADER.size:]
+        if message_type == MessageType.PK_EXCHANGE:
+            try:
+                key_size, exchange_key_size, signature_size = KEY_HEADER.unpack_from(content)
+                public_key = content[KEY_HEADER.size:KEY_HEADER.size+key_size]
+                crypto.load_public_key(public_key)
+            except (struct.error, ValueError):
+                logging.error("Public key cannot be deserialized.\n")
+                return None
+            offset = KEY_HEADER.size + key_size
+            exchange_public_key = content[offset:offset+exchange_key_size]
+            if exchange_key_size not in (0, 32) or len(exchange_public_key) != exchange_key_size:
+                logging.error("Key exchange's public key is malformed.\n")
+                return None
+            offset += exchange_key_size
+            exchange_signature = content[offset:offset+signature_size]
+            # Key exchange's public key must be signed (see `crypto.sign_exchange_key`)
+            if (signature_size == 0) != (exchange_key_size == 0) or len(exchange_signature) != signature_size:
+                logging.error("Signature of the key exchange's public key is malformed.\n")
+                return None
+            try:
+                codecs = content[offset+signature_size:].decode("ascii")
+            except UnicodeDecodeError:
+                logging.error("Names of the codecs are malformed.\n")
+                return None
+            content = (public_key, exchange_public_key or None, exchange_signature or None,
+                       codecs.split(",") if codecs else [])
+        elif message_type == MessageType.PROPOSE or message_type == MessageType.VOTE:
+            content = Block.from_bytes(content)
+            if content is not None and content.get_epoch() != epoch:
+                logging.error("Epoch of the block does not match the message's epoch.\n")
+                return None
+        elif message_type == MessageType.ECHO:
+            content = Message.from_bytes(content)
+            if content is not None and content.get_type() not in (MessageType.PROPOSE, MessageType.VOTE):
+                logging.error("Only proposals and votes can be echoed.\n")
+                return None
+        elif message_type in (MessageType.CERTIFICATE, MessageType.BATCH_ACK, MessageType.BATCH_CERTIFICATE):
+            content = QuorumCertificate.from_bytes(content)
+            if content is not None and content.get_epoch() != epoch:
+                logging.error("Epoch of the certificate does not match the message's epoch.\n")
+                return None
+        elif message_type in (MessageType.TRANSACTIONS, MessageType.TRANSACTION_REQUEST, MessageType.TRANSACTION_RESPONSE,
+                              MessageType.BATCH):
+            content = TransactionBatch.from_bytes(content)
+            if content is not None and content.get_epoch() != epoch:
+                logging.error("Epoch of the transaction batch does not match the message's epoch.\n")
+                return None
+        elif message_type in (MessageType.CHECKPOINT_REQUEST, MessageType.CHECKPOINT_MANIFEST, MessageType.CHECKPOINT_CHUNK,
+                              MessageType.BLOCK_REQUEST, MessageType.BLOCK_RESPONSE, MessageType.BATCH_REQUEST,
+                              MessageType.BATCH_RESPONSE):
+            content = StateTransfer.from_bytes(content)
+            if content is not None and content.get_epoch() != epoch:
+                logging.error("Epoch of the state transfer does not match the message's epoch.\n")
+                return None
+        elif message_type == MessageType.READY:
+            try:
+                content, = READY_CONTENT.unpack(content)
+            except struct.error:
                 content = None
         else:
-            logging.error("Message attributes do not contain the correct type(s).\n")
-            return None
+            content = None
         if content is None:
             logging.error("Message content cannot be deserialized.\n")
             return None
-        return Message(message_type, content, sender_id)
+        return Message(message_type, content, sender_id, len(data_bytes))
 
 
     def __str__(self) -> str:
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import struct
+
+# Little-endian: kind of record (uint8), timestamp (double) and size of the data (uint32)
+RECORD = struct.Struct("<BdI")
+HEADER = struct.Struct("<4sH")
+MAGIC = b"STRR"
+VERSION = 1
+# Kinds of records
+FRAME = 0
+PROPOSAL = 1
+METADATA = 2
+
+class MessageRecorder:
+    """
+    Records inbound frames (with their arrival time) to a binary file, so
+    the traffic of a run can be replayed offline. The server's own
+    proposals (and disseminated transactions) and the run's metadata are
+    also recorded, as they are needed to rebuild the server's state.
+
+    Records are buffered and appended in chunks. The file is opened in
+    append mode, so the receiver process and the protocol's process can
+    share it (each process has its own buffer).
+    """
+
+    def __init__(self, filename: str, chunk_size: int = 65536, flush_interval: float = 0.5) -> None:
+        """
+        Constructor.
+
+        Args:
+            filename (str): name of the file (it is truncated)
+            chunk_size (int, optional): number of buffered bytes that triggers a write
+            flush_interval (float, optional): maximum time that records stay buffered (in seconds)
+        """
+        self.fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        os.write(self.fd, HEADER.pack(MAGIC, VERSION))
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.buffer = bytearray()
+        self.flush_time = time.time()
+
+
+    def get_flush_interval(self) -> float:
+        """
+        Get maximum time that records stay buffered.
+
+        Returns:
+            float: flush interval (in seconds)
+        """
+        return self.flush_interval
+
+
+    def record(self, kind: int, timestamp: float, data: bytes) -> None:
+        """
+        Record data.
+
+        Args:
+            kind (int): kind of record (FRAME, PROPOSAL or METADATA)
+            timestamp (float): time of the record
+            data (bytes): recorded data
+        """
+        self.buffer += RECORD.pack(kind, timestamp, len(data))
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+
+    def record_metadata(self, metadata: dict) -> None:
+        """
+        Record metadata of the run (and write it immediately).
+
+        Args:
+            metadata (dict): metadata (JSON serializable)
+        """
+        self.record(METADATA, time.time(), json.dumps(metadata).encode())
+        self.flush()
+
+
+    def has_pending(self) -> bool:
+        """
+        Check if there are buffered records.
+
+        Returns:
+            bool: True, if there are buffered records, else False
+        """
+        return len(self.buffer) > 0
+
+
+    def flush_if_due(self) -> None:
+        """
+        Write buffered records, if they were buffered for longer than the flush interval.
+        """
+        if self.buffer and time.time() - self.flush_time >= self.flush_interval:
+            self.flush()
+
+
+    def flush(self) -> None:
+        """
+        Write buffered records.
+        """
+        data = memoryview(self.buffer)
+        while data:
+            written = os.write(self.fd, data)
+            data = data[written:]
+        data.release()
+        self.buffer.clear()
+        self.flush_time = time.time()
+
+
+    @staticmethod
+    def load(filename: str) -> tuple[dict, list]:
+        """
+        Load records from a file.
+
+        Args:
+            filename (str): name of the file
+
+        Raises:
+            ValueError: file is not a valid recording
+
+        Returns:
+            tuple[dict, list]: metadata and list of tuples (kind, timestamp, data)
+                (metadata and a truncated last record, e.g., of an interrupted run, are not included)
+        """
+        with open(filename, "rb") as recording:
+            data = recording.read()
+        if len(data) < HEADER.size:
+            raise ValueError("Recording is too short.")
+        magic, version = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Recording has an unknown format.")
+        metadata = {}
+        records = []
+        offset = HEADER.size
+        while offset + RECORD.size <= len(data):
+            kind, timestamp, size = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            if offset + size > len(data):
+                break
+            content = data[offset:offset+size]
+            offset += size
+            if kind == METADATA:
+                metadata.update(json.loads(content))
+            else:
+                records.append((kind, timestamp, content))
+        return metadata, records
@@ -8,4 +8,19 @@ class MessageType(Enum):
     PROPOSE = 1
     VOTE = 2
     ECHO = 3
-    PK_EXCHANGE = 4
\ No newline at end of file
+    PK_EXCHANGE = 4
+    CERTIFICATE = 5
+    READY = 6
+    TRANSACTIONS = 7
+    TRANSACTION_REQUEST = 8
+    TRANSACTION_RESPONSE = 9
+    BATCH = 10
+    BATCH_ACK = 11
+    BATCH_CERTIFICATE = 12
+    CHECKPOINT_REQUEST = 13
+    CHECKPOINT_MANIFEST = 14
+    CHECKPOINT_CHUNK = 15
+    BLOCK_REQUEST = 16
+    BLOCK_RESPONSE = 17
+    BATCH_REQUEST = 18
+    BATCH_RESPONSE = 19
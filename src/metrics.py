@@ -0,0 +1,322 @@
+import logging
+import threading
+from typing import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.sharedctypes import RawArray
+
+class Counter:
+    """
+    Metric whose value only increases.
+    """
+    __slots__ = ("values", "index")
+
+    def __init__(self, values, index: int) -> None:
+        """
+        Constructor.
+
+        Args:
+            values (memoryview): shared array with the values of the metrics
+            index (int): position of the metric in `values`
+        """
+        self.values = values
+        self.index = index
+
+
+    def inc(self, amount: float = 1) -> None:
+        """
+        Increment counter by `amount`.
+
+        Args:
+            amount (float, optional): increment
+        """
+        self.values[self.index] += amount
+
+
+    def get(self) -> float:
+        """
+        Get counter's value.
+
+        Returns:
+            float: value
+        """
+        return self.values[self.index]
+
+
+class Gauge(Counter):
+    """
+    Metric whose value can go up and down.
+    """
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        """
+        Set gauge's value.
+
+        Args:
+            value (float): value
+        """
+        self.values[self.index] = value
+
+
+class Summary:
+    """
+    Metric that keeps the sum and the number of observations.
+    """
+    __slots__ = ("values", "index")
+
+    def __init__(self, values, index: int) -> None:
+        """
+        Constructor.
+
+        Args:
+            values (memoryview): shared array with the values of the metrics
+            index (int): position of the sum in `values` (followed by the count)
+        """
+        self.values = values
+        self.index = index
+
+
+    def observe(self, value: float) -> None:
+        """
+        Observe `value`.
+
+        Args:
+            value (float): observed value
+        """
+        self.values[self.index] += value
+        self.values[self.index+1] += 1
+
+
+class MetricsRegistry:
+    """
+    Registry of metrics, exported in Prometheus' text format.
+
+    Values are kept in arrays of shared memory, so metrics updated by child
+    processes (e.g., the receiver of `CommunicationSystem`) are visible to the
+    exporter. Metrics must be registered before those processes are started,
+    and each metric should be updated by a single process.
+
+    Series grow with the number of servers (e.g., sizes of messages of each
+    type sent to each peer), so once an array is full, another one is
+    allocated (metrics never move, so processes that were already started
+    keep updating the values that are exported).
+    """
+
+    def __init__(self, capacity: int = 16384) -> None:
+        """
+        Constructor.
+
+        Args:
+            capacity (int, optional): number of values of each array
+        """
+        self.capacity = capacity
+        self.values = self.allocate()
+        self.size = 0
+        self.families = {}
+        self.metrics = {}
+        self.functions = {}
+        self.default_labels = {}
+
+
+    def allocate(self) -> memoryview:
+        """
+        Allocate an array of shared memory for `capacity` values.
+
+        Returns:
+            memoryview: array of values
+        """
+        # Memory view is faster to index than the ctypes array
+        return memoryview(RawArray("d", self.capacity)).cast("B").cast("d")
+
+
+    def set_default_labels(self, labels: dict | None) -> None:
+        """
+        Set labels added to metrics registered from now on (e.g., the id of
+        each replica of the simulator, which share the registry).
+
+        Args:
+            labels (dict | None): labels (None removes them)
+        """
+        self.default_labels = dict(labels or {})
+
+
+    def register(self, name: str, description: str, kind: str, labels: dict | None, metric_class: type) -> Counter | Gauge | Summary:
+        """
+        Register metric (or get it, if it was already registered).
+
+        Args:
+            name (str): name of the metric
+            description (str): description of the metric
+            kind (str): Prometheus' type of the metric
+            labels (dict | None): labels of the metric
+            metric_class (type): class of the metric
+
+        Returns:
+            Counter | Gauge | Summary: metric
+        """
+        labels = tuple(sorted({**self.default_labels, **(labels or {})}.items()))
+        key = (name, labels)
+        if key in self.metrics:
+            return self.metrics[key]
+        size = 2 if metric_class is Summary else 1
+        if self.size + size > len(self.values):
+            self.values = self.allocate()
+            self.size = 0
+        metric = metric_class(self.values, self.size)
+        self.size += size
+        self.families.setdefault(name, (kind, description, []))[2].append((labels, metric))
+        self.metrics[key] = metric
+        return metric
+
+
+    def counter(self, name: str, description: str, labels: dict | None = None) -> Counter:
+        """
+        Register counter.
+
+        Args:
+            name (str): name of the counter
+            description (str): description of the counter
+            labels (dict | None, optional): labels of the counter
+
+        Returns:
+            Counter: counter
+        """
+        return self.register(name, description, "counter", labels, Counter)
+
+
+    def gauge(self, name: str, description: str, labels: dict | None = None) -> Gauge:
+        """
+        Register gauge.
+
+        Args:
+            name (str): name of the gauge
+            description (str): description of the gauge
+            labels (dict | None, optional): labels of the gauge
+
+        Returns:
+            Gauge: gauge
+        """
+        return self.register(name, description, "gauge", labels, Gauge)
+
+
+    def summary(self, name: str, description: str, labels: dict | None = None) -> Summary:
+        """
+        Register summary.
+
+        Args:
+            name (str): name of the summary
+            description (str): description of the summary
+            labels (dict | None, optional): labels of the summary
+
+        Returns:
+            Summary: summary
+        """
+        return self.register(name, description, "summary", labels, Summary)
+
+
+    def gauge_function(self, name: str, description: str, function: Callable[[], float]) -> None:
+        """
+        Register gauge whose value is obtained (by calling `function`) when exported.
+
+        Args:
+            name (str): name of the gauge
+            description (str): description of the gauge
+            function (Callable[[], float]): function that returns the gauge's value
+        """
+        labels = tuple(sorted(self.default_labels.items()))
+        self.functions.setdefault(name, (description, {}))[1][labels] = function
+
+
+    def export(self) -> str:
+        """
+        Export metrics in Prometheus' text format.
+
+        Returns:
+            str: metrics
+        """
+        lines = []
+        for name, (kind, description, samples) in self.families.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in samples:
+                labels = ",".join(f'{label}="{value}"' for label, value in labels)
+                labels = f"{{{labels}}}" if labels else ""
+                if kind == "summary":
+                    lines.append(f"{name}_sum{labels} {format_value(metric.values[metric.index])}")
+                    lines.append(f"{name}_count{labels} {format_value(metric.values[metric.index+1])}")
+                else:
+                    lines.append(f"{name}{labels} {format_value(metric.values[metric.index])}")
+        for name, (description, functions) in self.functions.items():
+            samples = []
+            for labels, function in functions.items():
+                try:
+                    value = function()
+                except Exception:
+                    continue
+                labels = ",".join(f'{label}="{label_value}"' for label, label_value in labels)
+                samples.append(f"{name}{{{labels}}} {format_value(value)}" if labels else f"{name} {format_value(value)}")
+            if samples:
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    HTTP server that exposes the metrics of a registry (at `/metrics`).
+    """
+
+    def __init__(self, metrics_registry: MetricsRegistry, port: int, host: str = "127.0.0.1") -> None:
+        """
+        Constructor.
+
+        Args:
+            metrics_registry (MetricsRegistry): registry with the metrics to expose
+            port (int): port of the HTTP server
+            host (str, optional): host of the HTTP server
+        """
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_registry.export().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+
+
+    def start(self) -> None:
+        """
+        Start serving metrics (in a background thread).
+        """
+        self.thread.start()
+        logging.info(f"Metrics are exposed at http://{self.http_server.server_address[0]}:{self.http_server.server_address[1]}/metrics\n")
+
+
+def format_value(value: float) -> str:
+    """
+    Format value of a metric.
+
+    Args:
+        value (float): value
+
+    Returns:
+        str: formatted value
+    """
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
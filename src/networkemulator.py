@@ -0,0 +1,179 @@
+import random
+from typing import Self
+import yaml
+from metrics import registry
+
+LINK_PARAMETERS = ("delay", "jitter", "bandwidth", "reorder", "loss")
+
+class NetworkEmulator:
+    """
+    Emulates WAN-like links between replicas, from a scenario:
+    - delay and jitter (in milliseconds) and bandwidth (in Mbit/s) of a link
+    - reorder: probability of a frame being delivered without delay (overtaking earlier frames)
+    - loss: probability of a frame being dropped
+    - partitions: groups of replicas that cannot communicate with each other
+
+    Parameters apply to every link (`default`) or to the link from a sender
+    to a receiver (`links`, e.g., "0-1"), and are overridden by phases that
+    are active within a range of epochs. Random choices are seeded by the
+    scenario's seed, so runs are reproducible.
+    """
+
+    def __init__(self, scenario: dict, server_id: int) -> None:
+        """
+        Constructor.
+
+        Args:
+            scenario (dict): scenario (default, links, phases and seed)
+            server_id (int): id of the server/replica
+
+        Raises:
+            ValueError: scenario has unknown link parameters
+        """
+        self.scenario = scenario
+        self.server_id = server_id
+        for parameters in self.get_parameter_sets():
+            unknown = set(parameters) - set(LINK_PARAMETERS)
+            if unknown:
+                raise ValueError(f"Unknown link parameters: {', '.join(sorted(unknown))}")
+        self.random = random.Random(f"{scenario.get('seed', 0)}-{server_id}")
+        # Time when each link finishes transmitting its frames, and last delivery time of each link
+        self.link_free_time = {}
+        self.last_delivery_time = {}
+        self.dropped = {
+            reason: registry.counter("streamlet_emulated_dropped_total", "Frames dropped by the network emulator.",
+                                     {"reason": reason})
+            for reason in ("loss", "partition")
+        }
+
+
+    @staticmethod
+    def load(filename: str, server_id: int) -> Self:
+        """
+        Load scenario from a YAML file.
+
+        Args:
+            filename (str): name of the file
+            server_id (int): id of the server/replica
+
+        Returns:
+            NetworkEmulator: network emulator of the scenario
+        """
+        with open(filename, "r") as scenario_file:
+            scenario = yaml.safe_load(scenario_file) or {}
+        return NetworkEmulator(scenario, server_id)
+
+
+    def get_parameter_sets(self) -> list[dict]:
+        """
+        Get every set of link parameters in the scenario.
+
+        Returns:
+            list[dict]: sets of link parameters
+        """
+        parameter_sets = []
+        for section in [self.scenario] + self.scenario.get("phases", []):
+            parameter_sets.append(section.get("default", {}))
+            parameter_sets.extend(section.get("links", {}).values())
+        return parameter_sets
+
+
+    def get_phases(self, epoch: int) -> list[dict]:
+        """
+        Get phases active in `epoch` (in the order of the scenario).
+
+        Args:
+            epoch (int): epoch
+
+        Returns:
+            list[dict]: active phases
+        """
+        return [phase for phase in self.scenario.get("phases", [])
+                if phase.get("from_epoch", 0) <= epoch < phase.get("to_epoch", float("inf"))]
+
+
+    def get_link(self, sender: int, receiver: int, epoch: int) -> dict:
+        """
+        Get parameters of the link from `sender` to `receiver` in `epoch`.
+
+        Args:
+            sender (int): id of the sending server
+            receiver (int): id of the receiving server
+            epoch (int): epoch
+
+        Returns:
+            dict: link parameters
+        """
+        link = dict.fromkeys(LINK_PARAMETERS, 0)
+        for section in [self.scenario] + self.get_phases(epoch):
+            link.update(section.get("default", {}))
+            link.update(section.get("links", {}).get(f"{sender}-{receiver}", {}))
+        return link
+
+
+    def is_partitioned(self, sender: int, receiver: int, epoch: int) -> bool:
+        """
+        Check if `sender` and `receiver` are in different partitions in `epoch`.
+
+        Args:
+            sender (int): id of the sending server
+            receiver (int): id of the receiving server
+            epoch (int): epoch
+
+        Returns:
+            bool: True, if they cannot communicate, else False
+        """
+        for phase in self.get_phases(epoch):
+            for group in phase.get("partition", []):
+                if (sender in group) != (receiver in group):
+                    return True
+        return False
+
+
+    def drops(self, receiver: int, epoch: int) -> bool:
+        """
+        Decide if a frame sent to `receiver` is dropped (due to a partition or loss).
+
+        Args:
+            receiver (int): id of the receiving server
+            epoch (int): epoch
+
+        Returns:
+            bool: True, if the frame is dropped, else False
+        """
+        if self.is_partitioned(self.server_id, receiver, epoch):
+            self.dropped["partition"].inc()
+            return True
+        loss = self.get_link(self.server_id, receiver, epoch)["loss"]
+        if loss and self.random.random() < loss:
+            self.dropped["loss"].inc()
+            return True
+        return False
+
+
+    def get_delivery_time(self, sender: int, size: int, arrival_time: float, epoch: int) -> float:
+        """
+        Get time when a frame received from `sender` is delivered, given
+        the link's bandwidth, delay, jitter and reordering.
+
+        Args:
+            sender (int): id of the sending server
+            size (int): size of the frame (in bytes)
+            arrival_time (float): time when the frame was received
+            epoch (int): epoch
+
+        Returns:
+            float: delivery time
+        """
+        link = self.get_link(sender, self.server_id, epoch)
+        # Frames of a link are transmitted one at a time
+        transmission_time = 8 * size / (link["bandwidth"] * 1e6) if link["bandwidth"] else 0.0
+        link_free_time = max(arrival_time, self.link_free_time.get(sender, 0.0)) + transmission_time
+        self.link_free_time[sender] = link_free_time
+        if link["reorder"] and self.random.random() < link["reorder"]:
+            return link_free_time
+        delay = max(0.0, link["delay"] + self.random.uniform(-link["jitter"], link["jitter"])) / 1000
+        # Jitter does not reorder frames (unless they are picked to be reordered)
+        delivery_time = max(link_free_time + delay, self.last_delivery_time.get(sender, 0.0))
+        self.last_delivery_time[sender] = delivery_time
+        return delivery_time
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+from multiprocessing.sharedctypes import RawArray
+
+class PhaseProfiler:
+    """
+    Low-overhead timers around the phases (methods) of the protocol.
+
+    For each phase, the number of calls, the total time (including nested
+    phases) and the self time (excluding nested phases) are kept in shared
+    memory, so phases executed by child processes (e.g., the receiver of
+    `CommunicationSystem`) are also accounted for. Phases must be wrapped
+    before those processes are started.
+    """
+
+    def __init__(self, capacity: int = 64) -> None:
+        """
+        Constructor.
+
+        Args:
+            capacity (int, optional): maximum number of phases
+        """
+        self.values = memoryview(RawArray("d", 3 * capacity)).cast("B").cast("d")
+        self.capacity = capacity
+        self.phases = {}
+        self.stack = []
+
+
+    def wrap(self, instance: object, method_name: str, phase: str | None = None) -> None:
+        """
+        Replace `instance`'s method with a timed version.
+
+        Args:
+            instance (object): object whose method is wrapped
+            method_name (str): name of the method
+            phase (str | None, optional): name of the phase (defaults to `method_name`)
+
+        Raises:
+            MemoryError: there are no free slots for more phases
+        """
+        phase = phase or method_name
+        if phase not in self.phases:
+            if len(self.phases) == self.capacity:
+                raise MemoryError("Profiler is full.")
+            self.phases[phase] = 3 * len(self.phases)
+        index = self.phases[phase]
+        method = getattr(instance, method_name)
+        values = self.values
+        stack = self.stack
+        perf_counter = time.perf_counter
+
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            stack.append(0.0)
+            start_time = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed_time = perf_counter() - start_time
+                nested_time = stack.pop()
+                if stack:
+                    stack[-1] += elapsed_time
+                values[index] += 1
+                values[index+1] += elapsed_time
+                values[index+2] += elapsed_time - nested_time
+
+        setattr(instance, method_name, timed_method)
+
+
+    def get_breakdown(self) -> dict:
+        """
+        Get time breakdown per phase.
+
+        Returns:
+            dict: calls, total time, self time and mean time of each phase
+        """
+        breakdown = {}
+        for phase, index in self.phases.items():
+            calls, total_time, self_time = self.values[index:index+3]
+            breakdown[phase] = {
+                "calls": int(calls),
+                "total_time": total_time,
+                "self_time": self_time,
+                "mean_time": total_time / calls if calls else 0.0
+            }
+        return dict(sorted(breakdown.items(), key=lambda item: item[1]["self_time"], reverse=True))
+
+
+    def dump(self, filename: str) -> None:
+        """
+        Dump time breakdown per phase to a JSON file.
+
+        Args:
+            filename (str): name of the file
+        """
+        with open(filename, "w") as output:
+            json.dump(self.get_breakdown(), output, indent=2)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that periodically samples the stack of a thread
+    while the protocol's epoch is within a range. Stacks are aggregated in
+    the folded format used by flame graph tools.
+    """
+
+    def __init__(self, epoch, first_epoch: int, last_epoch: int, interval: float = 0.005,
+                 thread_id: int | None = None) -> None:
+        """
+        Constructor.
+
+        Args:
+            epoch (Value): current epoch of the protocol
+            first_epoch (int): first sampled epoch
+            last_epoch (int): last sampled epoch
+            interval (float, optional): time between samples (in seconds)
+            thread_id (int | None, optional): id of the sampled thread (defaults to the current thread)
+        """
+        self.epoch = epoch
+        self.first_epoch = first_epoch
+        self.last_epoch = last_epoch
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = {}
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+
+    def start(self) -> None:
+        """
+        Start sampling (in a background thread).
+        """
+        self.thread.start()
+
+
+    def sample(self) -> None:
+        """
+        Sample the stack of the thread until the last epoch ends.
+        """
+        while self.epoch.value <= self.last_epoch:
+            time.sleep(self.interval)
+            if self.epoch.value < self.first_epoch:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                # Skip wrappers of the phase profiler
+                if code.co_filename != __file__:
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                folded_stack = ";".join(reversed(stack))
+                self.stacks[folded_stack] = self.stacks.get(folded_stack, 0) + 1
+
+
+    def dump(self, filename: str) -> None:
+        """
+        Dump folded stacks to a file (one stack per line, followed by its number of samples).
+
+        Args:
+            filename (str): name of the file
+        """
+        with open(filename, "w") as output:
+            for stack, count in sorted(self.stacks.items()):
+                output.write(f"{stack} {count}\n")
+
@@ -0,0 +1,164 @@
+import struct
+import logging
+from typing import Self
+import crypto
+
+# Header: epoch (uint32), size of the voters' bitmap (uint16) and size of each signature (uint16)
+HEADER = struct.Struct(">IHH")
+HASH_SIZE = 32
+
+class QuorumCertificate:
+    """
+    Transferable proof that a block was notarized, containing:
+    - Epoch and hash of the block
+    - Bitmap of the voters (bit `i` is set if server `i` voted)
+    - Voters' signatures (ordered by voter's ID)
+    """
+
+    def __init__(self, epoch: int, block_hash: str, voters: int, signatures: list[bytes]) -> None:
+        """
+        Constructor.
+
+        Args:
+            epoch (int): epoch of the block
+            block_hash (str): hash of the block
+            voters (int): bitmap of the voters
+            signatures (list[bytes]): voters' signatures
+        """
+        self.epoch = epoch
+        self.block_hash = block_hash
+        self.voters = voters
+        self.signatures = signatures
+
+
+    def get_epoch(self) -> int:
+        """
+        Get epoch of the certified block.
+
+        Returns:
+            int: epoch
+        """
+        return self.epoch
+
+
+    def get_block_hash(self) -> str:
+        """
+        Get hash of the certified block.
+
+        Returns:
+            str: hash
+        """
+        return self.block_hash
+
+
+    def get_voters(self) -> list[int]:
+        """
+        Get IDs of the voters.
+
+        Returns:
+            list[int]: voters' IDs (in ascending order)
+        """
+        return [id for id in range(self.voters.bit_length()) if self.voters >> id & 1]
+
+
+    def get_signatures(self) -> list[bytes]:
+        """
+        Get voters' signatures.
+
+        Returns:
+            list[bytes]: signatures (ordered by voter's ID)
+        """
+        return self.signatures
+
+
+    @staticmethod
+    def create(block) -> Self:
+        """
+        Create certificate from the (valid) votes of a block.
+
+        Args:
+            block (Block): notarized block
+
+        Returns:
+            QuorumCertificate: certificate of the block
+        """
+        votes = sorted(block.get_votes(), key=lambda vote: vote[0])
+        voters = 0
+        for voter, _ in votes:
+            voters |= 1 << voter
+        signatures = [bytes.fromhex(vote.get_signature()) for _, vote in votes]
+        return QuorumCertificate(block.get_epoch(), block.get_hash(), voters, signatures)
+
+
+    def verify(self, servers_public_key: dict, quorum: int) -> bool:
+        """
+        Check if certificate contains `quorum` valid signatures from distinct servers.
+
+        Args:
+            servers_public_key (dict): public key of each server
+            quorum (int): minimum number of voters
+
+        Returns:
+            bool: True, if and only if the certificate is valid, else return False
+        """
+        voters = self.get_voters()
+        if len(voters) < quorum or len(voters) != len(self.signatures):
+            return False
+        if any(voter not in servers_public_key for voter in voters):
+            return False
+        public_keys = [servers_public_key[voter] for voter in voters]
+        return crypto.verify_signatures(self.signatures, self.block_hash, public_keys)
+
+
+    def to_bytes(self) -> bytes:
+        """
+        Convert QuorumCertificate to bytes.
+
+        Returns:
+            bytes: bytes of QuorumCertificate object
+        """
+        voters = self.voters.to_bytes((self.voters.bit_length() + 7) // 8, "little")
+        signature_size = len(self.signatures[0]) if self.signatures else 0
+        return (HEADER.pack(self.epoch, len(voters), signature_size) + bytes.fromhex(self.block_hash)
+                + voters + b"".join(self.signatures))
+
+
+    @staticmethod
+    def from_bytes(data_bytes: bytes) -> Self | None:
+        """
+        Convert bytes to QuorumCertificate. Additionally, check if the
+        number of signatures matches the number of voters.
+
+        Args:
+            data_bytes (bytes): QuorumCertificate in serialized form
+
+        Returns:
+            QuorumCertificate: QuorumCertificate object from bytes
+        """
+        try:
+            epoch, voters_size, signature_size = HEADER.unpack_from(data_bytes)
+        except struct.error:
+            logging.error("Quorum certificate header cannot be unpacked.\n")
+            return None
+        offset = HEADER.size
+        block_hash = data_bytes[offset:offset+HASH_SIZE].hex()
+        offset += HASH_SIZE
+        voters = int.from_bytes(data_bytes[offset:offset+voters_size], "little")
+        offset += voters_size
+        signatures = [data_bytes[index:index+signature_size]
+                      for index in range(offset, len(data_bytes), signature_size or 1)]
+        if (len(block_hash) != 2 * HASH_SIZE or signature_size == 0
+                or len(data_bytes) - offset != voters.bit_count() * signature_size):
+            logging.error("Quorum certificate is malformed.\n")
+            return None
+        return QuorumCertificate(epoch, block_hash, voters, signatures)
+
+
+    def __str__(self) -> str:
+        """
+        Represent QuorumCertificate in a string.
+
+        Returns:
+            str: string representation of QuorumCertificate
+        """
+        return f"QuorumCertificate(epoch={self.epoch}, hash={self.block_hash}, voters={self.get_voters()})"
@@ -0,0 +1,369 @@
+import os
+import sys
+import json
+import time
+import heapq
+import hashlib
+import logging
+import argparse
+import itertools
+from multiprocessing import Value
+import crypto
+from block import Block
+from blockchain import Blockchain
+from blockstatus import BlockStatus
+from clock import VirtualClock
+from duplicatefilter import DuplicateFilter
+from eventtrace import EventTrace
+from message import Message
+from messagetype import MessageType
+from messagerecorder import MessageRecorder, FRAME, PROPOSAL
+from profiler import PhaseProfiler
+from simulator import SimulatedTransactionGenerator
+from streamlet import Streamlet
+from mempool import Mempool
+from availabilitylayer import AvailabilityLayer
+
+EPOCH = 0
+DELIVER = 1
+TIMER = 2
+
+
+class ReplayCommunication:
+    """
+    Replacement of `CommunicationSystem` that decodes recorded frames (with
+    the same handling) and discards sent messages.
+    """
+
+    def __init__(self, server_id: int, num_replicas: int, link_authentication: bool) -> None:
+        """
+        Constructor.
+
+        Args:
+            server_id (int): id of the server/replica
+            num_replicas (int): number of servers
+            link_authentication (bool): if set to True, frames were authenticated by the link (HMAC)
+        """
+        self.server_id = server_id
+        self.num_replicas = num_replicas
+        self.link_authentication = link_authentication
+        self.epoch = Value("i", 0)
+        self.duplicate_filter = DuplicateFilter()
+        self.decoded_messages = 0
+        self.duplicate_messages = 0
+        self.sent_messages = 0
+
+
+    def send(self, message: bytes, server_id: int, message_type: MessageType | None = None) -> int:
+        """
+        Discard message sent to server with `server_id`.
+
+        Args:
+            message (bytes): message to send
+            server_id (int): id of receiving server
+            message_type (MessageType | None, optional): type of the message
+
+        Returns:
+            int: size of the message
+        """
+        self.sent_messages += 1
+        return len(message)
+
+
+    def broadcast(self, message: bytes, message_type: MessageType | None = None) -> int:
+        """
+        Discard broadcast message.
+
+        Args:
+            message (bytes): message to broadcast
+            message_type (MessageType | None, optional): type of the message
+
+        Returns:
+            int: size of the message (as if it was sent to every other server)
+        """
+        self.sent_messages += 1
+        return len(message) * (self.num_replicas - 1)
+
+
+    def receive(self, data: bytes) -> Message | None:
+        """
+        Convert recorded frame to a message (same handling of `CommunicationSystem`).
+
+        Args:
+            data (bytes): recorded frame
+
+        Returns:
+            Message | None: message (None, for duplicates and bootstrap messages)
+        """
+        if self.duplicate_filter.is_duplicate(data):
+            self.duplicate_messages += 1
+            return None
+        self.decoded_messages += 1
+        message = Message.from_bytes(data)
+        if message is None or message.get_type() in (MessageType.PK_EXCHANGE, MessageType.READY):
+            return None
+        if message.get_type() == MessageType.ECHO:
+            return message.get_content()
+        message.set_authenticated(self.link_authentication)
+        return message
+
+
+    def flush_due(self) -> None:
+        """
+        Messages are sent immediately, so there is nothing to flush.
+        """
+
+
+    def get_epoch(self) -> Value:
+        """
+        Get current epoch of the protocol (updated by the protocol).
+
+        Returns:
+            Value: current epoch
+        """
+        return self.epoch
+
+
+    def get_message(self, timeout: float | None) -> Message:
+        """
+        Messages are delivered by the replay, so there is nothing to wait for.
+
+        Raises:
+            TimeoutError: always
+        """
+        raise TimeoutError
+
+
+class ReplayTransactionGenerator(SimulatedTransactionGenerator):
+    """
+    Provides the transactions of the recorded proposals, or disseminated
+    batches (so proposals, batches and their hashes match the recorded
+    run), then synthetic transactions.
+    """
+
+    def __init__(self, proposals: list, transaction_size: int, transaction_number: int, clock: VirtualClock) -> None:
+        """
+        Constructor.
+
+        Args:
+            proposals (list): recorded proposals or transaction batches of the server (in order)
+            transaction_size (int): transaction's size
+            transaction_number (int): number of transactions per block
+            clock (VirtualClock): clock used for the transactions' creation time
+        """
+        super().__init__(transaction_size, transaction_number, clock)
+        self.recorded_transactions = [proposal.get_content().get_transactions() for proposal in proposals]
+        self.recorded_transactions.reverse()
+
+
+    def get_transactions(self) -> list:
+        """
+        Get transactions.
+
+        Returns:
+            list: list of transactions
+        """
+        if self.recorded_transactions:
+            return self.recorded_transactions.pop()
+        return super().get_transactions()
+
+
+class Replayer:
+    """
+    Feeds a recording of inbound frames to a single Streamlet instance, on
+    a virtual clock: epochs start at the recorded times and frames are
+    delivered at their arrival times (as fast as possible or at the
+    recorded speed).
+    """
+
+    def __init__(self, filename: str, key_file: str | None = None, speed: float = 0.0) -> None:
+        """
+        Constructor.
+
+        Args:
+            filename (str): name of the recording
+            key_file (str | None, optional): private key of the recorded server (see `KEY_DIRECTORY`)
+            speed (float, optional): speed relative to the recorded run (0 replays as fast as possible)
+
+        Raises:
+            ValueError: recording is not valid (or has no metadata), or key file is not valid
+        """
+        self.metadata, records = MessageRecorder.load(filename)
+        if "start_time" not in self.metadata:
+            raise ValueError("Recording has no metadata.")
+        self.speed = speed
+        self.server_id = self.metadata["server_id"]
+        # Records of both processes are interleaved in chunks
+        self.frames = sorted(((timestamp, data) for kind, timestamp, data in records if kind == FRAME),
+                             key=lambda frame: frame[0])
+        # Transactions of the server were proposed, or disseminated (compact proposals and availability layer)
+        if self.metadata.get("availability_quorum"):
+            source = MessageType.BATCH
+        elif self.metadata.get("compact_proposals"):
+            source = MessageType.TRANSACTIONS
+        else:
+            source = MessageType.PROPOSE
+        proposals = [Message.from_bytes(data) for kind, _, data in records if kind == PROPOSAL]
+        proposals = [proposal for proposal in proposals if proposal and proposal.get_type() == source]
+        if key_file:
+            if not os.path.exists(key_file):
+                raise ValueError(f"Key file {key_file} does not exist.")
+            public_key, private_key = crypto.load_or_generate_keys(key_file)
+            if crypto.serialize_public_key(public_key).decode() != self.metadata["public_key"]:
+                raise ValueError("Key file does not belong to the recorded server.")
+        else:
+            # Own signatures differ from the recorded ones (certificates with them are not valid)
+            logging.warning("Private key of the recorded server is not available: using a new key.")
+            public_key, private_key = crypto.generate_keys()
+        servers_public_key = self.get_public_keys()
+        servers_public_key[self.server_id] = public_key
+        self.clock = VirtualClock(self.metadata["start_time"])
+        self.communication = ReplayCommunication(self.server_id, len(servers_public_key),
+                                                 self.metadata["link_authentication"])
+        self.protocol = Streamlet(
+            self.server_id,
+            self.communication,
+            private_key,
+            servers_public_key,
+            self.metadata["epoch_duration"],
+            self.metadata["fault_number"],
+            sys.maxsize,
+            sys.maxsize,
+            transaction_generator=ReplayTransactionGenerator(proposals,
+                                                             self.metadata["transaction_size"],
+                                                             self.metadata["transaction_number"], self.clock),
+            clock=self.clock,
+            blockchain=Blockchain(write_blocks=False),
+            trace=EventTrace(0),
+            vote_mode=self.metadata["vote_mode"],
+            vote_timeout=self.metadata["vote_timeout"],
+            mempool=Mempool() if self.metadata.get("compact_proposals") else None,
+            availability=(AvailabilityLayer(self.server_id, private_key, servers_public_key,
+                                            self.metadata["availability_quorum"])
+                          if self.metadata.get("availability_quorum") else None)
+        )
+
+
+    def get_public_keys(self) -> dict:
+        """
+        Get public keys of the other servers (from the recorded public key exchange).
+
+        Returns:
+            dict: public key of each server
+        """
+        servers_public_key = {}
+        for _, data in self.frames:
+            message = Message.from_bytes(data)
+            if message and message.get_type() == MessageType.PK_EXCHANGE:
+                servers_public_key[message.get_sender()] = crypto.load_public_key(message.get_content()[0])
+        return servers_public_key
+
+
+    def run(self) -> dict:
+        """
+        Replay every recorded frame.
+
+        Returns:
+            dict: statistics of the replay
+        """
+        events = []
+        sequence = itertools.count()
+        for timestamp, data in self.frames:
+            heapq.heappush(events, (timestamp, next(sequence), DELIVER, data))
+        end_time = self.frames[-1][0] if self.frames else self.metadata["start_time"]
+        heapq.heappush(events, (self.metadata["start_time"], next(sequence), EPOCH, None))
+        self.protocol.initialize()
+        timer = None
+        wall_start_time = time.perf_counter()
+        while events:
+            event_time, _, kind, data = heapq.heappop(events)
+            if self.speed:
+                time.sleep(max(0.0, wall_start_time + (event_time - self.metadata["start_time"]) / self.speed
+                               - time.perf_counter()))
+            self.clock.advance(event_time)
+            if kind == EPOCH:
+                self.protocol.advance_epoch()
+                next_epoch_time = event_time + self.metadata["epoch_duration"]
+                if next_epoch_time <= end_time:
+                    heapq.heappush(events, (next_epoch_time, next(sequence), EPOCH, None))
+            elif kind == TIMER:
+                self.protocol.check_vote_fallback()
+            else:
+                message = self.communication.receive(data)
+                if message is not None:
+                    self.protocol.process_message(message)
+            while (message := self.protocol.get_early_message()) is not None:
+                self.protocol.process_message(message)
+            # Wake up the protocol when its vote must be broadcast (linear mode)
+            deadline = self.protocol.get_vote_fallback_deadline()
+            if deadline is not None and timer != deadline:
+                timer = deadline
+                heapq.heappush(events, (deadline, next(sequence), TIMER, None))
+        wall_time = time.perf_counter() - wall_start_time
+        return self.get_statistics(wall_time)
+
+
+    def get_statistics(self, wall_time: float) -> dict:
+        """
+        Get statistics of the replay.
+
+        Args:
+            wall_time (float): duration of the replay (in seconds)
+
+        Returns:
+            dict: statistics
+        """
+        finalized_blocks = sorted((block for block in self.protocol.blockchain.chain.values()
+                                   if block.get_status() == BlockStatus.FINALIZED and block.get_epoch() >= 1),
+                                  key=Block.get_epoch)
+        # Digest of the finalized chain (equal digests mean that A/B runs reached the same state)
+        digest = hashlib.sha256("".join(block.get_hash() for block in finalized_blocks).encode()).hexdigest()
+        return {
+            "server_id": self.server_id,
+            "frames": len(self.frames),
+            "decoded_messages": self.communication.decoded_messages,
+            "duplicate_messages": self.communication.duplicate_messages,
+            "sent_messages": self.communication.sent_messages,
+            "epochs": self.protocol.epoch.value,
+            "finalized_blocks": len(finalized_blocks),
+            "finalized_digest": digest,
+            "wall_time": wall_time,
+            "frames_per_second": len(self.frames) / wall_time if wall_time else 0.0
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recording of inbound frames into a single Streamlet instance.")
+    parser.add_argument("recording", help="recording file (see RECORD_DIRECTORY)")
+    parser.add_argument("--key-file", help="private key of the recorded server (from KEY_DIRECTORY)")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="speed relative to the recorded run (default: as fast as possible)")
+    parser.add_argument("--profile", help="dump time breakdown per phase to this file")
+    parser.add_argument("--json", action="store_true", help="print statistics in JSON")
+    arguments = parser.parse_args()
+    try:
+        replayer = Replayer(arguments.recording, arguments.key_file, arguments.speed)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+    profiler = None
+    if arguments.profile:
+        profiler = PhaseProfiler()
+        for phase in ("propose", "process_proposal", "vote", "process_vote", "process_certificate", "finalize",
+                      "get_early_message", "process_message"):
+            profiler.wrap(replayer.protocol, phase)
+        profiler.wrap(replayer.communication, "receive")
+        profiler.wrap(crypto, "verify_signature", "rsa_verify")
+        profiler.wrap(crypto, "verify_signatures", "rsa_verify")
+        profiler.wrap(crypto, "sign_hash", "rsa_sign")
+    statistics = replayer.run()
+    if profiler:
+        profiler.dump(arguments.profile)
+    if arguments.json:
+        print(json.dumps(statistics, indent=2))
+    else:
+        for name, value in statistics.items():
+            print(f"{name}: {value}")
+
+if __name__ == "__main__":
+    main()
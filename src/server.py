@@ -3,9 +3,28 @@ import time
 import logging
 import crypto
 from message import Message
-from streamlet import Streamlet
+from streamlet import Streamlet, MAX_TRANSFER_BYTES
 from messagetype import MessageType
 from communicationsystem import CommunicationSystem
+from networkemulator import NetworkEmulator
+from messagerecorder import MessageRecorder
+from metrics import registry, MetricsServer
+from eventtrace import EventTrace
+from mempool import Mempool
+from availabilitylayer import AvailabilityLayer
+from block import Block
+from blockchain import Blockchain
+from blockstore import BlockStore, BlockQueryServer
+from transactionfilter import TransactionFilter
+from checkpoint import CheckpointStore, CHUNK_SIZE
+from batchcontroller import BatchController, MAX_BATCH_BYTES
+from transactiongenerator import TransactionGenerator
+from profiler import PhaseProfiler, SamplingProfiler
+
+# Estimated bound on the serialization overhead of a transaction and on the rest of a frame
+# (header, certificate, authentication tag), used to validate SHM_RING_SIZE
+TRANSACTION_OVERHEAD = 64
+FRAME_OVERHEAD = 256 * 1024
 
 class Server:
 
@@ -18,48 +37,264 @@ class Server:
             information about every server (host, port and socket)
             id (int): server's ID
         """
+        self.creation_time = time.time()
         self.id = id
         self.servers_configuration = servers_configuration
         self.communication = CommunicationSystem(id, servers_configuration)
-        self.public_key, self.private_key = crypto.generate_keys()
+        # Keys are cached in KEY_DIRECTORY (if set), as generating them dominates the startup time
+        key_directory = os.environ.get("KEY_DIRECTORY")
+        if key_directory:
+            os.makedirs(key_directory, exist_ok=True)
+            self.public_key, self.private_key = crypto.load_or_generate_keys(os.path.join(key_directory, f"server_{id}.pem"))
+        else:
+            self.public_key, self.private_key = crypto.generate_keys()
         self.servers_public_key = {}
+        # Public keys of other servers can be pinned in PUBLIC_KEY_DIRECTORY (otherwise, they are trusted on first use)
+        if os.environ.get("PUBLIC_KEY_DIRECTORY"):
+            self.servers_public_key = crypto.load_public_keys(os.environ.get("PUBLIC_KEY_DIRECTORY"),
+                                                              [server_id for server_id in servers_configuration
+                                                               if server_id != id])
+            self.communication.set_public_keys(self.servers_public_key)
+        self.pending_messages = []
+
+
+    def get_message(self, message_type: MessageType) -> Message:
+        """
+        Get next message of `message_type`, keeping other messages (e.g.,
+        from servers that finished a bootstrap phase first) for later.
+
+        Args:
+            message_type (MessageType): type of the message
+
+        Returns:
+            Message: message
+        """
+        for index, message in enumerate(self.pending_messages):
+            if message.get_type() == message_type:
+                return self.pending_messages.pop(index)
+        while True:
+            message = self.communication.get_message(timeout=None)
+            if message.get_type() == message_type:
+                return message
+            self.pending_messages.append(message)
 
 
     def exchange_public_keys(self) -> None:
         """
-        Exchange public keys between all servers.
+        Exchange public keys between all servers (and derive session keys
+        from the key exchange's public keys).
         """
-        # Send public key to every server
+        # Send public key to every server (with the key exchange's public key, signed with the private key)
+        exchange_public_key = self.communication.get_exchange_public_key()
         public_key = Message(
             MessageType.PK_EXCHANGE,
-            self.public_key,
+            (self.public_key, exchange_public_key, crypto.sign_exchange_key(exchange_public_key, self.id, self.private_key),
+             self.communication.get_codecs()),
             self.id
         ).to_bytes()
-        self.communication.broadcast(public_key)
+        self.communication.broadcast(public_key, MessageType.PK_EXCHANGE)
 
         # Receive and store other servers' public keys
         logging.info("Getting public keys from other servers...\n")
         self.servers_public_key[self.id] = self.public_key
         num_replicas = len(self.servers_configuration)
-        while len(self.servers_public_key) != num_replicas:
-            message = self.communication.get_message(timeout=None)
+        received = {self.id}
+        while len(received) != num_replicas:
+            message = self.get_message(MessageType.PK_EXCHANGE)
             sender = message.get_sender()
-            received_public_key = crypto.load_public_key(message.get_content())
-            self.servers_public_key[sender] = received_public_key
+            received_public_key, exchange_public_key, exchange_signature, codecs = message.get_content()
+            # Pinned keys are kept (the receiver process drops key exchanges with other keys)
+            public_key = self.servers_public_key.get(sender) or crypto.load_public_key(received_public_key)
+            if exchange_public_key is not None:
+                # Session key is only derived from a key exchange's public key signed by the sender
+                if not crypto.verify_exchange_key(exchange_signature, exchange_public_key, sender, public_key):
+                    logging.error("Key exchange's public key of server %d has an invalid signature.\n", sender)
+                    continue
+                self.communication.establish_session(sender, exchange_public_key)
+            self.servers_public_key[sender] = public_key
+            received.add(sender)
+            self.communication.negotiate_codec(sender, codecs)
         logging.info("Public keys were retrieved successfully.\n")
 
 
+    def wait_for_servers(self, start_delay: float) -> float:
+        """
+        Readiness barrier: every server proposes a start time after
+        exchanging keys, and the protocol starts at the latest proposed time
+        (which is the same for every server).
+
+        Args:
+            start_delay (float): delay between being ready and the proposed start time
+
+        Returns:
+            float: start time of the protocol
+        """
+        start_times = {self.id: time.time() + start_delay}
+        ready = Message(
+            MessageType.READY,
+            start_times[self.id],
+            self.id
+        ).to_bytes()
+        self.communication.broadcast(ready, MessageType.READY)
+        num_replicas = len(self.servers_configuration)
+        while len(start_times) != num_replicas:
+            message = self.get_message(MessageType.READY)
+            start_times[message.get_sender()] = message.get_content()
+        return max(start_times.values())
+
+
     def run(self) -> None:
         """
         Start server execution.
         """
+        # Phases of the communication system must be wrapped before starting the receiver process
+        profiler = PhaseProfiler() if os.environ.get("PROFILE") else None
+        if profiler:
+            for phase in ("receive", "deliver", "send", "broadcast", "flush_outbound", "get_message"):
+                profiler.wrap(self.communication, phase)
+            profiler.wrap(crypto, "sign", "rsa_sign")
+            profiler.wrap(crypto, "sign_hash", "rsa_sign")
+            profiler.wrap(crypto, "verify_signature", "rsa_verify")
+            profiler.wrap(crypto, "verify_signatures", "rsa_verify")
+            profiler.wrap(Message, "to_bytes", "serialize_message")
+            profiler.wrap(Message, "from_bytes", "deserialize_message")
+            profiler.wrap(Block, "to_bytes", "serialize_block")
+            profiler.wrap(Blockchain, "get_notarized_chains", "fork_choice")
+        self.communication.set_link_authentication(os.environ.get("LINK_AUTH") == "hmac")
+        queue_capacity = int(os.environ.get("INBOUND_QUEUE_CAPACITY")) if os.environ.get("INBOUND_QUEUE_CAPACITY") else 64
+        peer_capacity = int(os.environ.get("INBOUND_PEER_CAPACITY")) if os.environ.get("INBOUND_PEER_CAPACITY") else 256
+        drop_policy = os.environ.get("INBOUND_DROP_POLICY") if os.environ.get("INBOUND_DROP_POLICY") else "drop_oldest"
+        self.communication.set_flow_control(queue_capacity, peer_capacity, drop_policy)
+        flush_threshold = int(os.environ.get("OUTBOUND_FLUSH_BYTES")) if os.environ.get("OUTBOUND_FLUSH_BYTES") else 65536
+        # Maximum time (in milliseconds) that a queued frame waits to be written
+        flush_interval = float(os.environ.get("OUTBOUND_FLUSH_INTERVAL")) if os.environ.get("OUTBOUND_FLUSH_INTERVAL") else 2.0
+        self.communication.set_coalescing(os.environ.get("OUTBOUND_COALESCING") != "0", flush_threshold,
+                                          flush_interval / 1000)
+        transport = os.environ.get("TRANSPORT") if os.environ.get("TRANSPORT") else "tcp"
+        ring_size = int(os.environ.get("SHM_RING_SIZE")) if os.environ.get("SHM_RING_SIZE") else None
+        self.communication.set_transport(transport, os.environ.get("TRANSPORT_DIRECTORY"), ring_size)
+        # Frames of each group of peers are read and decoded by one of INGRESS_WORKERS receiver processes
+        ingress_workers = int(os.environ.get("INGRESS_WORKERS")) if os.environ.get("INGRESS_WORKERS") else 1
+        self.communication.set_ingress_workers(ingress_workers)
+        if os.environ.get("NETWORK_SCENARIO"):
+            self.communication.set_network_emulator(NetworkEmulator.load(os.environ.get("NETWORK_SCENARIO"), self.id))
+        # Messages carrying transactions are compressed with the first codec (of COMPRESSION) supported by the receiver
+        if os.environ.get("COMPRESSION"):
+            threshold = int(os.environ.get("COMPRESSION_THRESHOLD")) if os.environ.get("COMPRESSION_THRESHOLD") else 1024
+            level = int(os.environ.get("COMPRESSION_LEVEL")) if os.environ.get("COMPRESSION_LEVEL") else 6
+            self.communication.set_compression(os.environ.get("COMPRESSION").split(","), threshold, level)
+        # Inbound frames are recorded to RECORD_DIRECTORY (to be replayed by `replay.py`)
+        recorder = None
+        if os.environ.get("RECORD_DIRECTORY"):
+            os.makedirs(os.environ.get("RECORD_DIRECTORY"), exist_ok=True)
+            recorder = MessageRecorder(os.path.join(os.environ.get("RECORD_DIRECTORY"), f"record_{self.id}.bin"))
+            self.communication.set_recorder(recorder)
         self.communication.start()
-        time.sleep(1)
+        metrics_port = int(os.environ.get("METRICS_PORT")) if os.environ.get("METRICS_PORT") else None
+        if metrics_port is not None:
+            MetricsServer(registry, metrics_port).start()
         self.exchange_public_keys()
+        start_delay = float(os.environ.get("START_DELAY")) if os.environ.get("START_DELAY") else 0.1
+        start_time = self.wait_for_servers(start_delay)
+        logging.info("Servers are ready (bootstrap took %.3f s): protocol starts at %.6f.\n",
+                     start_time - self.creation_time, start_time)
         epoch_duration = float(os.environ.get("EPOCH_DURATION")) if os.environ.get("EPOCH_DURATION") else 1.0
         fault_number = int(os.environ.get("FAULT_NUMBER")) if os.environ.get("FAULT_NUMBER") else 1
         benchmark_threshold = int(os.environ.get("BENCHMARK_THRESHOLD")) if os.environ.get("BENCHMARK_THRESHOLD") else 10000
         benchmark_total = int(os.environ.get("BENCHMARK_TOTAL")) if os.environ.get("BENCHMARK_TOTAL") else 100000
+        trace_capacity = int(os.environ.get("TRACE_CAPACITY")) if os.environ.get("TRACE_CAPACITY") else 65536
+        vote_mode = os.environ.get("VOTE_MODE") if os.environ.get("VOTE_MODE") else "all"
+        vote_timeout = float(os.environ.get("VOTE_TIMEOUT")) if os.environ.get("VOTE_TIMEOUT") else None
+        # Transactions are disseminated to the mempools, and proposals only carry their ids
+        compact_proposals = os.environ.get("COMPACT_PROPOSALS") == "1"
+        # Every server disseminates batches, certified by f+1 (or 2f+1) acknowledgements, and blocks carry their digests
+        availability = None
+        if os.environ.get("DATA_AVAILABILITY"):
+            quorums = {"f+1": fault_number + 1, "2f+1": 2*fault_number + 1}
+            if os.environ.get("DATA_AVAILABILITY") not in quorums:
+                raise ValueError(f"Unknown availability quorum: {os.environ.get('DATA_AVAILABILITY')}")
+            availability = AvailabilityLayer(self.id, self.private_key, self.servers_public_key,
+                                             quorums[os.environ.get("DATA_AVAILABILITY")])
+        # Finalized blocks are indexed in BLOCK_STORE (and served at BLOCK_QUERY_PORT)
+        block_store = None
+        block_query_port = int(os.environ.get("BLOCK_QUERY_PORT")) if os.environ.get("BLOCK_QUERY_PORT") else None
+        # Repeated transactions are detected by a filter of finalized transactions (confirmed by the block store)
+        transaction_filter_enabled = os.environ.get("TRANSACTION_FILTER") == "1"
+        if os.environ.get("BLOCK_STORE") or block_query_port is not None or transaction_filter_enabled:
+            block_store = BlockStore(os.environ.get("BLOCK_STORE") or os.path.join("blockchain", f"blocks_{self.id}.db"))
+            if block_query_port is not None:
+                BlockQueryServer(block_store, block_query_port).start()
+        transaction_filter = None
+        if transaction_filter_enabled:
+            capacity = int(os.environ.get("TRANSACTION_FILTER_CAPACITY")) if os.environ.get("TRANSACTION_FILTER_CAPACITY") else 1000000
+            error_rate = float(os.environ.get("TRANSACTION_FILTER_ERROR")) if os.environ.get("TRANSACTION_FILTER_ERROR") else 0.001
+            transaction_filter = TransactionFilter(capacity, error_rate, block_store)
+        checkpoint_store = None
+        if os.environ.get("CHECKPOINT_INTERVAL"):
+            chunk_size = int(os.environ.get("CHECKPOINT_CHUNK_SIZE")) if os.environ.get("CHECKPOINT_CHUNK_SIZE") else CHUNK_SIZE
+            checkpoint_store = CheckpointStore(int(os.environ.get("CHECKPOINT_INTERVAL")),
+                                               os.path.join(os.environ.get("CHECKPOINT_DIRECTORY") or "blockchain", f"checkpoints_{self.id}"),
+                                               chunk_size)
+        transaction_generator = TransactionGenerator()
+        # The number of transactions per block is adapted so blocks are notarized before ADAPTIVE_BATCH_TARGET of the epoch
+        batch_controller = None
+        if os.environ.get("ADAPTIVE_BATCH") == "1":
+            target = float(os.environ.get("ADAPTIVE_BATCH_TARGET")) if os.environ.get("ADAPTIVE_BATCH_TARGET") else 0.5
+            maximum_bytes = int(os.environ.get("ADAPTIVE_BATCH_MAX_BYTES")) if os.environ.get("ADAPTIVE_BATCH_MAX_BYTES") else MAX_BATCH_BYTES
+            batch_controller = BatchController(epoch_duration, transaction_generator.get_transaction_size(),
+                                               transaction_generator.get_transaction_number(), target, maximum_bytes)
+        # Shared-memory rings must hold the largest frame: a proposal with the largest batch (transactions take
+        # up to TRANSACTION_OVERHEAD more bytes once serialized), a block response or a checkpoint chunk
+        transaction_size = transaction_generator.get_transaction_size()
+        largest_batch = transaction_generator.get_transaction_number() * transaction_size
+        if batch_controller is not None:
+            largest_batch = max(largest_batch, maximum_bytes)
+        largest_block = largest_batch // transaction_size * (transaction_size + TRANSACTION_OVERHEAD)
+        largest_chunk = chunk_size if checkpoint_store else 0
+        self.communication.check_frame_size(max(largest_block, MAX_TRANSFER_BYTES, largest_chunk) + FRAME_OVERHEAD)
         protocol = Streamlet(self.id, self.communication, self.private_key, self.servers_public_key,
-                             epoch_duration, fault_number, benchmark_threshold, benchmark_total)
-        protocol.start()
\ No newline at end of file
+                             epoch_duration, fault_number, benchmark_threshold, benchmark_total,
+                             transaction_generator=transaction_generator,
+                             blockchain=Blockchain(block_store=block_store),
+                             trace=EventTrace(trace_capacity), vote_mode=vote_mode, vote_timeout=vote_timeout,
+                             mempool=Mempool() if compact_proposals else None, availability=availability,
+                             transaction_filter=transaction_filter, checkpoint_store=checkpoint_store,
+                             batch_controller=batch_controller)
+        if profiler:
+            for phase in ("propose", "process_proposal", "vote", "process_vote", "process_certificate", "finalize",
+                          "get_early_message", "process_message"):
+                profiler.wrap(protocol, phase)
+        # Protocol messages received during the bootstrap
+        protocol.early_messages.extend(message for message in self.pending_messages
+                                       if message.get_type() not in (MessageType.PK_EXCHANGE, MessageType.READY))
+        sampler = None
+        if os.environ.get("PROFILE_EPOCHS"):
+            first_epoch, last_epoch = (int(epoch) for epoch in os.environ.get("PROFILE_EPOCHS").split("-"))
+            interval = float(os.environ.get("PROFILE_INTERVAL")) if os.environ.get("PROFILE_INTERVAL") else 0.005
+            sampler = SamplingProfiler(protocol.epoch, first_epoch, last_epoch, interval)
+            sampler.start()
+        if recorder:
+            recorder.record_metadata({
+                "server_id": self.id,
+                "fault_number": fault_number,
+                "epoch_duration": epoch_duration,
+                "vote_mode": vote_mode,
+                "vote_timeout": vote_timeout,
+                "compact_proposals": compact_proposals,
+                "availability_quorum": availability.get_quorum() if availability else None,
+                "link_authentication": self.communication.link_authentication,
+                "transaction_size": protocol.transaction_generator.get_transaction_size(),
+                "transaction_number": protocol.transaction_generator.get_transaction_number(),
+                "start_time": start_time,
+                "public_key": crypto.serialize_public_key(self.public_key).decode()
+            })
+        protocol.start(start_time)
+        if recorder:
+            recorder.flush()
+
+        # Dump profiles next to the benchmark results
+        filename = f"profile_{protocol.get_run_name()}"
+        if profiler:
+            profiler.dump(f"{filename}.json")
+        if sampler:
+            sampler.dump(f"{filename}.folded")
\ No newline at end of file
@@ -0,0 +1,149 @@
+import os
+import mmap
+import struct
+
+# Write position (head) and read position (tail) are kept in separate cache lines
+POSITION = struct.Struct("=Q")
+HEAD_OFFSET = 0
+TAIL_OFFSET = 64
+DATA_OFFSET = 128
+LENGTH = struct.Struct(">I")
+
+class SharedMemoryRing:
+    """
+    Single-producer/single-consumer byte ring in a memory-mapped file, used
+    as a mailbox between two co-located replicas. The producer writes
+    frames (length followed by the data, as in a TCP stream) and the
+    consumer reads complete frames. Positions only increase, so the ring
+    is empty when they are equal and full when they are `capacity` apart.
+    """
+
+    def __init__(self, path: str, capacity: int = 8 * 1024 * 1024, create: bool = False) -> None:
+        """
+        Constructor.
+
+        Args:
+            path (str): path of the file backing the ring
+            capacity (int, optional): size of the ring (in bytes), when it is created
+            create (bool, optional): if set to True, (re)create the ring, else attach to an existing ring
+
+        Raises:
+            FileNotFoundError: ring does not exist (and it is not created)
+        """
+        if create:
+            # Replace stale rings (a producer may still have the old one mapped)
+            if os.path.exists(path):
+                os.unlink(path)
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o600)
+            os.ftruncate(fd, DATA_OFFSET + capacity)
+        else:
+            fd = os.open(path, os.O_RDWR)
+            capacity = os.fstat(fd).st_size - DATA_OFFSET
+        self.memory = mmap.mmap(fd, DATA_OFFSET + capacity)
+        os.close(fd)
+        self.path = path
+        self.capacity = capacity
+        self.data = memoryview(self.memory)[DATA_OFFSET:]
+
+
+    def get_path(self) -> str:
+        """
+        Get path of the file backing the ring.
+
+        Returns:
+            str: path
+        """
+        return self.path
+
+
+    def get_capacity(self) -> int:
+        """
+        Get size of the ring (frames larger than it can never be written,
+        as the consumer only reads complete frames).
+
+        Returns:
+            int: size (in bytes)
+        """
+        return self.capacity
+
+
+    def write(self, buffers: list) -> int:
+        """
+        Write as many bytes of `buffers` as fit in the ring.
+
+        Args:
+            buffers (list): buffers to write (in order)
+
+        Returns:
+            int: number of written bytes (0, if the ring is full)
+        """
+        head = POSITION.unpack_from(self.memory, HEAD_OFFSET)[0]
+        tail = POSITION.unpack_from(self.memory, TAIL_OFFSET)[0]
+        free = self.capacity - (head - tail)
+        written = 0
+        for buffer in buffers:
+            size = min(len(buffer), free - written)
+            if size == 0:
+                break
+            self.copy_in(head + written, memoryview(buffer)[:size])
+            written += size
+        # Data is copied before the consumer can see the new head
+        POSITION.pack_into(self.memory, HEAD_OFFSET, head + written)
+        return written
+
+
+    def read(self) -> list[bytes]:
+        """
+        Read every complete frame (without their lengths).
+
+        Returns:
+            list[bytes]: data of each frame (empty, if there are no complete frames)
+        """
+        head = POSITION.unpack_from(self.memory, HEAD_OFFSET)[0]
+        tail = POSITION.unpack_from(self.memory, TAIL_OFFSET)[0]
+        if head == tail:
+            return []
+        # Available bytes are copied at once and split into frames (the last frame may be incomplete)
+        data = self.copy_out(tail, head - tail)
+        frames = []
+        offset = 0
+        while len(data) - offset >= LENGTH.size:
+            length = LENGTH.unpack_from(data, offset)[0]
+            if len(data) - offset - LENGTH.size < length:
+                break
+            frames.append(data[offset+LENGTH.size:offset+LENGTH.size+length])
+            offset += LENGTH.size + length
+        POSITION.pack_into(self.memory, TAIL_OFFSET, tail + offset)
+        return frames
+
+
+    def copy_in(self, position: int, buffer: memoryview) -> None:
+        """
+        Copy `buffer` to the ring, starting at `position` (wrapping around the end).
+
+        Args:
+            position (int): position in the ring
+            buffer (memoryview): data to copy
+        """
+        offset = position % self.capacity
+        size = min(len(buffer), self.capacity - offset)
+        self.data[offset:offset+size] = buffer[:size]
+        if size < len(buffer):
+            self.data[:len(buffer)-size] = buffer[size:]
+
+
+    def copy_out(self, position: int, size: int) -> bytes:
+        """
+        Copy `size` bytes from the ring, starting at `position` (wrapping around the end).
+
+        Args:
+            position (int): position in the ring
+            size (int): number of bytes
+
+        Returns:
+            bytes: copied data
+        """
+        offset = position % self.capacity
+        if offset + size <= self.capacity:
+            return self.data[offset:offset+size].tobytes()
+        return self.data[offset:].tobytes() + self.data[:offset+size-self.capacity].tobytes()
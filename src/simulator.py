@@ -0,0 +1,638 @@
+import sys
+import heapq
+import random
+import hashlib
+import logging
+import argparse
+import itertools
+import time
+from typing import Callable
+from multiprocessing import Value
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric import utils
+from blockchain import Blockchain
+from blockstatus import BlockStatus
+from clock import VirtualClock
+from eventtrace import EventTrace
+from message import Message
+from duplicatefilter import DuplicateFilter
+from messagetype import MessageType
+from mempool import Mempool
+from availabilitylayer import AvailabilityLayer
+from transactionfilter import TransactionFilter
+from checkpoint import CheckpointStore
+from batchcontroller import BatchController
+from streamlet import Streamlet
+from metrics import registry
+
+EPOCH = 0
+DELIVER = 1
+TIMER = 2
+
+
+class SimulatedKey:
+    """
+    No-op key used in place of RSA keys during simulations. It provides the
+    methods used by `crypto` (for both private and public keys), and a
+    "signature" is the key's id followed by the signed digest.
+    """
+
+    def __init__(self, key_id: int) -> None:
+        """
+        Constructor.
+
+        Args:
+            key_id (int): id of the key (server's ID)
+        """
+        self.key_id = key_id.to_bytes(4, "big")
+
+
+    def public_key(self) -> "SimulatedKey":
+        """
+        Get public key.
+
+        Returns:
+            SimulatedKey: the key itself
+        """
+        return self
+
+
+    def sign(self, data: bytes, padding, algorithm) -> bytes:
+        """
+        Sign `data`.
+
+        Args:
+            data (bytes): content (or digest, if `algorithm` is prehashed)
+            padding: ignored
+            algorithm: hash algorithm
+
+        Returns:
+            bytes: signature
+        """
+        if isinstance(algorithm, utils.Prehashed):
+            return self.key_id + data
+        return self.key_id + hashlib.sha256(data).digest()
+
+
+    def verify(self, signature: bytes, digest: bytes, padding, algorithm) -> None:
+        """
+        Verify `signature` of `digest`.
+
+        Args:
+            signature (bytes): signature
+            digest (bytes): digest of the signed content
+            padding: ignored
+            algorithm: ignored
+
+        Raises:
+            InvalidSignature: signature is not valid
+        """
+        if signature != self.key_id + digest:
+            raise InvalidSignature
+
+
+class SimulatedTransactionGenerator:
+    """
+    Synchronous replacement of `TransactionGenerator` (no extra process).
+    """
+
+    def __init__(self, transaction_size: int, transaction_number: int, clock: VirtualClock,
+                 resubmission_rate: float = 0.0, seed: int = 0, client_id: int = 0) -> None:
+        """
+        Constructor.
+
+        Args:
+            transaction_size (int): transaction's size
+            transaction_number (int): number of transactions per block
+            clock (VirtualClock): clock used for the transactions' creation time
+            resubmission_rate (float, optional): fraction of each batch made of earlier transactions
+                (i.e., clients' resubmissions and replays)
+            seed (int, optional): seed of the choice of resubmitted transactions
+            client_id (int, optional): client's ID of the transactions (so generators of different
+                replicas do not create equal transactions)
+        """
+        self.clock = clock
+        self.transaction_size = transaction_size
+        self.transaction_number = transaction_number
+        self.last_transaction = 0
+        self.client_id = client_id
+        self.resubmission_rate = resubmission_rate
+        self.random_object = random.Random(seed)
+        # Earlier transactions (that may be resubmitted)
+        self.history = []
+
+
+    def get_transactions(self) -> list:
+        """
+        Get transactions.
+
+        Returns:
+            list: list of transactions
+        """
+        creation_time = self.clock.time()
+        # Payloads are distinct objects (as in `TransactionGenerator`), otherwise pickle would serialize a single copy
+        transactions = [(self.last_transaction+i, self.client_id, "\x00"*self.transaction_size, creation_time) for i in range(self.transaction_number)]
+        self.last_transaction += self.transaction_number
+        if self.resubmission_rate:
+            resubmitted = round(self.resubmission_rate * len(transactions)) if self.history else 0
+            self.history.extend(transactions[resubmitted:])
+            transactions[:resubmitted] = self.random_object.sample(self.history, min(resubmitted, len(self.history)))
+            del self.history[:-10 * self.transaction_number]
+        return transactions
+
+
+    def get_transaction_size(self) -> int:
+        """
+        Get size of transactions.
+
+        Returns:
+            int: transaction's size
+        """
+        return self.transaction_size
+
+
+    def get_transaction_number(self) -> int:
+        """
+        Get number of generated transactions.
+
+        Returns:
+            int: number of transactions
+        """
+        return self.transaction_number
+
+
+class SimulatedNetwork:
+    """
+    Discrete-event network: keeps a queue of events ordered by virtual time.
+    """
+
+    def __init__(self, latency: Callable[[random.Random], float], seed: int = 0, bandwidth: float | None = None) -> None:
+        """
+        Constructor.
+
+        Args:
+            latency (Callable[[random.Random], float]): returns the delay of a message
+            seed (int, optional): seed of the network's randomness
+            bandwidth (float | None, optional): bytes per second of each link (if set, larger
+                messages take longer to be delivered)
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.random = random.Random(seed)
+        self.clock = VirtualClock()
+        self.events = []
+        self.sequence = itertools.count()
+        self.sent_messages = 0
+        self.sent_bytes = 0
+
+
+    def schedule(self, event_time: float, kind: int, server_id: int, data: bytes | None = None) -> None:
+        """
+        Schedule an event.
+
+        Args:
+            event_time (float): virtual time of the event
+            kind (int): type of event (EPOCH, DELIVER or TIMER)
+            server_id (int): id of the server that handles the event
+            data (bytes | None, optional): message to deliver
+        """
+        heapq.heappush(self.events, (event_time, next(self.sequence), kind, server_id, data))
+
+
+    def transmit(self, data: bytes, server_id: int) -> None:
+        """
+        Transmit `data` to server with `server_id`.
+
+        Args:
+            data (bytes): message to transmit
+            server_id (int): id of receiving server
+        """
+        self.sent_messages += 1
+        self.sent_bytes += len(data)
+        delay = max(0.0, self.latency(self.random))
+        if self.bandwidth:
+            delay += len(data) / self.bandwidth
+        self.schedule(self.clock.time() + delay, DELIVER, server_id, data)
+
+
+    def next_event(self) -> tuple | None:
+        """
+        Get the next event and advance the virtual time to it.
+
+        Returns:
+            tuple | None: (time, kind, server_id, data), or None if there are no events
+        """
+        if not self.events:
+            return None
+        event_time, _, kind, server_id, data = heapq.heappop(self.events)
+        self.clock.advance(event_time)
+        return (event_time, kind, server_id, data)
+
+
+class SimulatedCommunication:
+    """
+    Replacement of `CommunicationSystem` on top of `SimulatedNetwork`.
+    """
+
+    def __init__(self, server_id: int, server_ids: list, network: SimulatedNetwork) -> None:
+        """
+        Constructor.
+
+        Args:
+            server_id (int): id of the server/replica
+            server_ids (list): ids of every server
+            network (SimulatedNetwork): simulated network
+        """
+        self.server_id = server_id
+        self.server_ids = server_ids
+        self.network = network
+        self.epoch = Value("i", 0)
+        self.duplicate_filter = DuplicateFilter()
+        self.decoded_messages = 0
+        self.duplicate_messages = 0
+
+
+    def send(self, message: bytes, server_id: int, message_type: MessageType | None = None) -> int:
+        """
+        Send `message` to server with `server_id`.
+
+        Args:
+            message (bytes): message to send
+            server_id (int): id of receiving server
+            message_type (MessageType | None, optional): type of the message
+
+        Returns:
+            int: size of the sent message
+        """
+        self.network.transmit(message, server_id)
+        return len(message)
+
+
+    def broadcast(self, message: bytes, message_type: MessageType | None = None) -> int:
+        """
+        Broadcast `message` to every server.
+
+        Args:
+            message (bytes): message to broadcast
+            message_type (MessageType | None, optional): type of the message
+
+        Returns:
+            int: size of the sent messages
+        """
+        for id in self.server_ids:
+            if id != self.server_id:
+                self.network.transmit(message, id)
+        return len(message) * (len(self.server_ids) - 1)
+
+
+    def receive(self, data: bytes) -> Message | None:
+        """
+        Convert received data to a message (same handling of `CommunicationSystem`).
+
+        Args:
+            data (bytes): received data
+
+        Returns:
+            Message | None: received message
+        """
+        if self.duplicate_filter.is_duplicate(data):
+            self.duplicate_messages += 1
+            return None
+        self.decoded_messages += 1
+        message = Message.from_bytes(data)
+        if message and message.get_type() == MessageType.ECHO:
+            return message.get_content()
+        return message
+
+
+    def flush_due(self) -> None:
+        """
+        Messages are sent immediately, so there is nothing to flush.
+        """
+
+
+    def get_epoch(self) -> Value:
+        """
+        Get current epoch of the protocol (updated by the protocol).
+
+        Returns:
+            Value: current epoch
+        """
+        return self.epoch
+
+
+    def get_message(self, timeout: float | None) -> Message:
+        """
+        Messages are delivered by the simulator, so there is nothing to wait for.
+
+        Raises:
+            TimeoutError: always
+        """
+        raise TimeoutError
+
+
+class Simulator:
+    """
+    Deterministic discrete-event simulator of Streamlet replicas.
+    """
+
+    def __init__(self, f: int, epoch_duration: float, latency: Callable[[random.Random], float],
+                 transaction_size: int = 256, transaction_number: int = 100, skew: float = 0.0, seed: int = 0,
+                 trace_capacity: int = 0, vote_mode: str = "all", vote_timeout: float | None = None,
+                 compact: bool = False, availability_quorum: int | None = None, transaction_filter: bool = False,
+                 resubmission_rate: float = 0.0, checkpoint_interval: int = 0,
+                 lagging: tuple[int, int] | None = None, bandwidth: float | None = None,
+                 adaptive_batch: float | None = None) -> None:
+        """
+        Constructor.
+
+        Args:
+            f (int): number of tolerated faults (3f+1 replicas are simulated)
+            epoch_duration (float): duration of each epoch (in virtual seconds)
+            latency (Callable[[random.Random], float]): returns the delay of a message
+            transaction_size (int, optional): transaction's size
+            transaction_number (int, optional): number of transactions per block
+            skew (float, optional): maximum offset between the replicas' clocks
+            seed (int, optional): seed of the simulation
+            trace_capacity (int, optional): capacity of each replica's event trace (0 disables tracing)
+            vote_mode (str, optional): vote mode of the replicas ("all" or "linear")
+            vote_timeout (float | None, optional): time before falling back to broadcasting votes (linear mode)
+            compact (bool, optional): if set to True, transactions are disseminated to the replicas'
+                mempools and proposals are compact
+            availability_quorum (int | None, optional): if set, replicas disseminate batches to the
+                availability layer, and batches are certified by this number of acknowledgements
+            transaction_filter (bool, optional): if set to True, replicas leave out (and do not vote for)
+                repeated transactions
+            resubmission_rate (float, optional): fraction of each batch made of earlier transactions
+            checkpoint_interval (int, optional): if set, replicas create a checkpoint every `checkpoint_interval`
+                epochs (and send it to replicas that are far behind)
+            lagging (tuple[int, int] | None, optional): id of a replica that is disconnected (its messages
+                are dropped) and the epoch when it reconnects
+            bandwidth (float | None, optional): bytes per second of each link
+            adaptive_batch (float | None, optional): if set, the number of transactions of each proposal is
+                adapted so blocks are notarized before this fraction of the epoch
+        """
+        self.f = f
+        self.lagging = lagging
+        # Virtual time when the lagging replica caught up (since it reconnected)
+        self.rejoin_time = None
+        self.epoch_duration = epoch_duration
+        self.network = SimulatedNetwork(latency, seed, bandwidth)
+        server_ids = list(range(3*f + 1))
+        keys = {id: SimulatedKey(id) for id in server_ids}
+        skew_random = random.Random(seed)
+        self.offsets = [skew_random.uniform(0, skew) for _ in server_ids]
+        self.replicas = []
+        self.timers = {}
+        for id in server_ids:
+            # Replicas share the registry, so each one's metrics are labeled with its id
+            registry.set_default_labels({"replica": id})
+            replica = Streamlet(
+                id,
+                SimulatedCommunication(id, server_ids, self.network),
+                keys[id],
+                keys,
+                epoch_duration,
+                f,
+                sys.maxsize,
+                sys.maxsize,
+                transaction_generator=SimulatedTransactionGenerator(transaction_size, transaction_number, self.network.clock,
+                                                                    resubmission_rate, seed + id, id),
+                clock=self.network.clock,
+                blockchain=Blockchain(write_blocks=False),
+                trace=EventTrace(trace_capacity),
+                vote_mode=vote_mode,
+                vote_timeout=vote_timeout,
+                mempool=Mempool() if compact else None,
+                availability=(AvailabilityLayer(id, keys[id], keys, availability_quorum)
+                              if availability_quorum is not None else None),
+                transaction_filter=TransactionFilter() if transaction_filter else None,
+                checkpoint_store=CheckpointStore(checkpoint_interval, asynchronous=False) if checkpoint_interval else None,
+                batch_controller=(BatchController(epoch_duration, transaction_size, transaction_number, adaptive_batch)
+                                  if adaptive_batch is not None else None)
+            )
+            self.replicas.append(replica)
+        registry.set_default_labels(None)
+
+
+    def run(self, epochs: int) -> None:
+        """
+        Run simulation for `epochs` epochs.
+
+        Args:
+            epochs (int): number of epochs to simulate
+        """
+        random.seed(0)
+        for replica, offset in zip(self.replicas, self.offsets):
+            replica.initialize()
+            self.network.schedule(offset, EPOCH, replica.server_id)
+        end_time = epochs * self.epoch_duration + max(self.offsets)
+        lagging_id, reconnect_time = (self.lagging[0], self.lagging[1] * self.epoch_duration) if self.lagging else (None, 0.0)
+        target_epoch = None
+        while (event := self.network.next_event()) is not None:
+            event_time, kind, server_id, data = event
+            if event_time >= end_time:
+                break
+            replica = self.replicas[server_id]
+            if lagging_id is not None and event_time >= reconnect_time:
+                # Finalized epoch of the other replicas when the lagging replica reconnected
+                if target_epoch is None:
+                    target_epoch = max(other.blockchain.get_finalized_epoch() for other in self.replicas
+                                       if other.server_id != lagging_id)
+                if (self.rejoin_time is None
+                        and self.replicas[lagging_id].blockchain.get_finalized_epoch() >= target_epoch):
+                    self.rejoin_time = event_time - reconnect_time
+            if (kind == DELIVER and event_time < reconnect_time
+                    and lagging_id in (server_id, Message.parse_header(data)[1])):
+                continue
+            if kind == EPOCH:
+                replica.advance_epoch()
+                if replica.epoch.value < epochs:
+                    self.network.schedule(event_time + self.epoch_duration, EPOCH, server_id)
+            elif kind == TIMER:
+                replica.check_vote_fallback()
+            else:
+                message = replica.communication.receive(data)
+                if message is None:
+                    continue
+                replica.process_message(message)
+            while (message := replica.get_early_message()) is not None:
+                replica.process_message(message)
+            # Wake up the replica when its vote must be broadcast (linear mode)
+            deadline = replica.get_vote_fallback_deadline()
+            if deadline is not None and self.timers.get(server_id) != deadline:
+                self.timers[server_id] = deadline
+                self.network.schedule(deadline, TIMER, server_id)
+
+
+    def check_safety(self) -> bool:
+        """
+        Check that every replica finalized the same block in each epoch.
+
+        Returns:
+            bool: True, if and only if there are no conflicting finalized blocks
+        """
+        finalized = {}
+        for replica in self.replicas:
+            for epoch, block in replica.blockchain.chain.items():
+                if block.get_status() == BlockStatus.FINALIZED:
+                    if finalized.setdefault(epoch, block.get_hash()) != block.get_hash():
+                        return False
+        return True
+
+
+    def get_statistics(self) -> dict:
+        """
+        Get statistics of the simulation.
+
+        Returns:
+            dict: statistics
+        """
+        finalized_blocks = []
+        finalized_transactions = []
+        for replica in self.replicas:
+            # The lagging replica does not keep the blocks before a restored checkpoint
+            if self.lagging and replica.server_id == self.lagging[0]:
+                continue
+            blocks = [block for block in replica.blockchain.chain.values()
+                      if block.get_status() == BlockStatus.FINALIZED and block.get_epoch() >= 1]
+            finalized_blocks.append(len(blocks))
+            finalized_transactions.append(replica.get_finalized_transactions())
+        # Transactions finalized more than once (by the first replica), while their blocks' transactions are kept
+        transaction_ids = [] if self.replicas[0].availability is not None else [Mempool.get_transaction_id(transaction)
+                           for block in self.replicas[0].blockchain.chain.values()
+                           if block.get_status() == BlockStatus.FINALIZED and block.get_epoch() >= 1
+                           for transaction in self.replicas[0].get_block_transactions(block)]
+        return {
+            "replicas": len(self.replicas),
+            "virtual_time": self.network.clock.time(),
+            "sent_messages": self.network.sent_messages,
+            "sent_bytes": self.network.sent_bytes,
+            "decoded_messages": sum(replica.communication.decoded_messages for replica in self.replicas),
+            "duplicate_messages": sum(replica.communication.duplicate_messages for replica in self.replicas),
+            "finalized_blocks": min(finalized_blocks),
+            "finalized_transactions": min(finalized_transactions),
+            "repeated_transactions": (len(transaction_ids) - len(set(transaction_ids))
+                                      if self.replicas[0].availability is None else None),
+            # Bytes sent by every replica per finalized transaction
+            "bytes_per_transaction": (self.network.sent_bytes / min(finalized_transactions)
+                                      if min(finalized_transactions) else None),
+            "safe": self.check_safety(),
+            "lagging_finalized_epoch": (self.replicas[self.lagging[0]].blockchain.get_finalized_epoch()
+                                        if self.lagging else None),
+            "rejoin_time": self.rejoin_time,
+            # Number of transactions of the next proposal chosen by the batch controller (of the first replica)
+            "batch_transactions": (self.replicas[0].batch_controller.get_transaction_number()
+                                   if self.replicas[0].batch_controller is not None else None),
+            "latency": {stage: histogram.get_summary() for stage, histogram in self.replicas[0].latencies.items()}
+        }
+
+
+def parse_latency(specification: str) -> Callable[[random.Random], float]:
+    """
+    Parse latency distribution, in the format `<distribution>:<parameters>`:
+    - constant:<delay>
+    - uniform:<min>:<max>
+    - normal:<mean>:<standard deviation>
+    - exponential:<mean>
+    - lognormal:<mu>:<sigma>
+
+    Args:
+        specification (str): latency distribution
+
+    Raises:
+        ValueError: distribution is unknown or parameters are invalid
+
+    Returns:
+        Callable[[random.Random], float]: function that returns a delay
+    """
+    distribution, *parameters = specification.split(":")
+    parameters = [float(parameter) for parameter in parameters]
+    if distribution == "constant" and len(parameters) == 1:
+        return lambda random_object: parameters[0]
+    if distribution == "uniform" and len(parameters) == 2:
+        return lambda random_object: random_object.uniform(*parameters)
+    if distribution == "normal" and len(parameters) == 2:
+        return lambda random_object: random_object.gauss(*parameters)
+    if distribution == "exponential" and len(parameters) == 1:
+        return lambda random_object: random_object.expovariate(1 / parameters[0])
+    if distribution == "lognormal" and len(parameters) == 2:
+        return lambda random_object: random_object.lognormvariate(*parameters)
+    raise ValueError(f"Invalid latency distribution: {specification}")
+
+
+def parse_quorum(specification: str | None, f: int) -> int | None:
+    """
+    Parse quorum of the availability layer (`f+1` or `2f+1`).
+
+    Args:
+        specification (str | None): quorum
+        f (int): number of tolerated faults
+
+    Raises:
+        ValueError: quorum is unknown
+
+    Returns:
+        int | None: number of acknowledgements (None, if `specification` is None)
+    """
+    if specification is None:
+        return None
+    if specification == "f+1":
+        return f + 1
+    if specification == "2f+1":
+        return 2*f + 1
+    raise ValueError(f"Invalid quorum: {specification}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discrete-event simulation of Streamlet.")
+    parser.add_argument("-f", "--faults", type=int, default=1, help="number of tolerated faults (n = 3f+1)")
+    parser.add_argument("-e", "--epochs", type=int, default=1000, help="number of epochs to simulate")
+    parser.add_argument("-d", "--epoch-duration", type=float, default=1.0, help="duration of each epoch (in seconds)")
+    parser.add_argument("-l", "--latency", type=parse_latency, default="uniform:0.01:0.1", help="latency distribution")
+    parser.add_argument("--skew", type=float, default=0.0, help="maximum offset between replicas' clocks")
+    parser.add_argument("--transaction-size", type=int, default=256, help="transaction's size")
+    parser.add_argument("--transaction-number", type=int, default=100, help="number of transactions per block")
+    parser.add_argument("--vote-mode", choices=("all", "linear"), default="all", help="vote collection mode")
+    parser.add_argument("--vote-timeout", type=float, help="time before broadcasting votes in linear mode")
+    parser.add_argument("--compact", action="store_true",
+                        help="disseminate transactions to mempools and send compact proposals")
+    parser.add_argument("--availability", choices=("f+1", "2f+1"),
+                        help="disseminate batches to the availability layer (certified by f+1 or 2f+1 servers)")
+    parser.add_argument("--transaction-filter", action="store_true",
+                        help="leave out (and do not vote for) repeated transactions")
+    parser.add_argument("--resubmit", type=float, default=0.0,
+                        help="fraction of each batch made of earlier transactions (resubmissions)")
+    parser.add_argument("--checkpoint-interval", type=int, default=0,
+                        help="create a checkpoint every CHECKPOINT_INTERVAL epochs (sent to replicas that are far behind)")
+    parser.add_argument("--lagging", type=lambda value: tuple(int(part) for part in value.split(":")),
+                        metavar="ID:EPOCH", help="disconnect replica ID until EPOCH (then it catches up)")
+    parser.add_argument("--bandwidth", type=float, help="bytes per second of each link")
+    parser.add_argument("--adaptive-batch", type=float, metavar="TARGET",
+                        help="adapt the number of transactions per block, so blocks are notarized before TARGET of the epoch")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulation")
+    parser.add_argument("--trace", metavar="PREFIX", help="dump each replica's event trace to PREFIX_<id>.bin")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log protocol events")
+    arguments = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if arguments.verbose else logging.WARNING)
+
+    simulator = Simulator(arguments.faults, arguments.epoch_duration, arguments.latency,
+                          arguments.transaction_size, arguments.transaction_number, arguments.skew, arguments.seed,
+                          1 << 20 if arguments.trace else 0, arguments.vote_mode, arguments.vote_timeout,
+                          arguments.compact, parse_quorum(arguments.availability, arguments.faults),
+                          arguments.transaction_filter, arguments.resubmit, arguments.checkpoint_interval,
+                          arguments.lagging, arguments.bandwidth, arguments.adaptive_batch)
+    start_time = time.perf_counter()
+    simulator.run(arguments.epochs)
+    elapsed_time = time.perf_counter() - start_time
+    statistics = simulator.get_statistics()
+    statistics["wall_time"] = elapsed_time
+    statistics["epochs_per_second"] = arguments.epochs / elapsed_time
+    for key, value in statistics.items():
+        print(f"{key}: {value}")
+    if arguments.trace:
+        for replica in simulator.replicas:
+            replica.trace.dump(f"{arguments.trace}_{replica.server_id}.bin")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import struct
+import logging
+from typing import Self
+
+# Epoch (uint32) and index (int32), followed by the data
+HEADER = struct.Struct(">Ii")
+
+class StateTransfer:
+    """
+    Class that represents a part of a state transfer (a checkpoint's
+    manifest or chunk, or finalized blocks), or a request for it, containing:
+    - Epoch number (of the checkpoint, or of the first requested block)
+    - Index (of the chunk - -1 requests the manifests - or, for blocks,
+        1 if more blocks follow the sent ones)
+    - Data in serialized form (None, for requests)
+    """
+
+    def __init__(self, epoch: int, index: int = 0, data: bytes | None = None) -> None:
+        """
+        Constructor.
+
+        Args:
+            epoch (int): epoch of the checkpoint or block
+            index (int, optional): index of the chunk
+            data (bytes | None, optional): manifest, chunk or blocks in serialized form
+        """
+        self.epoch = epoch
+        self.index = index
+        self.data = data
+
+
+    def get_epoch(self) -> int:
+        """
+        Get epoch of the checkpoint or block.
+
+        Returns:
+            int: epoch
+        """
+        return self.epoch
+
+
+    def get_index(self) -> int:
+        """
+        Get index of the chunk.
+
+        Returns:
+            int: index
+        """
+        return self.index
+
+
+    def get_data(self) -> bytes | None:
+        """
+        Get transferred data.
+
+        Returns:
+            bytes | None: data (None, for requests)
+        """
+        return self.data
+
+
+    def to_bytes(self) -> bytes:
+        """
+        Convert StateTransfer to bytes.
+
+        Returns:
+            bytes: bytes from StateTransfer object
+        """
+        return HEADER.pack(self.epoch, self.index) + (self.data or b"")
+
+
+    @staticmethod
+    def from_bytes(data_bytes: bytes) -> Self | None:
+        """
+        Convert bytes to StateTransfer.
+
+        Args:
+            data_bytes (bytes): StateTransfer in serialized form
+
+        Returns:
+            StateTransfer: StateTransfer object from bytes
+        """
+        try:
+            epoch, index = HEADER.unpack_from(data_bytes)
+        except struct.error:
+            logging.error("State transfer header cannot be unpacked.\n")
+            return None
+        return StateTransfer(epoch, index, bytes(data_bytes[HEADER.size:]) or None)
@@ -1,17 +1,57 @@
-import random
 import time
+import random
 import json
 import logging
-from multiprocessing import Value
 from typing import NoReturn
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
 from block import Block
 from blockstatus import BlockStatus
+from quorumcertificate import QuorumCertificate
 from message import Message
 from messagetype import MessageType
 from blockchain import Blockchain
 from communicationsystem import CommunicationSystem
 from transactiongenerator import TransactionGenerator
+from clock import Clock
+from histogram import Histogram
+from metrics import registry
+from eventtrace import EventTrace
+from eventtype import EventType
+from mempool import Mempool
+from availabilitylayer import AvailabilityLayer, DIGEST_SIZE
+from transactionbatch import TransactionBatch
+from transactionfilter import TransactionFilter
+from batchcontroller import BatchController
+from statetransfer import StateTransfer
+from checkpoint import (Checkpoint, CheckpointStore, CheckpointTransfer, Manifest, serialize_block, serialize_blocks,
+                        deserialize_blocks)
+
+SENT_EVENTS = {
+    MessageType.PROPOSE: EventType.PROPOSE_SENT,
+    MessageType.VOTE: EventType.VOTE_SENT,
+    MessageType.ECHO: EventType.ECHO_SENT,
+    MessageType.CERTIFICATE: EventType.CERTIFICATE_SENT,
+    MessageType.TRANSACTIONS: EventType.TRANSACTIONS_SENT,
+    MessageType.TRANSACTION_REQUEST: EventType.TRANSACTION_REQUEST_SENT,
+    MessageType.TRANSACTION_RESPONSE: EventType.TRANSACTION_RESPONSE_SENT,
+    MessageType.BATCH: EventType.BATCH_SENT,
+    MessageType.BATCH_ACK: EventType.BATCH_ACK_SENT,
+    MessageType.BATCH_CERTIFICATE: EventType.BATCH_CERTIFICATE_SENT,
+    MessageType.CHECKPOINT_REQUEST: EventType.CHECKPOINT_REQUEST_SENT,
+    MessageType.CHECKPOINT_MANIFEST: EventType.CHECKPOINT_MANIFEST_SENT,
+    MessageType.CHECKPOINT_CHUNK: EventType.CHECKPOINT_CHUNK_SENT,
+    MessageType.BLOCK_REQUEST: EventType.BLOCK_REQUEST_SENT,
+    MessageType.BLOCK_RESPONSE: EventType.BLOCK_RESPONSE_SENT,
+    MessageType.BATCH_REQUEST: EventType.BATCH_REQUEST_SENT,
+    MessageType.BATCH_RESPONSE: EventType.BATCH_RESPONSE_SENT
+}
+# Size of the blocks sent in a single response (more blocks are requested afterwards)
+MAX_TRANSFER_BYTES = 4 * 1024 * 1024
+# Epochs to wait for `f+1` equal manifests (before replaying every block), or for
+# chunks of a trusted manifest (before requesting the manifests again)
+CHECKPOINT_TIMEOUT = 2
+# Maximum number of proposals kept to be retried when their parents are notarized
+MAX_PENDING_PROPOSALS = 64
 
 class Streamlet:
     """
@@ -19,49 +59,295 @@ class Streamlet:
     """
 
     def __init__(self, server_id: int, communication: CommunicationSystem, private_key: RSAPrivateKey,
-                 servers_public_key: dict, epoch_duration: float, f: int, benchmark_threshold: int, benchmark_total: int) -> None:
+                 servers_public_key: dict, epoch_duration: float, f: int, benchmark_threshold: int, benchmark_total: int,
+                 transaction_generator: TransactionGenerator | None = None, clock: Clock | None = None,
+                 blockchain: Blockchain | None = None, trace: EventTrace | None = None, vote_mode: str = "all",
+                 vote_timeout: float | None = None, mempool: Mempool | None = None,
+                 availability: AvailabilityLayer | None = None,
+                 transaction_filter: TransactionFilter | None = None,
+                 checkpoint_store: CheckpointStore | None = None,
+                 batch_controller: BatchController | None = None) -> None:
         """
         Constructor.
+
+        The I/O used by the protocol can be injected (e.g. by the simulator):
+        - `communication` must provide `send` and `broadcast` (returning the
+            size of the sent messages), `get_message` and `get_epoch` (the
+            epoch shared with the communication system).
+        - `transaction_generator` must provide `get_transactions`,
+            `get_transaction_size` and `get_transaction_number`.
+        - `clock` must provide `time` and `perf_counter`.
+
+        Args:
+            server_id (int): id of the server/replica
+            communication (CommunicationSystem): communication system
+            private_key (RSAPrivateKey): server's private key
+            servers_public_key (dict): public keys of every server
+            epoch_duration (float): duration of each epoch (in seconds)
+            f (int): number of tolerated faults
+            benchmark_threshold (int): number of finalized transactions between benchmark measurements
+            benchmark_total (int): number of finalized transactions to end the benchmark
+            transaction_generator (TransactionGenerator | None, optional): source of clients' transactions
+            clock (Clock | None, optional): source of time
+            blockchain (Blockchain | None, optional): blockchain structure
+            trace (EventTrace | None, optional): recorder of protocol events
+            vote_mode (str, optional): "all" (votes are broadcast and echoed) or "linear"
+                (votes are sent to the epoch's leader, which broadcasts a certificate)
+            vote_timeout (float | None, optional): time after voting before falling back
+                to broadcasting the vote in linear mode (defaults to half of the epoch)
+            mempool (Mempool | None, optional): mempool of disseminated transactions (if set, proposals
+                are compact, i.e., they carry the ids of their transactions)
+            availability (AvailabilityLayer | None, optional): data-availability layer (if set, every server
+                disseminates batches, and blocks carry the digests of certified batches)
+            transaction_filter (TransactionFilter | None, optional): filter of finalized transactions (if set,
+                leaders leave out repeated transactions, and servers do not vote for blocks with them; without
+                a block store, the filter's matches may be false positives, so they are only left out by
+                leaders, and voters only check the chain being extended)
+            checkpoint_store (CheckpointStore | None, optional): store of checkpoints (if set, checkpoints are
+                created periodically and sent to servers that are far behind)
+            batch_controller (BatchController | None, optional): controller of the number of transactions of
+                each proposal (if set, it is adapted to the observed epoch timings)
         """
         self.server_id = server_id
         self.communication = communication
         self.private_key = private_key
         self.servers_public_key = servers_public_key
-        self.epoch = Value("i", 0)
+        self.epoch = communication.get_epoch()
         self.epoch_duration = epoch_duration
         self.epoch_leaders = [None]
         self.f = f
         self.num_replicas = 3*f + 1
-        self.blockchain = Blockchain()
+        self.blockchain = blockchain if blockchain is not None else Blockchain()
         self.random_object = random.Random()
         self.random_object.seed(0)
         self.early_messages = []
-        self.transaction_generator = TransactionGenerator()
+        # Proposals that did not extend the longest notarized chain when they were received (by epoch)
+        self.pending_proposals = {}
+        if vote_mode not in ("all", "linear"):
+            raise ValueError(f"Unknown vote mode: {vote_mode}")
+        self.vote_mode = vote_mode
+        self.vote_timeout = vote_timeout if vote_timeout is not None else epoch_duration / 2
+        self.vote_fallback = None
+        self.unverified_epochs = set()
+        if mempool is not None and availability is not None:
+            raise ValueError("Compact proposals and the availability layer cannot be used together")
+        self.mempool = mempool
+        self.availability = availability
+        # Finalized blocks whose batches are not stored, and their finalization time (by epoch):
+        # their transactions are accounted for once the batches are received
+        self.unavailable_blocks = {}
+        # Compact proposals waiting for their missing transactions (by epoch)
+        self.incomplete_proposals = {}
+        self.transaction_filter = transaction_filter
+        # Ids of the transactions of blocks that were not finalized yet (by epoch and hash)
+        self.transaction_ids = {}
+        # Ids of the transactions of the server's batches that were not finalized yet (availability layer)
+        self.batch_transaction_ids = {}
+        self.checkpoint_store = checkpoint_store
+        self.next_checkpoint_epoch = checkpoint_store.get_interval() if checkpoint_store is not None else None
+        # States of the leaders' random generator at the start of epochs where checkpoints may begin
+        self.leader_states = {}
+        self.checkpoint_transfer = None
+        # Epoch of the latest state transfer request, and finalized epoch when a checkpoint transfer was abandoned
+        self.transfer_epoch = None
+        self.abandoned_transfer = None
+        if availability is not None and batch_controller is not None:
+            raise ValueError("The batch controller cannot be used with the availability layer")
+        self.batch_controller = batch_controller
+        # Clients' transactions left over from the generator's batches (taken by the batch controller)
+        self.pending_transactions = []
+        self.transaction_generator = transaction_generator if transaction_generator is not None else TransactionGenerator()
+        self.clock = clock if clock is not None else Clock()
+        self.trace = trace if trace is not None else EventTrace()
         self.finalized_transactions = 0
         self.total_finalized_transactions = 0
         self.benchmark_threshold = benchmark_threshold
         self.benchmark_total = benchmark_total
         self.benchmark_time = []
+        # Transactions finalized in each measurement (between consecutive benchmark times)
+        self.benchmark_transactions = []
+        self.run_name = None
+        # Bytes of the protocol's messages (sent to every receiver)
+        self.sent_bytes = 0
+        self.latencies = {
+            "CREATION_TO_PROPOSAL": Histogram(),
+            "PROPOSAL_TO_NOTARIZATION": Histogram(),
+            "NOTARIZATION_TO_FINALIZATION": Histogram(),
+            "CREATION_TO_FINALIZATION": Histogram()
+        }
+        self.epoch_start_time = None
+        self.register_metrics()
+
+
+    def register_metrics(self) -> None:
+        """
+        Register protocol's metrics.
+        """
+        self.processed_messages = {
+            message_type: registry.counter("streamlet_messages_processed_total", "Messages processed by the protocol.",
+                                           {"type": message_type.name})
+            for message_type in MessageType
+        }
+        self.phase_time = {
+            phase: registry.summary("streamlet_epoch_phase_seconds",
+                                    "Time since the start of the epoch until the epoch's block is proposed/notarized, and time spent finalizing blocks.",
+                                    {"phase": phase})
+            for phase in ("proposal", "notarization", "finalization")
+        }
+        self.epoch_gauge = registry.gauge("streamlet_epoch", "Current epoch.")
+        self.notarized_height = registry.gauge("streamlet_notarized_height", "Highest epoch of a notarized block.")
+        self.finalized_height = registry.gauge("streamlet_finalized_height", "Highest epoch of a finalized block.")
+        self.forks = registry.counter("streamlet_forks_total", "Times that more than one longest notarized chain was observed.")
+        self.timeouts = registry.counter("streamlet_timeouts_total", "Epochs that ended without notarizing their block.")
+        self.fallback_votes = registry.counter("streamlet_fallback_votes_total",
+                                               "Votes broadcast because the leader's certificate was late (linear mode).")
+        self.duplicate_transactions = {
+            stage: registry.counter("streamlet_duplicate_transactions_total",
+                                    "Repeated transactions left out of proposals/batches or found in received proposals.",
+                                    {"stage": stage})
+            for stage in ("proposal", "validation")
+        }
+        self.missing_transactions = registry.counter("streamlet_missing_transactions_total",
+                                                     "Transactions of compact proposals requested to the proposer.")
+        self.state_transfers = {
+            kind: registry.counter("streamlet_state_transfers_total",
+                                   "Checkpoints/blocks requested to catch up with the other servers.", {"kind": kind})
+            for kind in ("checkpoint", "blocks")
+        }
+        self.transferred_blocks = registry.counter("streamlet_transferred_blocks_total",
+                                                   "Blocks notarized by certificates sent by other servers.")
+        self.notarized_chains = 1
+        registry.gauge_function("streamlet_early_messages", "Messages stored for posterior processing.",
+                                lambda: len(self.early_messages))
 
 
     def start_new_epoch(self) -> None:
         """
         Start a new epoch.
         """
-        start_time = time.time()
+        start_time = self.clock.time()
+        self.advance_epoch()
+        self.process_messages(start_time)
+
+
+    def advance_epoch(self) -> None:
+        """
+        Advance to the next epoch and propose a block, if the server
+        is the epoch's leader.
+        """
+        if self.epoch.value > 0:
+            block = self.blockchain.get_block(self.epoch.value)
+            if block is None or block.get_status() == BlockStatus.PROPOSED:
+                self.timeouts.inc()
+                self.trace.record(self.clock.time(), EventType.TIMEOUT, self.epoch.value)
+                # Epochs without proposals (e.g., the leader crashed) do not depend on the size of blocks
+                if block is not None and self.batch_controller is not None:
+                    self.batch_controller.observe_timeout(self.epoch.value)
+        self.epoch_start_time = self.clock.time()
         self.epoch.value += 1
+        self.epoch_gauge.set(self.epoch.value)
         epoch_leader = self.get_epoch_leader()
+        self.trace.record(self.epoch_start_time, EventType.EPOCH_START, self.epoch.value, epoch_leader)
+        # Servers take turns disseminating clients' transactions (a batch per epoch)
+        if self.mempool is not None and self.epoch.value % self.num_replicas == self.server_id:
+            self.disseminate_transactions()
+        # Every server disseminates a batch per epoch to the availability layer
+        if self.availability is not None:
+            self.disseminate_batch()
+            # Missing batches are requested again, until they are received
+            for block, _ in self.unavailable_blocks.values():
+                self.request_missing_batches(block)
         if epoch_leader == self.server_id:
             self.propose()
-        self.process_messages(start_time)
+
+
+    def disseminate_transactions(self) -> None:
+        """
+        Add a batch of clients' transactions to the mempool and broadcast it.
+        """
+        transactions = self.get_client_transactions()
+        self.add_to_mempool(transactions)
+        self.send_message(MessageType.TRANSACTIONS, TransactionBatch(self.epoch.value, transactions))
+
+
+    def add_to_mempool(self, transactions: list) -> None:
+        """
+        Add disseminated transactions to the mempool (leaving out finalized
+        transactions, so they do not fill proposals).
+
+        Args:
+            transactions (list): list of transactions
+        """
+        transaction_ids = self.mempool.add(transactions)
+        # Unconfirmed matches (without a block store) are left for the leader to leave out
+        if self.transaction_filter is not None and self.transaction_filter.is_exact():
+            duplicates = [transaction_id for transaction_id in transaction_ids
+                          if self.transaction_filter.is_duplicate(transaction_id)]
+            if duplicates:
+                self.duplicate_transactions["proposal"].inc(len(duplicates))
+                self.mempool.remove(duplicates)
+
+
+    def get_client_transactions(self) -> list:
+        """
+        Get clients' transactions of a proposal (or of a batch disseminated to
+        the mempools): a batch of the transaction generator, or the number of
+        transactions chosen by the batch controller.
+
+        Returns:
+            list: list of transactions
+        """
+        if self.batch_controller is None:
+            return self.transaction_generator.get_transactions()
+        transaction_number = self.batch_controller.get_transaction_number()
+        while len(self.pending_transactions) < transaction_number:
+            self.pending_transactions.extend(self.transaction_generator.get_transactions())
+        transactions = self.pending_transactions[:transaction_number]
+        del self.pending_transactions[:transaction_number]
+        return transactions
+
+
+    def disseminate_batch(self) -> None:
+        """
+        Broadcast a batch of clients' transactions, to be acknowledged by the
+        other servers (and certified once it has enough acknowledgements).
+        """
+        transactions = self.transaction_generator.get_transactions()
+        # Leave out transactions that were finalized or are in the server's batches
+        if self.transaction_filter is not None:
+            transaction_ids = [Mempool.get_transaction_id(transaction) for transaction in transactions]
+            duplicates = self.find_duplicate_transactions(transaction_ids, self.batch_transaction_ids)
+            if duplicates:
+                self.duplicate_transactions["proposal"].inc(len(duplicates))
+                transactions = [transaction for position, transaction in enumerate(transactions)
+                                if position not in duplicates]
+            for position, transaction_id in enumerate(transaction_ids):
+                if position not in duplicates:
+                    self.batch_transaction_ids[transaction_id] = None
+            while len(self.batch_transaction_ids) > self.availability.capacity * len(transaction_ids):
+                del self.batch_transaction_ids[next(iter(self.batch_transaction_ids))]
+        batch, certificate = self.availability.create_batch(self.epoch.value, transactions)
+        self.send_message(MessageType.BATCH, batch)
+        if certificate is not None:
+            self.send_message(MessageType.BATCH_CERTIFICATE, certificate)
 
 
     def propose(self) -> None:
         """
         Propose a new block to the blockchain.
         """
-        # Get clients' transactions
-        transactions = self.transaction_generator.get_transactions()
+        # Get clients' transactions (pending transactions of the mempool, for compact proposals)
+        if self.mempool is not None:
+            transaction_number = (self.batch_controller.get_transaction_number() if self.batch_controller is not None
+                                  else self.transaction_generator.get_transaction_number())
+            transaction_ids, transactions = self.mempool.get_pending(transaction_number)
+            self.mempool.mark_included(transaction_ids)
+        # Digests of certified batches, with the availability layer
+        elif self.availability is not None:
+            transactions = self.availability.get_pending()
+            self.availability.mark_included(transactions)
+        else:
+            transactions = self.get_client_transactions()
 
         # Get latest block(s) from the longest notarized chain(s)
         longest_notarized_blocks = self.blockchain.get_longest_notarized_blocks()
@@ -69,6 +355,19 @@ class Streamlet:
         # Choose one of the longest chains to extend from (if there are more than 1)
         longest_notarized_block = random.choice(longest_notarized_blocks)
 
+        # Leave out transactions that were finalized or are in the chain being extended
+        if self.transaction_filter is not None and self.availability is None:
+            if self.mempool is None:
+                transaction_ids = [Mempool.get_transaction_id(transaction) for transaction in transactions]
+            duplicates = self.find_duplicate_transactions(transaction_ids,
+                                                          self.get_chain_transaction_ids(longest_notarized_block))
+            if duplicates:
+                self.duplicate_transactions["proposal"].inc(len(duplicates))
+                transactions = [transaction for position, transaction in enumerate(transactions)
+                                if position not in duplicates]
+                transaction_ids = [transaction_id for position, transaction_id in enumerate(transaction_ids)
+                                   if position not in duplicates]
+
         # Create block proposal
         proposed_block = Block(
             self.epoch.value,
@@ -76,6 +375,12 @@ class Streamlet:
             longest_notarized_block.get_hash(),
             longest_notarized_block.get_epoch()
         )
+        # Attach proof that the parent block is notarized
+        proposed_block.set_parent_certificate(self.get_verified_certificate(longest_notarized_block))
+        if self.mempool is not None:
+            proposed_block.set_transaction_ids(transaction_ids, Mempool.get_batch_digest(transactions))
+        proposed_block.set_proposal_time(self.clock.time())
+        self.phase_time["proposal"].observe(proposed_block.get_proposal_time() - self.epoch_start_time)
 
         # Sign the block
         proposed_block.sign(self.private_key)
@@ -111,6 +416,11 @@ class Streamlet:
         # Check if proposed block extends from one of the longest notarized chains
         longest_notarized_block = proposed_block.extends_from(longest_notarized_blocks)
 
+        # Otherwise, the parent block may be notarized using its certificate
+        if longest_notarized_block is None and self.process_parent_certificate(proposed_block):
+            longest_notarized_blocks = self.blockchain.get_longest_notarized_blocks()
+            longest_notarized_block = proposed_block.extends_from(longest_notarized_blocks)
+
         if longest_notarized_block is None:
             raise ProtocolError
 
@@ -118,14 +428,32 @@ class Streamlet:
         valid_block = proposed_block.check_signature(leader_public_key)
         if not valid_block:
             raise ProtocolError
+
+        # Blocks with transactions that were finalized (or are in the extended chain) are not voted for
+        # (batches of the availability layer are checked before being acknowledged)
+        if self.transaction_filter is not None and self.availability is None:
+            duplicates = self.find_duplicate_transactions(self.get_transaction_ids(proposed_block),
+                                                          self.get_chain_transaction_ids(longest_notarized_block),
+                                                          validation=True)
+            if duplicates:
+                self.duplicate_transactions["validation"].inc(len(duplicates))
+                raise ProtocolError
         
         # Add leader's vote to the proposed block
         proposed_block.add_leader_vote(leader_id)
+        proposed_block.set_proposal_time(self.clock.time())
+        if proposed_block.get_epoch() == self.epoch.value:
+            self.phase_time["proposal"].observe(proposed_block.get_proposal_time() - self.epoch_start_time)
 
         # Add proposed block to server's blockchain
         proposed_block.set_parent_epoch(longest_notarized_block.get_epoch())
         self.blockchain.add_block(proposed_block)
-        logging.debug(f"New block proposal for epoch {proposed_block.get_epoch()} (proposer: {leader_id}).\n")
+        if self.mempool is not None and proposed_block.get_transaction_ids() is not None:
+            self.mempool.mark_included(proposed_block.get_transaction_ids())
+        if self.availability is not None:
+            self.availability.mark_included(proposed_block.get_transactions())
+        self.trace.record(proposed_block.get_proposal_time(), EventType.PROPOSAL_ACCEPTED, proposed_block.get_epoch(), leader_id)
+        logging.debug("New block proposal for epoch %d (proposer: %d).\n", proposed_block.get_epoch(), leader_id)
 
 
     def vote(self, proposed_block: Block) -> None:
@@ -136,29 +464,282 @@ class Streamlet:
         vote_block = proposed_block.create_vote(self.private_key)
         proposed_block.add_vote((self.server_id, vote_block))
 
+        # Send vote to the epoch's leader, falling back to every server if the
+        # leader does not send the block's certificate in time
+        if self.vote_mode == "linear":
+            self.send_message(MessageType.VOTE, vote_block, self.epoch_leaders[proposed_block.get_epoch()])
+            self.vote_fallback = (self.clock.time() + self.vote_timeout, vote_block, proposed_block)
+            return
+
         # Send vote to every server participating in the protocol
         self.send_message(MessageType.VOTE, vote_block)
 
 
-    def process_vote(self, vote: Block, block: Block, voter: int) -> None:
+    def get_vote_fallback_deadline(self) -> float | None:
+        """
+        Get time when the vote is broadcast, if the certificate of the
+        voted block is not received until then (linear mode).
+
+        Returns:
+            float | None: deadline (None, if there is no pending vote)
+        """
+        return self.vote_fallback[0] if self.vote_fallback is not None else None
+
+
+    def check_vote_fallback(self) -> None:
+        """
+        Broadcast the vote if its deadline passed and the voted block is not notarized.
+        """
+        if self.vote_fallback is None or self.clock.time() < self.vote_fallback[0]:
+            return
+        _, vote_block, proposed_block = self.vote_fallback
+        self.vote_fallback = None
+        if proposed_block.get_status() == BlockStatus.PROPOSED:
+            logging.info("Certificate for epoch %d was not received: broadcasting vote.\n", proposed_block.get_epoch())
+            self.fallback_votes.inc()
+            self.send_message(MessageType.VOTE, vote_block)
+
+
+    def process_vote(self, vote: Block, block: Block, voter: int, authenticated: bool = False) -> None:
         """
         Process vote.
 
+        Votes received directly from the voter over an authenticated link
+        are accepted without checking their signature, if they carry the
+        block's hash (otherwise, e.g., if the leader proposed conflicting
+        blocks, the signature is checked). The signatures are only checked
+        if the block's certificate is sent to other servers.
+
         Args:
             vote (Block): vote
             block (Block): block
             voter (int): ID of the server that voted
+            authenticated (bool, optional): if set to True, voter was authenticated by the link
         """
         # Add valid (and not repeated) votes to the block
-        if Block.check_vote(vote, block, self.servers_public_key[voter]):
+        authenticated = authenticated and vote.get_voted_hash() == block.get_hash()
+        if authenticated or Block.check_vote(vote, block, self.servers_public_key[voter]):
+            if authenticated:
+                self.unverified_epochs.add(block.get_epoch())
             block.add_vote((voter, vote))
-            logging.debug(f"New vote for block from epoch {block.get_epoch()} (voter: {voter}).\n")
+            self.trace.record(self.clock.time(), EventType.VOTE_ACCEPTED, block.get_epoch(), voter)
+            logging.debug("New vote for block from epoch %d (voter: %d).\n", block.get_epoch(), voter)
         
         # Notarize the block if there are sufficient valid votes (2f+1)
         if len(block.get_votes()) >= 2*self.f+1 and block.get_status() == BlockStatus.PROPOSED:
-            block.notarize()
-            logging.info(f"Block from epoch {block.get_epoch()} was notarized.\n")
-            self.finalize()
+            self.notarize(block, QuorumCertificate.create(block))
+            # Epoch's leader collects votes in linear mode
+            if self.vote_mode == "linear" and self.epoch_leaders[block.get_epoch()] == self.server_id:
+                certificate = self.get_verified_certificate(block)
+                if certificate is not None:
+                    self.send_message(MessageType.CERTIFICATE, certificate)
+            self.retry_pending_proposals()
+
+
+    def get_verified_certificate(self, block: Block) -> QuorumCertificate | None:
+        """
+        Get block's certificate to be sent to other servers. Signatures of
+        votes accepted by link authentication are checked first, and invalid
+        votes are removed from the certificate.
+
+        Args:
+            block (Block): notarized block
+
+        Returns:
+            QuorumCertificate | None: certificate (None, if there are not 2f+1 valid signatures)
+        """
+        certificate = block.get_certificate()
+        if certificate is None or block.get_epoch() not in self.unverified_epochs:
+            return certificate
+        self.unverified_epochs.discard(block.get_epoch())
+        if certificate.verify(self.servers_public_key, 2*self.f+1):
+            return certificate
+        votes = [(voter, vote) for voter, vote in block.get_votes()
+                 if Block.check_vote(vote, block, self.servers_public_key[voter])]
+        block.set_votes(votes)
+        certificate = QuorumCertificate.create(block) if len(votes) >= 2*self.f+1 else None
+        block.set_certificate(certificate)
+        return certificate
+
+
+    def process_certificate(self, certificate: QuorumCertificate, block: Block) -> None:
+        """
+        Process certificate (sent by the epoch's leader in linear mode).
+
+        Args:
+            certificate (QuorumCertificate): certificate
+            block (Block): block
+        """
+        if block.get_status() != BlockStatus.PROPOSED or block.get_hash() != certificate.get_block_hash():
+            return
+        if certificate.verify(self.servers_public_key, 2*self.f+1):
+            self.notarize(block, certificate)
+            self.retry_pending_proposals()
+
+
+    def process_parent_certificate(self, proposed_block: Block) -> bool:
+        """
+        Notarize the parent of `proposed_block` using the certificate
+        carried by the proposal, when the parent was not notarized yet.
+
+        Args:
+            proposed_block (Block): block proposal
+
+        Returns:
+            bool: True, if and only if the parent block was notarized
+        """
+        certificate = proposed_block.get_parent_certificate()
+        if certificate is None:
+            return False
+        parent_block = self.blockchain.get_block(certificate.get_epoch())
+        if (parent_block is None or parent_block.get_status() != BlockStatus.PROPOSED
+                or parent_block.get_hash() != certificate.get_block_hash()
+                or not parent_block.is_parent(proposed_block)):
+            return False
+        if not certificate.verify(self.servers_public_key, 2*self.f+1):
+            return False
+        logging.debug("Block from epoch %d was notarized by certificate.\n", parent_block.get_epoch())
+        self.notarize(parent_block, certificate)
+        return True
+
+
+    def notarize(self, block: Block, certificate: QuorumCertificate) -> None:
+        """
+        Notarize block and finalize the notarized chain (if possible).
+
+        Args:
+            block (Block): block with sufficient valid votes (2f+1)
+            certificate (QuorumCertificate): proof that the block is notarized
+        """
+        block.notarize()
+        block.set_certificate(certificate)
+        if self.vote_fallback is not None and self.vote_fallback[2] is block:
+            self.vote_fallback = None
+        block.set_notarization_time(self.clock.time())
+        if block.get_epoch() == self.epoch.value:
+            self.phase_time["notarization"].observe(block.get_notarization_time() - self.epoch_start_time)
+            if self.batch_controller is not None:
+                self.batch_controller.observe_notarization(block.get_epoch(),
+                                                           block.get_notarization_time() - self.epoch_start_time,
+                                                           len(block.get_transactions() or []))
+        if block.get_epoch() > self.notarized_height.get():
+            self.notarized_height.set(block.get_epoch())
+        self.trace.record(block.get_notarization_time(), EventType.NOTARIZED, block.get_epoch())
+        logging.info("Block from epoch %d was notarized.\n", block.get_epoch())
+        self.finalize()
+
+
+    def keep_pending_proposal(self, message: Message) -> None:
+        """
+        Keep proposal that did not extend the longest notarized chain, to
+        retry it when more blocks are notarized (repeated copies are dropped
+        by the receiver, so they would not bring it again). The oldest
+        proposals are dropped beyond MAX_PENDING_PROPOSALS.
+
+        Args:
+            message (Message): proposal
+        """
+        self.pending_proposals[message.get_content().get_epoch()] = message
+        while len(self.pending_proposals) > MAX_PENDING_PROPOSALS:
+            del self.pending_proposals[min(self.pending_proposals)]
+
+
+    def retry_pending_proposals(self) -> None:
+        """
+        Process (again) the proposals that did not extend the longest
+        notarized chain when they were received (oldest first), and vote for
+        the current epoch's proposal.
+        """
+        for epoch in sorted(self.pending_proposals):
+            # Processing a proposal may finalize blocks (and drop older proposals)
+            message = self.pending_proposals.get(epoch)
+            if message is None:
+                continue
+            block = message.get_content()
+            if self.blockchain.get_block(epoch) is not None:
+                self.pending_proposals.pop(epoch, None)
+                continue
+            try:
+                self.process_proposal(block, message.get_sender())
+            except ProtocolError:
+                continue
+            self.pending_proposals.pop(epoch, None)
+            if epoch == self.epoch.value:
+                self.vote(block)
+
+
+    def accept_proposal(self, message: Message) -> None:
+        """
+        Add proposal to the blockchain, and vote for it if it was received
+        in the current epoch.
+
+        Args:
+            message (Message): proposal
+        """
+        block = message.get_content()
+        try:
+            self.process_proposal(block, message.get_sender())
+        except ProtocolError:
+            # Repeated copies are dropped by the receiver, so keep the proposal
+            # to retry it when its parent gets notarized
+            self.keep_pending_proposal(message)
+            self.catch_up(block, message.get_sender())
+            return
+        if block.get_epoch() == self.epoch.value:
+            self.vote(block)
+
+
+    def complete_proposal(self, message: Message, received_transactions: dict | None = None) -> bool:
+        """
+        Rebuild the transactions of a compact proposal from the mempool (and
+        from the transactions received from the proposer). Otherwise, the
+        missing transactions are requested to the proposer, in a single
+        request, and the proposal waits for them.
+
+        Args:
+            message (Message): compact proposal
+            received_transactions (dict | None, optional): transactions sent by the proposer (by id)
+
+        Returns:
+            bool: True, if and only if the block's transactions were rebuilt
+        """
+        block = message.get_content()
+        transactions = []
+        missing_ids = []
+        for transaction_id in block.get_transaction_ids():
+            transaction = received_transactions.get(transaction_id) if received_transactions else None
+            if transaction is None and self.mempool is not None:
+                transaction = self.mempool.get(transaction_id)
+            if transaction is None:
+                missing_ids.append(transaction_id)
+            else:
+                transactions.append(transaction)
+        if not missing_ids:
+            if Mempool.get_batch_digest(transactions) == block.get_batch_digest():
+                block.set_transactions(transactions)
+                return True
+            # Short ids collided with other transactions, so every transaction is requested
+            missing_ids = block.get_transaction_ids()
+        # The proposer already sent its transactions
+        if received_transactions is not None:
+            return False
+        self.incomplete_proposals[block.get_epoch()] = message
+        self.missing_transactions.inc(len(missing_ids))
+        self.trace.record(self.clock.time(), EventType.TRANSACTIONS_MISSING, block.get_epoch(), message.get_sender(),
+                          len(missing_ids))
+        self.send_message(MessageType.TRANSACTION_REQUEST, TransactionBatch(block.get_epoch(), None, missing_ids),
+                          message.get_sender())
+        return False
+
+
+    def retry_incomplete_proposals(self) -> None:
+        """
+        Process proposals that were waiting for the certificates of their batches.
+        """
+        for epoch, message in list(self.incomplete_proposals.items()):
+            if self.availability.is_available(message.get_content().get_transactions()):
+                del self.incomplete_proposals[epoch]
+                self.accept_proposal(message)
 
 
     def finalize(self) -> None:
@@ -167,21 +748,467 @@ class Streamlet:
         after observing three adjacent blocks with consecutive epochs.
         """
         if self.epoch.value > 2:
-            finalized_blocks = self.blockchain.finalize()
+            start_time = self.clock.perf_counter()
+            finalized_blocks = self.blockchain.finalize(self.get_block_transactions)
+            self.phase_time["finalization"].observe(self.clock.perf_counter() - start_time)
+            notarized_chains = len(self.blockchain.longest_notarized_chains)
+            if notarized_chains > 1 and self.notarized_chains == 1:
+                self.forks.inc()
+            self.notarized_chains = notarized_chains
             if finalized_blocks:
-                logging.info(f"Blocks from epochs {', '.join([str(block.get_epoch()) for block in finalized_blocks])} were finalized.\n")
+                self.finalized_height.set(finalized_blocks[-1].get_epoch())
+                # Certificates of finalized blocks are no longer sent
+                self.unverified_epochs = {epoch for epoch in self.unverified_epochs
+                                          if epoch > finalized_blocks[-1].get_epoch()}
+                self.incomplete_proposals = {epoch: message for epoch, message in self.incomplete_proposals.items()
+                                             if epoch > finalized_blocks[-1].get_epoch()}
+                self.pending_proposals = {epoch: message for epoch, message in self.pending_proposals.items()
+                                          if epoch > finalized_blocks[-1].get_epoch()}
+                self.transaction_ids = {key: transaction_ids for key, transaction_ids in self.transaction_ids.items()
+                                        if key[0] > finalized_blocks[-1].get_epoch()}
+                finalization_time = self.clock.time()
+                logging.info("Blocks from epochs %d to %d were finalized.\n",
+                             finalized_blocks[0].get_epoch(), finalized_blocks[-1].get_epoch())
                 for block in finalized_blocks:
+                    self.trace.record(finalization_time, EventType.FINALIZED, block.get_epoch())
+                    if self.mempool is not None and block.get_transaction_ids() is not None:
+                        self.mempool.remove(block.get_transaction_ids())
                     if block.get_epoch() >= 1:
-                        self.finalized_transactions += len(block.get_transactions())
-                if self.finalized_transactions >= self.benchmark_threshold:
-                    elapsed_time = time.perf_counter() - self.benchmark_time[0]
-                    self.benchmark_time.append(elapsed_time)
-                    self.total_finalized_transactions += self.finalized_transactions
-                    self.finalized_transactions = 0
+                        if self.availability is not None and self.availability.get_missing(block.get_transactions()):
+                            logging.warning("Batches of the block from epoch %d are missing: they were requested.\n",
+                                            block.get_epoch())
+                            self.unavailable_blocks[block.get_epoch()] = (block, finalization_time)
+                            self.request_missing_batches(block)
+                        else:
+                            self.account_finalized_block(block, finalization_time)
+                    if self.checkpoint_store is not None and block.get_epoch() >= self.next_checkpoint_epoch:
+                        self.create_checkpoint(block)
+                if self.checkpoint_store is not None:
+                    self.leader_states = {epoch: state for epoch, state in self.leader_states.items()
+                                          if epoch >= self.next_checkpoint_epoch}
+                self.measure_throughput()
                 # Execute clients' transactions
                 # execute_transactions(finalized_blocks)
 
 
+    def account_finalized_block(self, block: Block, finalization_time: float) -> None:
+        """
+        Account for the transactions of a finalized block: count them, record
+        their latencies and add them to the transaction filter.
+
+        Args:
+            block (Block): finalized block (with every transaction available)
+            finalization_time (float): time when block was finalized
+        """
+        transactions = self.get_block_transactions(block)
+        self.finalized_transactions += len(transactions)
+        self.record_latencies(block, transactions, finalization_time)
+        if self.transaction_filter is not None:
+            transaction_ids = self.get_transaction_ids(block)
+            self.transaction_filter.add(transaction_ids)
+            for transaction_id in transaction_ids:
+                self.batch_transaction_ids.pop(transaction_id, None)
+        if self.availability is not None:
+            self.availability.remove(block.get_transactions())
+
+
+    def measure_throughput(self) -> None:
+        """
+        Record a throughput measurement, once `benchmark_threshold` transactions are finalized.
+        """
+        if self.finalized_transactions >= self.benchmark_threshold:
+            elapsed_time = self.clock.perf_counter() - self.benchmark_time[0]
+            self.benchmark_time.append(elapsed_time)
+            self.benchmark_transactions.append(self.finalized_transactions)
+            self.total_finalized_transactions += self.finalized_transactions
+            self.finalized_transactions = 0
+
+
+    def request_missing_batches(self, block: Block) -> None:
+        """
+        Request the batches of a finalized block that are not stored from the
+        servers that acknowledged them (or from every server, if their
+        certificates are not known).
+
+        Args:
+            block (Block): finalized block
+        """
+        missing = self.availability.get_missing(block.get_transactions())
+        if not missing:
+            return
+        certifiers = set()
+        for digest in missing:
+            certifiers.update(self.availability.get_certifiers(digest))
+        if not certifiers:
+            certifiers = set(range(self.num_replicas))
+        request = StateTransfer(block.get_epoch(), 0, b"".join(bytes.fromhex(digest) for digest in missing))
+        for server_id in sorted(certifiers - {self.server_id}):
+            self.send_message(MessageType.BATCH_REQUEST, request, server_id)
+
+
+    def complete_unavailable_blocks(self) -> None:
+        """
+        Account for the finalized blocks whose batches were all received
+        (and store them again, with their transactions).
+        """
+        for epoch in sorted(self.unavailable_blocks):
+            block, finalization_time = self.unavailable_blocks[epoch]
+            if self.availability.get_transactions(block.get_transactions()) is None:
+                continue
+            del self.unavailable_blocks[epoch]
+            logging.info("Batches of the block from epoch %d were received.\n", epoch)
+            # Ids may have been cached without the missing batches
+            self.transaction_ids.pop((block.get_epoch(), block.get_hash()), None)
+            if self.blockchain.block_store:
+                self.blockchain.block_store.add_blocks([block], self.get_block_transactions)
+            self.account_finalized_block(block, finalization_time)
+        self.measure_throughput()
+
+
+    def get_block_transactions(self, block: Block) -> list:
+        """
+        Get transactions of a block (from the availability layer, if the
+        block carries digests of batches).
+
+        Args:
+            block (Block): block
+
+        Returns:
+            list: list of transactions (None, if some batch of the block is not stored)
+        """
+        if self.availability is not None:
+            return self.availability.get_transactions(block.get_transactions())
+        return block.get_transactions()
+
+
+    def get_transaction_ids(self, block: Block) -> list[bytes]:
+        """
+        Get ids of the transactions of a block (cached until the block is finalized).
+
+        Args:
+            block (Block): block
+
+        Returns:
+            list[bytes]: ids of the transactions
+        """
+        key = (block.get_epoch(), block.get_hash())
+        transaction_ids = self.transaction_ids.get(key)
+        if transaction_ids is None:
+            transaction_ids = block.get_transaction_ids()
+            if transaction_ids is None:
+                transaction_ids = [Mempool.get_transaction_id(transaction)
+                                   for transaction in self.get_block_transactions(block) or ()]
+            self.transaction_ids[key] = transaction_ids
+        return transaction_ids
+
+
+    def get_chain_transaction_ids(self, block: Block) -> set[bytes]:
+        """
+        Get ids of the transactions of the chain ending at `block` that were not finalized yet.
+
+        Args:
+            block (Block): last block of the chain
+
+        Returns:
+            set[bytes]: ids of the transactions
+        """
+        transaction_ids = set()
+        while block is not None and block.get_epoch() > 0 and block.get_status() != BlockStatus.FINALIZED:
+            transaction_ids.update(self.get_transaction_ids(block))
+            block = self.blockchain.get_block(block.get_parent_epoch())
+        return transaction_ids
+
+
+    def find_duplicate_transactions(self, transaction_ids: list[bytes], known_transaction_ids,
+                                    validation: bool = False) -> set[int]:
+        """
+        Find transactions that are repeated: finalized (see `TransactionFilter`),
+        in `known_transaction_ids` (e.g., of blocks that were not finalized yet),
+        or earlier in `transaction_ids`.
+
+        Args:
+            transaction_ids (list[bytes]): ids of the transactions
+            known_transaction_ids (set | dict): ids of transactions that were not finalized yet
+            validation (bool, optional): whether other servers' transactions are being validated (the
+                filter is then only used if its matches are confirmed, see `TransactionFilter.is_exact`)
+
+        Returns:
+            set[int]: positions of the repeated transactions
+        """
+        duplicates = set()
+        seen_transaction_ids = set()
+        use_filter = not validation or self.transaction_filter.is_exact()
+        for position, transaction_id in enumerate(transaction_ids):
+            if (transaction_id in known_transaction_ids or transaction_id in seen_transaction_ids
+                    or (use_filter and self.transaction_filter.is_duplicate(transaction_id))):
+                duplicates.add(position)
+            seen_transaction_ids.add(transaction_id)
+        return duplicates
+
+
+    def create_checkpoint(self, block: Block) -> None:
+        """
+        Create a checkpoint of a finalized block (saved in the background).
+        Every correct server creates the same checkpoint: the first finalized
+        block of each interval is the anchor, and the executed state is the
+        state after finalizing it.
+
+        Args:
+            block (Block): finalized block (anchor)
+        """
+        interval = self.checkpoint_store.get_interval()
+        leader_epoch = block.get_epoch() // interval * interval
+        self.next_checkpoint_epoch = leader_epoch + interval
+        leader_state = self.leader_states.get(leader_epoch)
+        if leader_state is None:
+            logging.warning("Leader schedule of epoch %d is not known: checkpoint was not created.\n", leader_epoch)
+            return
+        filter_state = self.transaction_filter.get_state() if self.transaction_filter is not None else None
+        self.checkpoint_store.save(Checkpoint(block, leader_epoch, leader_state, filter_state))
+
+
+    def restore_checkpoint(self, checkpoint: Checkpoint) -> bool:
+        """
+        Restore the state of a checkpoint: the blockchain up to the anchor
+        is replaced by the anchor, and the leader schedule and the executed
+        state are restored, so only the blocks after the anchor are replayed.
+
+        Args:
+            checkpoint (Checkpoint): checkpoint
+
+        Returns:
+            bool: True, if and only if the checkpoint was restored (it is newer than the finalized blocks and valid)
+        """
+        anchor = checkpoint.get_anchor()
+        if anchor.get_epoch() <= self.blockchain.get_finalized_epoch():
+            return False
+        try:
+            random.Random().setstate(checkpoint.get_leader_state())
+            if self.transaction_filter is not None and checkpoint.get_filter_state() is not None:
+                self.transaction_filter.set_state(checkpoint.get_filter_state())
+        except (ValueError, TypeError) as error:
+            logging.error("Checkpoint of epoch %d cannot be restored: %s\n", anchor.get_epoch(), error)
+            return False
+        self.blockchain.set_anchor(anchor)
+        if self.epoch.value < anchor.get_epoch():
+            self.epoch.value = anchor.get_epoch()
+            self.epoch_gauge.set(self.epoch.value)
+        # Choose the leaders from the checkpoint's epoch up to the current epoch
+        leader_epoch = checkpoint.get_leader_epoch()
+        del self.epoch_leaders[leader_epoch:]
+        self.epoch_leaders.extend([None] * (leader_epoch - len(self.epoch_leaders)))
+        self.random_object.setstate(checkpoint.get_leader_state())
+        while len(self.epoch_leaders) <= self.epoch.value:
+            self.get_epoch_leader()
+        self.unverified_epochs = {epoch for epoch in self.unverified_epochs if epoch > anchor.get_epoch()}
+        self.incomplete_proposals = {epoch: message for epoch, message in self.incomplete_proposals.items()
+                                     if epoch > anchor.get_epoch()}
+        self.transaction_ids = {key: transaction_ids for key, transaction_ids in self.transaction_ids.items()
+                                if key[0] > anchor.get_epoch()}
+        self.finalized_height.set(anchor.get_epoch())
+        if anchor.get_epoch() > self.notarized_height.get():
+            self.notarized_height.set(anchor.get_epoch())
+        # The checkpoint is kept, to be sent to other servers
+        if self.checkpoint_store is not None:
+            interval = self.checkpoint_store.get_interval()
+            self.next_checkpoint_epoch = (anchor.get_epoch() // interval + 1) * interval
+            self.leader_states = {epoch: state for epoch, state in self.leader_states.items()
+                                  if epoch >= self.next_checkpoint_epoch}
+            self.checkpoint_store.save(checkpoint)
+        self.trace.record(self.clock.time(), EventType.STATE_RESTORED, anchor.get_epoch())
+        logging.info("Checkpoint of epoch %d was restored.\n", anchor.get_epoch())
+        return True
+
+
+    def catch_up(self, proposed_block: Block, leader_id: int) -> None:
+        """
+        Request the state that the server is missing, when a proposal
+        extends a block that the server does not have (e.g., after being
+        disconnected). If the server is more than a checkpoint interval
+        behind, a checkpoint is requested to every server, followed by the
+        blocks after its anchor; otherwise, the blocks after the last
+        finalized block are requested to the proposal's leader.
+
+        Args:
+            proposed_block (Block): proposal that was not accepted
+            leader_id (int): leader of the epoch when block was proposed
+        """
+        certificate = proposed_block.get_parent_certificate()
+        finalized_epoch = self.blockchain.get_finalized_epoch()
+        if (certificate is None or certificate.get_epoch() <= finalized_epoch
+                or self.blockchain.get_block(certificate.get_epoch()) is not None):
+            return
+        # At most one request per epoch (requests that were not answered are repeated in later epochs)
+        if self.transfer_epoch == self.epoch.value:
+            return
+        self.transfer_epoch = self.epoch.value
+        transfer = self.checkpoint_transfer
+        if transfer is not None:
+            # Request missing chunks from other servers (or newer manifests, if chunks stopped arriving)
+            if transfer.get_manifest() is not None:
+                if self.epoch.value - transfer.get_progress_epoch() >= CHECKPOINT_TIMEOUT:
+                    self.restart_checkpoint_transfer()
+                    return
+                transfer.retry()
+                self.request_chunks()
+                return
+            if self.epoch.value - transfer.get_start_epoch() < CHECKPOINT_TIMEOUT:
+                return
+            # Manifests do not match (e.g., servers are creating a new checkpoint), so every block is replayed
+            self.checkpoint_transfer = None
+            self.abandoned_transfer = finalized_epoch
+        elif (self.checkpoint_store is not None and self.abandoned_transfer != finalized_epoch
+              and certificate.get_epoch() - finalized_epoch > self.checkpoint_store.get_interval()):
+            self.restart_checkpoint_transfer()
+            return
+        self.state_transfers["blocks"].inc()
+        self.send_message(MessageType.BLOCK_REQUEST, StateTransfer(finalized_epoch + 1), leader_id)
+
+
+    def restart_checkpoint_transfer(self) -> None:
+        """
+        Request the manifests of the checkpoints newer than the last
+        finalized block to every server (abandoning the checkpoint being
+        transferred, if any, e.g., because its servers no longer keep it).
+        """
+        self.state_transfers["checkpoint"].inc()
+        self.checkpoint_transfer = CheckpointTransfer(self.f + 1, self.epoch.value)
+        self.send_message(MessageType.CHECKPOINT_REQUEST, StateTransfer(self.blockchain.get_finalized_epoch(), -1))
+
+
+    def request_chunks(self) -> None:
+        """
+        Request chunks of the checkpoint being transferred (in parallel, from the servers that sent its manifest).
+        """
+        epoch = self.checkpoint_transfer.get_manifest().get_epoch()
+        for index, server_id in self.checkpoint_transfer.get_requests():
+            self.send_message(MessageType.CHECKPOINT_REQUEST, StateTransfer(epoch, index), server_id)
+
+
+    def complete_checkpoint_transfer(self) -> None:
+        """
+        Restore the transferred checkpoint, and request the blocks after its anchor.
+        """
+        transfer = self.checkpoint_transfer
+        self.checkpoint_transfer = None
+        checkpoint = transfer.get_checkpoint()
+        if checkpoint is None or not self.restore_checkpoint(checkpoint):
+            return
+        self.send_message(MessageType.BLOCK_REQUEST, StateTransfer(checkpoint.get_epoch() + 1),
+                          transfer.get_servers()[0])
+
+
+    def send_blocks(self, first_epoch: int, server_id: int) -> None:
+        """
+        Send notarized blocks from `first_epoch` (and their certificates) to
+        a server that is catching up, up to `MAX_TRANSFER_BYTES` (a larger
+        block is sent alone), so responses fit in the transport's frames.
+
+        Args:
+            first_epoch (int): epoch of the first requested block
+            server_id (int): id of the requesting server
+        """
+        blocks = []
+        size = 0
+        more = False
+        for epoch in range(max(first_epoch, 1), self.epoch.value + 1):
+            block = self.blockchain.get_block(epoch)
+            if block is None or block.get_status() == BlockStatus.PROPOSED:
+                continue
+            certificate = self.get_verified_certificate(block)
+            if certificate is None:
+                continue
+            serialized_block = serialize_block(block, certificate)
+            if blocks and size + len(serialized_block) > MAX_TRANSFER_BYTES:
+                more = True
+                break
+            blocks.append(serialized_block)
+            size += len(serialized_block)
+        if blocks:
+            self.send_message(MessageType.BLOCK_RESPONSE, StateTransfer(first_epoch, int(more), serialize_blocks(blocks)),
+                              server_id)
+
+
+    def process_blocks(self, response: StateTransfer, sender: int) -> None:
+        """
+        Add blocks sent by another server (in order), notarizing each block
+        with its certificate (blocks are finalized as usual). Blocks must
+        extend blocks that the server has, so the remaining blocks are
+        ignored when the chain is broken.
+
+        Args:
+            response (StateTransfer): blocks and their certificates
+            sender (int): id of the server that sent the blocks
+        """
+        blocks = deserialize_blocks(response.get_data()) if response.get_data() else None
+        if not blocks:
+            return
+        added_blocks = 0
+        for block, certificate in blocks:
+            epoch = block.get_epoch()
+            existing_block = self.blockchain.get_block(epoch)
+            if (certificate is None or epoch <= self.blockchain.get_finalized_epoch()
+                    or (existing_block is not None and existing_block.get_status() != BlockStatus.PROPOSED)):
+                continue
+            parent_block = self.blockchain.get_block(block.get_parent_epoch())
+            if (parent_block is None or parent_block.get_status() == BlockStatus.PROPOSED
+                    or not parent_block.is_parent(block)):
+                break
+            if (certificate.get_epoch() != epoch or certificate.get_block_hash() != block.get_hash()
+                    or not certificate.verify(self.servers_public_key, 2*self.f+1)):
+                break
+            # Proposals that were received keep their votes and times
+            if existing_block is not None and existing_block.get_hash() == block.get_hash():
+                block = existing_block
+            else:
+                self.blockchain.add_block(block)
+            self.notarize(block, certificate)
+            added_blocks += 1
+        self.transferred_blocks.inc(added_blocks)
+        # Request the next blocks, if the response was limited
+        if added_blocks and response.get_index():
+            self.send_message(MessageType.BLOCK_REQUEST, StateTransfer(blocks[-1][0].get_epoch() + 1), sender)
+        self.retry_pending_proposals()
+
+
+    def record_latencies(self, block: Block, transactions: list, finalization_time: float) -> None:
+        """
+        Record latencies of the transactions of a finalized block:
+        creation→proposal, proposal→notarization and notarization→finalization.
+
+        Transactions created at the same time (i.e., in the same batch) are
+        recorded with a single update of each histogram.
+
+        Args:
+            block (Block): finalized block
+            transactions (list): transactions of the block
+            finalization_time (float): time when block was finalized
+        """
+        proposal_time = block.get_proposal_time()
+        notarization_time = block.get_notarization_time()
+        if not transactions or proposal_time is None or notarization_time is None:
+            return
+        count = len(transactions)
+        self.latencies["PROPOSAL_TO_NOTARIZATION"].record(notarization_time - proposal_time, count)
+        self.latencies["NOTARIZATION_TO_FINALIZATION"].record(finalization_time - notarization_time, count)
+        try:
+            # Single batch (common case)
+            if transactions[0][3] == transactions[-1][3]:
+                batches = [(transactions[0][3], count)]
+            else:
+                batches = []
+                for transaction in transactions:
+                    if batches and batches[-1][0] == transaction[3]:
+                        batches[-1][1] += 1
+                    else:
+                        batches.append([transaction[3], 1])
+            for creation_time, batch_count in batches:
+                self.latencies["CREATION_TO_PROPOSAL"].record(proposal_time - creation_time, batch_count)
+                self.latencies["CREATION_TO_FINALIZATION"].record(finalization_time - creation_time, batch_count)
+        except (IndexError, TypeError):
+            logging.debug("Transactions do not contain their creation time.\n")
+
+
     def get_epoch_leader(self) -> int:
         """
         Get leader's id of the current epoch.
@@ -189,24 +1216,55 @@ class Streamlet:
         Returns:
             int: leader's id
         """
+        # Checkpoints begin the leader schedule at the start of an epoch multiple of the interval
+        epoch = len(self.epoch_leaders)
+        if self.checkpoint_store is not None and epoch % self.checkpoint_store.get_interval() == 0:
+            self.leader_states[epoch] = self.random_object.getstate()
         leader = self.random_object.randrange(0, self.num_replicas)
         self.epoch_leaders.append(leader)
         return leader
 
 
-    def start(self) -> NoReturn:
+    def initialize(self) -> None:
         """
-        Start Streamlet.
+        Initialize the blockchain (genesis block) and the benchmark's start time.
         """
         self.blockchain.add_genesis_block()
-        self.benchmark_time.append(time.perf_counter())
+        self.benchmark_time.append(self.clock.perf_counter())
+        # Results of every server and run are kept (instead of overwriting each other)
+        self.run_name = (f"{self.transaction_generator.get_transaction_size()}_"
+                         f"{self.transaction_generator.get_transaction_number()}_{self.server_id}_"
+                         f"{time.strftime('%Y%m%d%H%M%S', time.localtime(self.clock.time()))}")
+
+
+    def get_run_name(self) -> str | None:
+        """
+        Get name of the run (transaction size and number, server's ID and
+        start time), used to name its result files.
+
+        Returns:
+            str | None: name of the run (None, if the protocol was not initialized)
+        """
+        return self.run_name
+
+
+    def start(self, start_time: float | None = None) -> NoReturn:
+        """
+        Start Streamlet.
+
+        Args:
+            start_time (float | None, optional): time when the first epoch starts (agreed by every server)
+        """
+        self.initialize()
+        if start_time is not None:
+            time.sleep(max(start_time - self.clock.time(), 0))
         while self.total_finalized_transactions < self.benchmark_total:
             try:
                 self.start_new_epoch()
             except TimeoutError:
                 logging.info("Timeout triggered: epoch reached its end.\n")
             finally:
-                logging.info(f"Blockchain - {self.blockchain}\n")
+                logging.debug("Blockchain - %s\n", self.blockchain)
         self.export_benchmark_results()
 
 
@@ -220,6 +1278,7 @@ class Streamlet:
         - Ignores repeated proposals and votes.
         - Adds valid votes to blocks from previous epochs.
         - Adds valid proposals from previous epochs to the blockchain.
+        - Broadcasts the vote when the certificate is late (linear mode).
 
         Args:
             start_time (float): time when current epoch started
@@ -228,47 +1287,203 @@ class Streamlet:
             TimeoutError: error is raised when epoch duration is exceeded
         """
         while True:
-            remaining_time = self.epoch_duration - (time.time() - start_time)
+            remaining_time = self.epoch_duration - (self.clock.time() - start_time)
             if remaining_time <= 0:
                 raise TimeoutError
             message = self.get_early_message()
             if message is None:
-                message = self.communication.get_message(remaining_time)
-            sender = message.get_sender()
-            block = message.get_content()
-            block_epoch = block.get_epoch()
-            
-            # Store messages that arrive early for posterior processing (when time is adequate)
-            if block_epoch > self.epoch.value:
-                self.early_messages.append(message)
-                continue
-            logging.debug(f"Message type - {message.get_type()}\n")
-
-            # Add new valid proposed blocks to the blockchain
-            # Vote for the block, if block was received in the current epoch
-            if message.get_type() == MessageType.PROPOSE:
-                # Ensure that proposer's ID matches the leader's ID and proposal is new
-                if (block_epoch <= self.epoch.value and sender == self.epoch_leaders[block_epoch]
-                        and self.blockchain.get_block(block_epoch) is None):
-                    # Echo received proposal
-                    self.send_message(MessageType.ECHO, message)
-                    try:
-                        self.process_proposal(block, sender)
-                    except ProtocolError:
-                        continue
-                    if block_epoch == self.epoch.value:
-                        self.vote(block)
-            
-            # Add votes to blocks (from current and past epochs)
-            elif message.get_type() == MessageType.VOTE:
-                # Get block for the vote's epoch from server's blockchain
-                proposed_block = self.blockchain.get_block(block_epoch)
-                if proposed_block and sender not in [vote[0] for vote in proposed_block.get_votes()]:
-                    # Echo received vote
+                self.check_vote_fallback()
+                deadline = self.get_vote_fallback_deadline()
+                timeout = remaining_time if deadline is None else min(remaining_time, deadline - self.clock.time())
+                try:
+                    message = self.communication.get_message(max(timeout, 0))
+                except TimeoutError:
+                    continue
+            self.process_message(message)
+            # Frames queued while processing stored messages are not held for longer than the coalescing window
+            self.communication.flush_due()
+
+
+    def process_message(self, message: Message) -> None:
+        """
+        Process a single received message (see `process_messages`).
+
+        Args:
+            message (Message): received message
+        """
+        self.processed_messages[message.get_type()].inc()
+        sender = message.get_sender()
+        block = message.get_content()
+        block_epoch = block.get_epoch()
+        
+        # Store messages that arrive early for posterior processing (when time is adequate)
+        if block_epoch > self.epoch.value:
+            self.early_messages.append(message)
+            self.trace.record(self.clock.time(), EventType.EARLY_MESSAGE, block_epoch, sender, message.get_size())
+            return
+        logging.debug("Message type - %s\n", message.get_type())
+
+        # Add new valid proposed blocks to the blockchain
+        # Vote for the block, if block was received in the current epoch
+        if message.get_type() == MessageType.PROPOSE:
+            self.trace.record(self.clock.time(), EventType.PROPOSE_RECEIVED, block_epoch, sender, message.get_size())
+            # Ensure that proposer's ID matches the leader's ID and proposal is new
+            if (block_epoch <= self.epoch.value and sender == self.epoch_leaders[block_epoch]
+                    and self.blockchain.get_block(block_epoch) is None and block_epoch not in self.incomplete_proposals):
+                # Echo received proposal
+                self.send_message(MessageType.ECHO, message)
+                # Compact proposals are rebuilt before being processed
+                if not block.is_complete() and not self.complete_proposal(message):
+                    return
+                # Proposals wait for the certificates of their batches (availability layer)
+                if self.availability is not None and not self.availability.is_available(block.get_transactions()):
+                    self.incomplete_proposals[block_epoch] = message
+                    return
+                self.accept_proposal(message)
+        
+        # Add votes to blocks (from current and past epochs)
+        elif message.get_type() == MessageType.VOTE:
+            self.trace.record(self.clock.time(), EventType.VOTE_RECEIVED, block_epoch, sender, message.get_size())
+            # Get block for the vote's epoch from server's blockchain
+            proposed_block = self.blockchain.get_block(block_epoch)
+            if proposed_block and sender not in [vote[0] for vote in proposed_block.get_votes()]:
+                # Echo received vote (votes are only collected by the leader in linear mode)
+                if self.vote_mode == "all":
                     self.send_message(MessageType.ECHO, message)
-                    self.process_vote(block, proposed_block, sender)
-                elif proposed_block is None:
-                    self.early_messages.append(message)
+                self.process_vote(block, proposed_block, sender, message.is_authenticated())
+            elif proposed_block is None:
+                self.early_messages.append(message)
+
+        # Notarize blocks using certificates (from current and past epochs)
+        elif message.get_type() == MessageType.CERTIFICATE:
+            self.trace.record(self.clock.time(), EventType.CERTIFICATE_RECEIVED, block_epoch, sender, message.get_size())
+            proposed_block = self.blockchain.get_block(block_epoch)
+            if proposed_block:
+                self.process_certificate(block, proposed_block)
+            else:
+                self.early_messages.append(message)
+
+        # Add disseminated transactions to the mempool
+        elif message.get_type() == MessageType.TRANSACTIONS:
+            if self.mempool is not None and block.get_transactions():
+                self.add_to_mempool(block.get_transactions())
+
+        # Send transactions of the server's compact proposal
+        elif message.get_type() == MessageType.TRANSACTION_REQUEST:
+            proposed_block = self.blockchain.get_block(block_epoch)
+            if (proposed_block and self.epoch_leaders[block_epoch] == self.server_id
+                    and proposed_block.get_transaction_ids() is not None and block.get_transaction_ids()):
+                transactions = dict(zip(proposed_block.get_transaction_ids(), proposed_block.get_transactions()))
+                requested_transactions = [transactions[transaction_id] for transaction_id in block.get_transaction_ids()
+                                          if transaction_id in transactions]
+                self.send_message(MessageType.TRANSACTION_RESPONSE, TransactionBatch(block_epoch, requested_transactions),
+                                  sender)
+
+        # Store (and acknowledge) batches of the availability layer
+        elif message.get_type() == MessageType.BATCH:
+            if self.availability is not None:
+                # Batches with finalized transactions are not acknowledged (so they are never certified)
+                if self.transaction_filter is not None and block.get_transactions():
+                    duplicates = self.find_duplicate_transactions([Mempool.get_transaction_id(transaction)
+                                                                   for transaction in block.get_transactions()], (),
+                                                                  validation=True)
+                    if duplicates:
+                        self.duplicate_transactions["validation"].inc(len(duplicates))
+                        return
+                acknowledgement = self.availability.process_batch(block, sender)
+                if acknowledgement is not None:
+                    self.send_message(MessageType.BATCH_ACK, acknowledgement, sender)
+
+        # Certify the server's batches with enough acknowledgements
+        elif message.get_type() == MessageType.BATCH_ACK:
+            if self.availability is not None:
+                certificate = self.availability.process_acknowledgement(block, sender)
+                if certificate is not None:
+                    self.send_message(MessageType.BATCH_CERTIFICATE, certificate)
+                    self.retry_incomplete_proposals()
+
+        elif message.get_type() == MessageType.BATCH_CERTIFICATE:
+            if self.availability is not None and self.availability.process_certificate(block):
+                self.retry_incomplete_proposals()
+
+        # Send stored batches to a server that misses them (availability layer)
+        elif message.get_type() == MessageType.BATCH_REQUEST:
+            if self.availability is not None and block.get_data() is not None:
+                data = block.get_data()
+                for offset in range(0, len(data) - DIGEST_SIZE + 1, DIGEST_SIZE):
+                    stored = self.availability.get_batch(data[offset:offset+DIGEST_SIZE].hex())
+                    if stored is not None:
+                        creator, batch = stored
+                        self.send_message(MessageType.BATCH_RESPONSE,
+                                          StateTransfer(batch.get_epoch(), creator, batch.to_bytes()), sender)
+
+        # Store a missing batch (matching its digest), and account for the blocks that were waiting for it
+        elif message.get_type() == MessageType.BATCH_RESPONSE:
+            if self.availability is not None and self.unavailable_blocks and block.get_data() is not None:
+                batch = TransactionBatch.from_bytes(block.get_data())
+                if (batch is not None and batch.get_epoch() == block_epoch
+                        and self.availability.process_missing_batch(batch, block.get_index())):
+                    self.complete_unavailable_blocks()
+
+        # Complete a compact proposal with the transactions sent by its proposer
+        elif message.get_type() == MessageType.TRANSACTION_RESPONSE:
+            proposal = self.incomplete_proposals.get(block_epoch)
+            if proposal is not None and sender == proposal.get_sender():
+                del self.incomplete_proposals[block_epoch]
+                received_transactions = {Mempool.get_transaction_id(transaction): transaction
+                                         for transaction in block.get_transactions() or []}
+                if self.complete_proposal(proposal, received_transactions):
+                    self.accept_proposal(proposal)
+
+        # Send manifests of the checkpoints newer than the requester's finalized blocks, or a checkpoint's chunk
+        # (a chunk without data, if the checkpoint is no longer kept)
+        elif message.get_type() == MessageType.CHECKPOINT_REQUEST:
+            if self.checkpoint_store is not None and block.get_index() < 0:
+                for manifest in self.checkpoint_store.get_manifests():
+                    if manifest.get_epoch() > block_epoch:
+                        self.send_message(MessageType.CHECKPOINT_MANIFEST,
+                                          StateTransfer(manifest.get_epoch(), 0, manifest.to_bytes()), sender)
+            elif self.checkpoint_store is not None:
+                chunk = self.checkpoint_store.get_chunk(block_epoch, block.get_index())
+                self.send_message(MessageType.CHECKPOINT_CHUNK, StateTransfer(block_epoch, block.get_index(), chunk),
+                                  sender)
+
+        # Request the chunks of a checkpoint, once `f+1` servers sent the same manifest
+        elif message.get_type() == MessageType.CHECKPOINT_MANIFEST:
+            transfer = self.checkpoint_transfer
+            if transfer is not None and block.get_data() is not None:
+                manifest = Manifest.from_bytes(block.get_data())
+                if (manifest is not None and manifest.get_epoch() == block_epoch
+                        and block_epoch > self.blockchain.get_finalized_epoch() and transfer.add_manifest(manifest, sender)):
+                    transfer.set_progress_epoch(self.epoch.value)
+                    self.request_chunks()
+
+        # Restore the checkpoint, once every chunk is received
+        elif message.get_type() == MessageType.CHECKPOINT_CHUNK:
+            transfer = self.checkpoint_transfer
+            if (transfer is None or transfer.get_manifest() is None
+                    or block_epoch != transfer.get_manifest().get_epoch()):
+                return
+            # The sender no longer keeps the checkpoint (newer manifests are requested once no server keeps it)
+            if block.get_data() is None:
+                transfer.remove_server(sender)
+                if transfer.get_servers():
+                    self.request_chunks()
+                else:
+                    self.restart_checkpoint_transfer()
+            elif transfer.add_chunk(block.get_index(), block.get_data(), sender):
+                transfer.set_progress_epoch(self.epoch.value)
+                if transfer.is_complete():
+                    self.complete_checkpoint_transfer()
+                else:
+                    self.request_chunks()
+
+        # Send blocks to servers that are catching up, and add the blocks sent by other servers
+        elif message.get_type() == MessageType.BLOCK_REQUEST:
+            self.send_blocks(block_epoch, sender)
+
+        elif message.get_type() == MessageType.BLOCK_RESPONSE:
+            self.process_blocks(block, sender)
 
 
     def get_early_message(self) -> Message | None:
@@ -282,25 +1497,56 @@ class Streamlet:
         messages_epoch = [message.get_content().get_epoch() for message in self.early_messages]
         for index, epoch in enumerate(messages_epoch):
             if epoch <= self.epoch.value:
-                if self.early_messages[index].get_type() == MessageType.VOTE and self.blockchain.get_block(epoch) is None:
+                if (self.early_messages[index].get_type() in (MessageType.VOTE, MessageType.CERTIFICATE)
+                        and self.blockchain.get_block(epoch) is None):
                     continue
                 return self.early_messages.pop(index)
 
 
-    def send_message(self, message_type: MessageType, content: Block | Message) -> None:
+    def send_message(self, message_type: MessageType, content: Block | QuorumCertificate | StateTransfer | Message,
+                     server_id: int | None = None) -> None:
         """
-        Send message to every server.
+        Send message to every server (or to a single server).
 
         Args:
             message_type (MessageType): type of the message
-            content (Block or Message): content to send
+            content (Block, QuorumCertificate or Message): content to send
+            server_id (int | None, optional): id of the receiving server (if None, message is broadcast)
         """
         message = Message(
             message_type,
             content,
             self.server_id
         ).to_bytes()
-        self.communication.broadcast(message)
+        if server_id is None:
+            # Sizes on the wire (messages may be compressed)
+            self.sent_bytes += self.communication.broadcast(message, message_type)
+        else:
+            self.sent_bytes += self.communication.send(message, server_id, message_type)
+        epoch = content.get_content().get_epoch() if isinstance(content, Message) else content.get_epoch()
+        self.trace.record(self.clock.time(), SENT_EVENTS[message_type], epoch,
+                          -1 if server_id is None else server_id, len(message))
+
+
+    def get_finalized_transactions(self) -> int:
+        """
+        Get number of finalized transactions.
+
+        Returns:
+            int: number of transactions
+        """
+        return self.total_finalized_transactions + self.finalized_transactions
+
+
+    def get_bytes_per_transaction(self) -> float | None:
+        """
+        Get bytes sent by the server per finalized transaction.
+
+        Returns:
+            float | None: bytes per transaction (None, if no transaction was finalized)
+        """
+        finalized_transactions = self.get_finalized_transactions()
+        return self.sent_bytes / finalized_transactions if finalized_transactions else None
 
 
     def export_benchmark_results(self):
@@ -310,16 +1556,31 @@ class Streamlet:
         transaction_size = self.transaction_generator.get_transaction_size()
         transaction_number = self.transaction_generator.get_transaction_number()
         results = {
+            "SERVER_ID": self.server_id,
+            "NUM_REPLICAS": self.num_replicas,
+            "VOTE_MODE": self.vote_mode,
             "EPOCH_DURATION": self.epoch_duration,
             "FAULT_NUMBER": self.f,
             "TRANSACTION_SIZE": transaction_size,
             "TRANSACTION_NUMBER": transaction_number,
             "BENCHMARK_THRESHOLD": self.benchmark_threshold,
             "BENCHMARK_TOTAL": self.benchmark_total,
-            "BENCHMARK_TIME": self.benchmark_time
+            "BENCHMARK_TIME": self.benchmark_time,
+            "FINALIZED_TRANSACTIONS": self.benchmark_transactions,
+            "COMPACT_PROPOSALS": self.mempool is not None,
+            "AVAILABILITY_QUORUM": self.availability.get_quorum() if self.availability is not None else None,
+            "SENT_BYTES": self.sent_bytes,
+            "BYTES_PER_TRANSACTION": self.get_bytes_per_transaction(),
+            "LATENCY": {stage: histogram.get_summary() for stage, histogram in self.latencies.items()},
+            "BATCH_CONTROLLER": {
+                "TRANSACTION_NUMBER": self.batch_controller.get_transaction_number(),
+                "BYTE_BUDGET": self.batch_controller.get_byte_budget(),
+                "DECISIONS": self.batch_controller.get_decisions()
+            } if self.batch_controller is not None else None
         }
-        with open(f"benchmark_{transaction_size}_{transaction_number}.json", "w") as output:
+        with open(f"benchmark_{self.run_name}.json", "w") as output:
             json.dump(results, output, indent=2)
+        self.trace.dump(f"trace_{self.run_name}.bin")
 
 
 class ProtocolError(Exception):
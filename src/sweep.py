@@ -0,0 +1,228 @@
+import os
+import sys
+import csv
+import math
+import json
+import argparse
+import itertools
+import statistics
+import tempfile
+from benchmarksuite import run_local_cluster, summarize, average_summaries, save
+
+# Parameters of each grid point (and their columns in the CSV files)
+PARAMETERS = ("FAULT_NUMBER", "TRANSACTION_SIZE", "TRANSACTION_NUMBER", "EPOCH_DURATION")
+# Metrics plotted against each swept parameter
+PLOTTED_METRICS = ("throughput", "creation_to_finalization_p50")
+# Two-sided 95% quantiles of Student's t-distribution (by degrees of freedom)
+T_QUANTILES = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+               10: 2.228, 15: 2.131, 20: 2.086, 30: 2.042}
+
+
+def get_point_name(parameters: dict) -> str:
+    """
+    Get name of a grid point (used for its directory).
+
+    Args:
+        parameters (dict): value of each parameter
+
+    Returns:
+        str: name of the grid point
+    """
+    return "_".join(f"{parameter.lower()}={value}" for parameter, value in parameters.items())
+
+
+def get_confidence_interval(values: list[float]) -> float:
+    """
+    Get half-width of the 95% confidence interval of the mean of `values`.
+
+    Args:
+        values (list[float]): values of the repetitions
+
+    Returns:
+        float: half-width of the interval (0, with a single value)
+    """
+    if len(values) < 2:
+        return 0.0
+    degrees = len(values) - 1
+    quantile = T_QUANTILES[max(degree for degree in T_QUANTILES if degree <= degrees)] if degrees <= 30 else 1.96
+    return quantile * statistics.stdev(values) / math.sqrt(len(values))
+
+
+def run_point(parameters: dict, repeat: int, benchmark_total: int, timeout: float, key_directory: str,
+              output_directory: str) -> list[dict]:
+    """
+    Run local clusters of a grid point `repeat` times, keeping the results
+    exported by each replica in `<output_directory>/<point>/<repetition>`.
+
+    Args:
+        parameters (dict): value of each parameter (and of other replicas' environment variables)
+        repeat (int): number of repetitions
+        benchmark_total (int): number of finalized transactions of each run
+        timeout (float): maximum duration of each run (in seconds)
+        key_directory (str): directory where replicas' keys are cached
+        output_directory (str): directory of the sweep
+
+    Returns:
+        list[dict]: mean throughput and latencies of the replicas of each finished repetition
+    """
+    num_replicas = 3 * int(parameters["FAULT_NUMBER"]) + 1
+    runs = []
+    for repetition in range(repeat):
+        directory = os.path.join(output_directory, get_point_name(parameters), str(repetition))
+        os.makedirs(directory, exist_ok=True)
+        results = run_local_cluster(parameters, benchmark_total, timeout, key_directory, directory)
+        summary = average_summaries([summarize(replica_results) for replica_results in results], num_replicas)
+        if not summary:
+            print(f"Repetition {repetition} of {get_point_name(parameters)} did not finish "
+                  f"({len(results)} of {num_replicas} replicas exported results).", file=sys.stderr)
+            continue
+        runs.append(summary)
+    return runs
+
+
+def aggregate(runs: list[dict]) -> dict:
+    """
+    Aggregate the repetitions of a grid point.
+
+    Args:
+        runs (list[dict]): summary of each repetition
+
+    Returns:
+        dict: mean, standard deviation and 95% confidence interval of each metric
+    """
+    aggregation = {"repetitions": len(runs)}
+    for metric in (runs[0] if runs else {}):
+        values = [run[metric] for run in runs if metric in run]
+        aggregation[f"{metric}_mean"] = statistics.mean(values)
+        aggregation[f"{metric}_stdev"] = statistics.stdev(values) if len(values) > 1 else 0.0
+        aggregation[f"{metric}_ci95"] = get_confidence_interval(values)
+    return aggregation
+
+
+def write_csv(rows: list[dict], filename: str) -> None:
+    """
+    Write rows to a CSV file (the columns are the keys of every row).
+
+    Args:
+        rows (list[dict]): rows
+        filename (str): name of the file
+    """
+    columns = []
+    for row in rows:
+        columns.extend(column for column in row if column not in columns)
+    with open(filename, "w", newline="") as output:
+        writer = csv.DictWriter(output, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def plot(rows: list[dict], grid: dict, output_directory: str) -> list[str]:
+    """
+    Plot each metric of PLOTTED_METRICS against each swept parameter (with
+    one line per combination of the other parameters, and 95% confidence
+    intervals as error bars). Requires matplotlib.
+
+    Args:
+        rows (list[dict]): aggregated rows of the grid points
+        grid (dict): values of each parameter
+        output_directory (str): directory where plots are saved
+
+    Returns:
+        list[str]: names of the saved files
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as pyplot
+
+    filenames = []
+    for parameter in (parameter for parameter in PARAMETERS if len(grid[parameter]) > 1):
+        others = [other for other in PARAMETERS if other != parameter]
+        for metric in PLOTTED_METRICS:
+            figure, axes = pyplot.subplots()
+            for values in itertools.product(*(grid[other] for other in others)):
+                line = sorted((row for row in rows
+                               if all(row[other] == value for other, value in zip(others, values))
+                               and f"{metric}_mean" in row),
+                              key=lambda row: row[parameter])
+                if not line:
+                    continue
+                # Faults are shown as the number of replicas
+                x = [3*row[parameter] + 1 if parameter == "FAULT_NUMBER" else row[parameter] for row in line]
+                axes.errorbar(x, [row[f"{metric}_mean"] for row in line],
+                              yerr=[row[f"{metric}_ci95"] for row in line], marker="o", capsize=3,
+                              label=", ".join(f"{other.lower()}={value}" for other, value in zip(others, values)))
+            axes.set_xlabel("replicas (n = 3f + 1)" if parameter == "FAULT_NUMBER" else parameter.lower())
+            axes.set_ylabel("transactions per second" if metric == "throughput" else f"{metric} (s)")
+            axes.legend(fontsize="small")
+            filename = os.path.join(output_directory, f"{metric}_vs_{parameter.lower()}.png")
+            figure.savefig(filename, bbox_inches="tight")
+            pyplot.close(figure)
+            filenames.append(filename)
+    return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local clusters over a grid of n = 3f + 1, transaction size, "
+                                                 "transaction number and epoch duration.")
+    parser.add_argument("-f", "--faults", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--transaction-size", type=int, nargs="+", default=[256])
+    parser.add_argument("--transaction-number", type=int, nargs="+", default=[100])
+    parser.add_argument("--epoch-duration", type=float, nargs="+", default=[1.0])
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="repetitions of each grid point")
+    parser.add_argument("-e", "--environment", nargs="*", default=[], metavar="NAME=VALUE",
+                        help="environment variables of every replica (e.g., COMPACT_PROPOSALS=1)")
+    parser.add_argument("-o", "--output", default="sweep", help="directory of the replicas' results, CSV files and plots")
+    parser.add_argument("--total", type=int, default=2000, help="finalized transactions of each run")
+    parser.add_argument("--timeout", type=float, default=300, help="maximum duration of each run (in seconds)")
+    parser.add_argument("--no-plots", action="store_true", help="only write the CSV files")
+    arguments = parser.parse_args()
+
+    grid = {
+        "FAULT_NUMBER": arguments.faults,
+        "TRANSACTION_SIZE": arguments.transaction_size,
+        "TRANSACTION_NUMBER": arguments.transaction_number,
+        "EPOCH_DURATION": arguments.epoch_duration
+    }
+    try:
+        environment = dict(variable.split("=", 1) for variable in arguments.environment)
+    except ValueError:
+        parser.error("environment variables must be NAME=VALUE")
+    output_directory = os.path.abspath(arguments.output)
+    os.makedirs(output_directory, exist_ok=True)
+    key_directory = os.path.join(tempfile.gettempdir(), "streamlet-benchmark-keys")
+
+    run_rows, point_rows, results = [], [], {}
+    for values in itertools.product(*grid.values()):
+        parameters = dict(zip(grid.keys(), values))
+        print(f"Running {get_point_name(parameters)} ({arguments.repeat} times)...", file=sys.stderr)
+        runs = run_point({**environment, **parameters}, arguments.repeat, arguments.total, arguments.timeout,
+                         key_directory, output_directory)
+        replicas = {"REPLICAS": 3*parameters["FAULT_NUMBER"] + 1}
+        run_rows.extend({**replicas, **parameters, "repetition": repetition, **run}
+                        for repetition, run in enumerate(runs))
+        point_rows.append({**replicas, **parameters, **aggregate(runs)})
+        name = ",".join(f"{parameter}={value}" for parameter, value in parameters.items())
+        for metric in (runs[0] if runs else {}):
+            results[f"{name}/{metric}"] = point_rows[-1][f"{metric}_mean"]
+
+    write_csv(run_rows, os.path.join(output_directory, "runs.csv"))
+    write_csv(point_rows, os.path.join(output_directory, "summary.csv"))
+    # Means of the grid points, as a result set that `benchmarksuite.py compare` accepts
+    save(results, os.path.join(output_directory, "sweep.json"))
+    with open(os.path.join(output_directory, "grid.json"), "w") as output:
+        json.dump({"grid": grid, "environment": environment, "repeat": arguments.repeat,
+                   "total": arguments.total}, output, indent=2)
+    for row in point_rows:
+        print(" ".join(f"{column}={value:.3f}" if isinstance(value, float) else f"{column}={value}"
+                       for column, value in row.items() if not column.endswith("_stdev")))
+    if not arguments.no_plots:
+        try:
+            filenames = plot(point_rows, grid, output_directory)
+        except ImportError:
+            print("Plots need matplotlib (pip install matplotlib); only CSV files were written.", file=sys.stderr)
+        else:
+            for filename in filenames:
+                print(f"Saved {filename}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import sys
+import json
+import argparse
+from eventtrace import EventTrace
+from eventtype import EventType
+
+RECEIVED_EVENTS = (EventType.PROPOSE_RECEIVED, EventType.VOTE_RECEIVED, EventType.CERTIFICATE_RECEIVED,
+                   EventType.EARLY_MESSAGE)
+SENT_EVENTS = (EventType.PROPOSE_SENT, EventType.VOTE_SENT, EventType.ECHO_SENT, EventType.CERTIFICATE_SENT,
+               EventType.TRANSACTIONS_SENT, EventType.TRANSACTION_REQUEST_SENT, EventType.TRANSACTION_RESPONSE_SENT,
+               EventType.BATCH_SENT, EventType.BATCH_ACK_SENT, EventType.BATCH_CERTIFICATE_SENT,
+               EventType.CHECKPOINT_REQUEST_SENT, EventType.CHECKPOINT_MANIFEST_SENT, EventType.CHECKPOINT_CHUNK_SENT,
+               EventType.BLOCK_REQUEST_SENT, EventType.BLOCK_RESPONSE_SENT, EventType.BATCH_REQUEST_SENT,
+               EventType.BATCH_RESPONSE_SENT)
+
+
+def build_timelines(records: list) -> dict:
+    """
+    Rebuild the timeline of each epoch from trace records. Times of the
+    protocol's phases are relative to the start of the epoch where the
+    event happened.
+
+    Args:
+        records (list): list of tuples (timestamp, event type, epoch, peer, size)
+
+    Returns:
+        dict: timeline of each epoch
+    """
+    timelines = {}
+    for timestamp, event_type, epoch, peer, size in records:
+        timeline = timelines.setdefault(epoch, {
+            "start": None,
+            "leader": None,
+            "proposal": None,
+            "notarization": None,
+            "finalization": None,
+            "timeout": False,
+            "votes": 0,
+            "received_messages": 0,
+            "received_bytes": 0,
+            "sent_messages": 0,
+            "sent_bytes": 0
+        })
+        if event_type == EventType.EPOCH_START:
+            timeline["start"] = timestamp
+            timeline["leader"] = peer
+        elif event_type in (EventType.PROPOSE_SENT, EventType.PROPOSAL_ACCEPTED) and timeline["proposal"] is None:
+            timeline["proposal"] = timestamp
+        elif event_type == EventType.NOTARIZED:
+            timeline["notarization"] = timestamp
+        elif event_type == EventType.FINALIZED:
+            timeline["finalization"] = timestamp
+        elif event_type == EventType.TIMEOUT:
+            timeline["timeout"] = True
+        elif event_type == EventType.VOTE_ACCEPTED:
+            timeline["votes"] += 1
+        if event_type in RECEIVED_EVENTS:
+            timeline["received_messages"] += 1
+            timeline["received_bytes"] += size
+        elif event_type in SENT_EVENTS:
+            timeline["sent_messages"] += 1
+            timeline["sent_bytes"] += size
+
+    # Convert absolute times to times relative to the start of the epoch
+    # (the genesis epoch and epochs whose start was overwritten have no start)
+    for timeline in timelines.values():
+        for phase in ("proposal", "notarization", "finalization"):
+            if timeline[phase] is not None:
+                timeline[phase] = timeline[phase] - timeline["start"] if timeline["start"] is not None else None
+    return dict(sorted(timelines.items()))
+
+
+def format_time(value: float | None) -> str:
+    """
+    Format time (in milliseconds).
+
+    Args:
+        value (float | None): time in seconds
+
+    Returns:
+        str: formatted time
+    """
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild per-epoch timelines from an event trace.")
+    parser.add_argument("trace", help="trace file")
+    parser.add_argument("--epoch", type=int, help="print every event of the epoch")
+    parser.add_argument("--json", action="store_true", help="print timelines in JSON")
+    arguments = parser.parse_args()
+    try:
+        records = EventTrace.load(arguments.trace)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+
+    if arguments.epoch is not None:
+        for timestamp, event_type, epoch, peer, size in records:
+            if epoch == arguments.epoch:
+                print(f"{timestamp:.6f} {event_type.name:<18} peer={peer:<3} size={size}")
+        return
+
+    timelines = build_timelines(records)
+    if arguments.json:
+        print(json.dumps(timelines, indent=2))
+        return
+    print(f"{'epoch':>6} {'leader':>6} {'proposal':>9} {'notarized':>9} {'finalized':>9} "
+          f"{'votes':>5} {'recv':>5} {'recv_kB':>8} {'sent':>5} {'sent_kB':>8} timeout")
+    for epoch, timeline in timelines.items():
+        leader = "-" if timeline["leader"] is None else timeline["leader"]
+        print(f"{epoch:>6} {leader:>6} {format_time(timeline['proposal']):>9} "
+              f"{format_time(timeline['notarization']):>9} {format_time(timeline['finalization']):>9} "
+              f"{timeline['votes']:>5} {timeline['received_messages']:>5} {timeline['received_bytes'] / 1000:>8.1f} "
+              f"{timeline['sent_messages']:>5} {timeline['sent_bytes'] / 1000:>8.1f} {'yes' if timeline['timeout'] else ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import pickle
+import logging
+from types import NoneType
+from typing import Self
+from mempool import TRANSACTION_ID_SIZE
+
+class TransactionBatch:
+    """
+    Class that represents a batch of transactions (disseminated to the
+    mempools or sent to complete a compact proposal), or a request for
+    the transactions of a compact proposal, containing:
+    - Epoch number (when the batch was disseminated, or of the proposal)
+    - Transactions (None, for requests)
+    - Ids of the requested transactions (None, for batches)
+    """
+
+    def __init__(self, epoch: int, transactions: list | None, transaction_ids: list[bytes] | None = None) -> None:
+        """
+        Constructor.
+
+        Args:
+            epoch (int): epoch of the batch
+            transactions (list | None): clients' transactions
+            transaction_ids (list[bytes] | None, optional): ids of requested transactions
+        """
+        self.epoch = epoch
+        self.transactions = transactions
+        self.transaction_ids = transaction_ids
+
+
+    def get_epoch(self) -> int:
+        """
+        Get batch's epoch.
+
+        Returns:
+            int: epoch of the batch
+        """
+        return self.epoch
+
+
+    def get_transactions(self) -> list | None:
+        """
+        Get batch's transactions.
+
+        Returns:
+            list | None: list of transactions
+        """
+        return self.transactions
+
+
+    def get_transaction_ids(self) -> list[bytes] | None:
+        """
+        Get ids of the requested transactions.
+
+        Returns:
+            list[bytes] | None: ids of transactions
+        """
+        return self.transaction_ids
+
+
+    def to_bytes(self) -> bytes:
+        """
+        Convert TransactionBatch to bytes.
+
+        Returns:
+            bytes: bytes from TransactionBatch object
+        """
+        transaction_ids = b"".join(self.transaction_ids) if self.transaction_ids is not None else None
+        return pickle.dumps((self.epoch, self.transactions, transaction_ids))
+
+
+    @staticmethod
+    def from_bytes(data_bytes: bytes) -> Self | None:
+        """
+        Convert bytes to TransactionBatch. Additionally, check if instance
+        attributes have the correct type.
+
+        Args:
+            data_bytes (bytes): TransactionBatch in serialized form
+
+        Returns:
+            TransactionBatch: TransactionBatch object from bytes
+        """
+        try:
+            epoch, transactions, transaction_ids = pickle.loads(data_bytes)
+        except (pickle.PickleError, ValueError, TypeError):
+            logging.error("Transaction batch cannot be unpickled.\n")
+            return None
+        if (isinstance(epoch, int) and isinstance(transactions, (list, NoneType))
+                and isinstance(transaction_ids, (bytes, NoneType))
+                and (transaction_ids is None or len(transaction_ids) % TRANSACTION_ID_SIZE == 0)):
+            if transaction_ids is not None:
+                transaction_ids = [transaction_ids[i:i+TRANSACTION_ID_SIZE]
+                                   for i in range(0, len(transaction_ids), TRANSACTION_ID_SIZE)]
+            return TransactionBatch(epoch, transactions, transaction_ids)
+        logging.error("Transaction batch attributes do not contain the correct type(s).\n")
+        return None
@@ -0,0 +1,196 @@
+import math
+from blockstore import BlockStore
+from metrics import registry
+
+class BloomFilter:
+    """
+    Bloom filter of transaction ids (which are already digests, so the
+    positions of an id are derived from its bytes by double hashing).
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float) -> None:
+        """
+        Constructor.
+
+        Args:
+            capacity (int): number of ids that keep the false positive rate
+            false_positive_rate (float): false positive rate with `capacity` ids
+        """
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_number = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+
+    def get_hashes(self, transaction_id: bytes) -> tuple[int, int]:
+        """
+        Get the two hashes of a transaction id (the i-th position is
+        `first_hash + i * second_hash`, modulo the size of the filter).
+
+        Args:
+            transaction_id (bytes): id of the transaction
+
+        Returns:
+            tuple[int, int]: hashes
+        """
+        value = int.from_bytes(transaction_id, "big")
+        return (value & 0xFFFFFFFF, (value >> 32) | 1)
+
+
+    def add(self, transaction_id: bytes) -> None:
+        """
+        Add transaction id.
+
+        Args:
+            transaction_id (bytes): id of the transaction
+        """
+        first_hash, second_hash = self.get_hashes(transaction_id)
+        bits = self.bits
+        for i in range(self.hash_number):
+            position = (first_hash + i * second_hash) % self.size
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+    def __contains__(self, transaction_id: bytes) -> bool:
+        """
+        Check if transaction id may have been added.
+
+        Args:
+            transaction_id (bytes): id of the transaction
+
+        Returns:
+            bool: False, if the id was not added (True may be a false positive)
+        """
+        first_hash, second_hash = self.get_hashes(transaction_id)
+        bits = self.bits
+        # Most ids that were not added stop at one of the first positions
+        for i in range(self.hash_number):
+            position = (first_hash + i * second_hash) % self.size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class TransactionFilter:
+    """
+    Duplicate detector of finalized transactions. Ids of recently finalized
+    transactions are added to a rotating Bloom filter: once the current
+    filter holds `capacity` ids, it replaces the previous one and a new
+    filter is started, so the last `capacity` to 2*`capacity` ids are
+    covered with bounded memory.
+
+    Ids found by the filter are confirmed by the index of finalized blocks
+    (if there is a block store), so transactions are not dropped due to
+    false positives. Without a block store, ids found by the filter are
+    considered duplicates, so the filter is only fit for leaders: a false
+    positive leaves an honest transaction out of a proposal, but voters must
+    not reject proposals (nor mempools drop transactions) because of one
+    (see `is_exact`).
+    """
+
+    def __init__(self, capacity: int = 1000000, false_positive_rate: float = 0.001,
+                 block_store: BlockStore | None = None) -> None:
+        """
+        Constructor.
+
+        Args:
+            capacity (int, optional): number of ids of each filter
+            false_positive_rate (float, optional): false positive rate of each filter (when full)
+            block_store (BlockStore | None, optional): index of finalized blocks (to confirm duplicates;
+                without it, a fraction of up to `false_positive_rate` of the transactions that were not
+                finalized is found by the filter, so only leaders should leave them out)
+        """
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.block_store = block_store
+        self.current = BloomFilter(capacity, false_positive_rate)
+        self.previous = None
+        self.false_positives = registry.counter("streamlet_transaction_filter_false_positives_total",
+                                                "Transactions found by the filter that were not finalized.")
+
+
+    def add(self, transaction_ids: list[bytes]) -> None:
+        """
+        Add ids of finalized transactions.
+
+        Args:
+            transaction_ids (list[bytes]): ids of transactions
+        """
+        for transaction_id in transaction_ids:
+            if self.current.count >= self.capacity:
+                self.previous = self.current
+                self.current = BloomFilter(self.capacity, self.false_positive_rate)
+            self.current.add(transaction_id)
+
+
+    def is_exact(self) -> bool:
+        """
+        Check if ids found by the filter are confirmed (i.e., if there is a
+        block store), so they can be used to validate transactions.
+
+        Returns:
+            bool: True, if there are no false positives
+        """
+        return self.block_store is not None
+
+
+    def is_duplicate(self, transaction_id: bytes) -> bool:
+        """
+        Check if a transaction was (recently) finalized.
+
+        Args:
+            transaction_id (bytes): id of the transaction
+
+        Returns:
+            bool: True, if the transaction was finalized (or if it is a false positive, without a block store)
+        """
+        if transaction_id not in self.current and (self.previous is None or transaction_id not in self.previous):
+            return False
+        if self.block_store is None:
+            return True
+        if self.block_store.contains_transaction(transaction_id):
+            return True
+        self.false_positives.inc()
+        return False
+
+
+    def get_state(self) -> tuple:
+        """
+        Get state of the filter (e.g., to be included in a checkpoint).
+
+        Returns:
+            tuple: number of ids and bits of the current and previous filters
+        """
+        return (self.current.count, bytes(self.current.bits),
+                self.previous.count if self.previous is not None else None,
+                bytes(self.previous.bits) if self.previous is not None else None)
+
+
+    def set_state(self, state: tuple) -> None:
+        """
+        Set state of the filter (e.g., from a checkpoint).
+
+        Args:
+            state (tuple): state (see `get_state`)
+
+        Raises:
+            ValueError: state is not valid (or it was created with other capacity or false positive rate)
+        """
+        try:
+            current_count, current_bits, previous_count, previous_bits = state
+        except (ValueError, TypeError):
+            raise ValueError("Filter state cannot be unpacked.")
+        current = BloomFilter(self.capacity, self.false_positive_rate)
+        filters = [(current, current_count, current_bits)]
+        previous = None
+        if previous_bits is not None:
+            previous = BloomFilter(self.capacity, self.false_positive_rate)
+            filters.append((previous, previous_count, previous_bits))
+        for bloom_filter, count, bits in filters:
+            if not isinstance(count, int) or not isinstance(bits, bytes) or len(bits) != len(bloom_filter.bits):
+                raise ValueError("Filter state does not match the filter's size.")
+            bloom_filter.bits[:] = bits
+            bloom_filter.count = count
+        self.current = current
+        self.previous = previous
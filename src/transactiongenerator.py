@@ -1,4 +1,5 @@
 import os
+import time
 import random
 from typing import NoReturn
 from multiprocessing import Process, Queue
@@ -51,7 +52,8 @@ class TransactionGenerator:
 
     def generate_transactions(self, queue: Queue, transaction_size: int, transaction_number: int) -> NoReturn:
         """
-        Generate transactions.
+        Generate transactions. Each transaction contains its ID, client's ID,
+        payload and creation time (shared by every transaction of the batch).
 
         Args:
             queue (Queue): queue for transactions
@@ -60,6 +62,7 @@ class TransactionGenerator:
         """
         last_transaction = 0
         while True:
-            transactions = [(last_transaction+i, random.randint(0, 100), "\x00"*transaction_size) for i in range(transaction_number)]
+            creation_time = time.time()
+            transactions = [(last_transaction+i, random.randint(0, 100), "\x00"*transaction_size, creation_time) for i in range(transaction_number)]
             last_transaction += transaction_number
             queue.put(transactions)
\ No newline at end of file
@@ -0,0 +1,130 @@
+import time
+import socket
+import struct
+import pytest
+import crypto
+from block import Block
+from message import Message
+from messagetype import MessageType
+from sharedmemoryring import SharedMemoryRing
+from communicationsystem import CommunicationSystem, IOV_MAX
+
+
+@pytest.fixture
+def link():
+    """
+    Communication system of server 0, whose socket to server 1 is one end of
+    a socket pair (the other end is returned to read what was written).
+    """
+    sender_socket, receiver_socket = socket.socketpair()
+    receiver_socket.setblocking(False)
+    configuration = {
+        0: ["127.0.0.1", 0, socket.socket(socket.AF_INET, socket.SOCK_STREAM)],
+        1: ["127.0.0.1", 0, sender_socket]
+    }
+    communication = CommunicationSystem(0, configuration)
+    yield communication, receiver_socket
+    sender_socket.close()
+    receiver_socket.close()
+    configuration[0][2].close()
+
+
+def read_frame(receiver_socket: socket.socket) -> bytes | None:
+    try:
+        length = struct.unpack(">I", receiver_socket.recv(4))[0]
+    except BlockingIOError:
+        return None
+    return receiver_socket.recv(length)
+
+
+def create_vote() -> bytes:
+    _, private_key = crypto.generate_keys()
+    vote_block = Block(1, [], "0" * 64, 0).create_vote(private_key)
+    return Message(MessageType.VOTE, vote_block, 0).to_bytes()
+
+
+def test_lone_vote_is_written_within_flush_interval(link):
+    communication, receiver_socket = link
+    communication.set_coalescing(True, 65536, 0.005)
+    vote = create_vote()
+    communication.send(vote, 1, MessageType.VOTE)
+    # Queued while the coalescing window is open
+    communication.flush_due()
+    assert read_frame(receiver_socket) is None
+    time.sleep(0.005)
+    communication.flush_due()
+    assert read_frame(receiver_socket) == vote
+
+
+def test_bootstrap_messages_are_not_coalesced(link):
+    communication, receiver_socket = link
+    communication.set_coalescing(True, 65536, 60)
+    ready = Message(MessageType.READY, time.time(), 0).to_bytes()
+    communication.send(ready, 1, MessageType.READY)
+    assert read_frame(receiver_socket) == ready
+
+
+def create_key_exchange(signing_key=None, keys=None) -> bytes:
+    public_key, private_key = keys or crypto.generate_keys()
+    exchange_public_key, _ = crypto.generate_exchange_keys()
+    signature = crypto.sign_exchange_key(exchange_public_key, 1, signing_key or private_key)
+    return Message(MessageType.PK_EXCHANGE, (public_key, exchange_public_key, signature, []), 1).to_bytes()
+
+
+def test_session_key_is_derived_from_signed_exchange_key(link):
+    communication, receiver_socket = link
+    communication.deliver(create_key_exchange(), receiver_socket)
+    assert 1 in communication.session_keys
+
+
+def test_exchange_key_signed_by_another_key_is_rejected(link):
+    communication, receiver_socket = link
+    _, other_private_key = crypto.generate_keys()
+    failures = communication.authentication_failures.get()
+    communication.deliver(create_key_exchange(other_private_key), receiver_socket)
+    assert 1 not in communication.session_keys
+    assert communication.authentication_failures.get() == failures + 1
+
+
+def test_key_exchange_must_carry_pinned_key(link):
+    communication, receiver_socket = link
+    pinned_public_key, pinned_private_key = crypto.generate_keys()
+    communication.set_public_keys({1: pinned_public_key})
+    communication.deliver(create_key_exchange(), receiver_socket)
+    assert 1 not in communication.session_keys
+    communication.deliver(create_key_exchange(keys=(pinned_public_key, pinned_private_key)), receiver_socket)
+    assert 1 in communication.session_keys
+
+
+def test_echo_of_dropped_vote_is_delivered(link):
+    communication, receiver_socket = link
+    communication.set_flow_control(64, 1, "drop_oldest")
+    dropped_vote, vote = create_vote(), create_vote()
+    communication.deliver(dropped_vote, receiver_socket)
+    communication.deliver(vote, receiver_socket)
+    assert (communication.inbound_queue.pop().get_content().get_signature()
+            == Message.from_bytes(vote).get_content().get_signature())
+    echo = Message(MessageType.ECHO, Message.from_bytes(dropped_vote), 1).to_bytes()
+    communication.deliver(echo, receiver_socket)
+    assert (communication.inbound_queue.pop().get_content().get_signature()
+            == Message.from_bytes(dropped_vote).get_content().get_signature())
+
+
+def test_frame_larger_than_ring_is_rejected(link, tmp_path):
+    communication, receiver_socket = link
+    communication.set_transport("shm", str(tmp_path), 4096)
+    with pytest.raises(ValueError):
+        communication.check_frame_size(8192)
+    communication.outbound_rings[1] = SharedMemoryRing(str(tmp_path / "1.ring"), 4096, create=True)
+    proposal = Message(MessageType.PROPOSE, Block(1, [(1, 0, "\x00" * 8192, 0.0)], "0" * 64, 0), 0).to_bytes()
+    with pytest.raises(ValueError):
+        communication.send(proposal, 1, MessageType.PROPOSE)
+    assert communication.send(create_vote(), 1, MessageType.VOTE) > 0
+
+
+def test_unix_socket_is_written_without_cork(link):
+    communication, receiver_socket = link
+    communication.set_transport("unix")
+    buffers = [b"\x00"] * (IOV_MAX + 1)
+    communication.write(communication.configuration[1][2], buffers)
+    assert receiver_socket.recv(len(buffers)) == b"".join(buffers)
@@ -0,0 +1,21 @@
+from metrics import MetricsRegistry
+from simulator import Simulator
+
+
+def test_registry_grows_beyond_its_capacity():
+    registry = MetricsRegistry(capacity=4)
+    summaries = [registry.summary("streamlet_sent_message_bytes", "Size of sent messages.", {"peer": peer})
+                 for peer in range(200)]
+    for peer, summary in enumerate(summaries):
+        summary.observe(peer)
+    exported = registry.export()
+    assert 'streamlet_sent_message_bytes_sum{peer="199"} 199' in exported
+    assert 'streamlet_sent_message_bytes_count{peer="0"} 1' in exported
+
+
+def test_simulated_replicas_have_their_own_series():
+    simulator = Simulator(1, 1.0, lambda random: 0.05, lagging=(3, 10))
+    simulator.run(20)
+    lagging_replica, replica = simulator.replicas[3], simulator.replicas[0]
+    assert lagging_replica.state_transfers["blocks"].get() > 0
+    assert replica.state_transfers["blocks"].get() == 0
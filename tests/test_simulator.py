@@ -0,0 +1,91 @@
+from message import Message, HEADER
+from messagetype import MessageType
+from block import Block
+from simulator import Simulator, SimulatedKey, DELIVER
+
+
+def get_finalized_transactions(replica) -> int:
+    return replica.total_finalized_transactions + replica.finalized_transactions
+
+
+def test_lagging_replica_fetches_missing_batches():
+    # Replica 3 catches up by block transfer, so it never received the batches of the blocks it missed
+    simulator = Simulator(1, 1.0, lambda random: 0.05, availability_quorum=2, lagging=(3, 15))
+    simulator.run(40)
+    assert simulator.check_safety()
+    lagging_replica = simulator.replicas[3]
+    assert not lagging_replica.unavailable_blocks
+    assert not lagging_replica.availability.missing
+    assert get_finalized_transactions(lagging_replica) == get_finalized_transactions(simulator.replicas[0])
+
+
+def test_past_proposal_is_retried_when_its_parent_is_notarized():
+    epoch_duration = 1.0
+    # Replica 1 is not the leader of the parent's epoch or of the next two epochs
+    replica_id, parent_epoch = 1, 3
+    simulator = Simulator(1, epoch_duration, lambda random: 0.01)
+    network = simulator.network
+    transmit = network.transmit
+    # Epoch `e` starts at (e - 1) * epoch_duration: the replica receives the child
+    # (and its echoes) in epoch `parent_epoch + 2`, before the parent
+    delivery_times = {parent_epoch + 1: (parent_epoch + 1) * epoch_duration + 0.1,
+                      parent_epoch: (parent_epoch + 1) * epoch_duration + 0.3}
+
+    def delayed_transmit(data: bytes, server_id: int) -> None:
+        message_type, sender, epoch = Message.parse_header(data)
+        if message_type == MessageType.ECHO:
+            message_type, _, epoch = Message.parse_header(data, HEADER.size)
+        # Blocks are not transferred, so the child can only be added from its proposal
+        if message_type == MessageType.BLOCK_REQUEST and sender == replica_id:
+            return
+        if server_id == replica_id and message_type == MessageType.PROPOSE and epoch in delivery_times:
+            network.sent_messages += 1
+            network.schedule(delivery_times[epoch], DELIVER, server_id, data)
+            return
+        transmit(data, server_id)
+
+    network.transmit = delayed_transmit
+    simulator.run(parent_epoch + 6)
+    assert simulator.check_safety()
+    assert all(replica.epoch_leaders[epoch] != replica_id
+               for replica in simulator.replicas for epoch in range(parent_epoch, parent_epoch + 3))
+    child_block = simulator.replicas[replica_id].blockchain.get_block(parent_epoch + 1)
+    assert child_block is not None
+    assert child_block.get_hash() == simulator.replicas[0].blockchain.get_block(parent_epoch + 1).get_hash()
+
+
+def test_voters_ignore_false_positives_without_block_store():
+    # Every id is a (false) match of the filters of replicas 1 to 3, which have no block store
+    simulator = Simulator(1, 1.0, lambda random: 0.05, transaction_filter=True)
+    for replica in simulator.replicas[1:]:
+        bits = replica.transaction_filter.current.bits
+        bits[:] = b"\xff" * len(bits)
+    simulator.run(20)
+    assert simulator.check_safety()
+    assert simulator.replicas[0].duplicate_transactions["validation"].get() == 0
+    assert get_finalized_transactions(simulator.replicas[0]) > 0
+
+
+def test_authenticated_vote_for_conflicting_block_is_not_counted():
+    # The leader of epoch 1 proposed two blocks, and replica 2 voted for the first one
+    simulator = Simulator(1, 1.0, lambda random: 0.05)
+    replica, voter_key = simulator.replicas[0], SimulatedKey(2)
+    voted_block, conflicting_block = Block(1, [(1, 0, "", 0.0)], "0" * 64, 0), Block(1, [], "0" * 64, 0)
+    voted_block.calculate_hash()
+    conflicting_block.calculate_hash()
+    vote = Message.from_bytes(Message(MessageType.VOTE, voted_block.create_vote(voter_key), 2).to_bytes()).get_content()
+    replica.process_vote(vote, conflicting_block, 2, authenticated=True)
+    assert not conflicting_block.get_votes()
+    replica.process_vote(vote, voted_block, 2, authenticated=True)
+    assert voted_block.get_votes() == [(2, vote)]
+
+
+def test_lagging_replica_catches_up_after_peers_drop_its_checkpoint():
+    # Peers keep 2 checkpoints, so the one whose manifest replica 3 trusts is deleted during the transfer
+    simulator = Simulator(1, 1.0, lambda random: random.uniform(0.01, 0.1), seed=0, checkpoint_interval=10,
+                          lagging=(3, 30))
+    simulator.run(100)
+    assert simulator.check_safety()
+    lagging_replica, replica = simulator.replicas[3], simulator.replicas[0]
+    assert lagging_replica.checkpoint_transfer is None
+    assert lagging_replica.blockchain.get_finalized_epoch() >= replica.blockchain.get_finalized_epoch() - 1